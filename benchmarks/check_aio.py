@@ -0,0 +1,213 @@
+"""
+Checks phantomime.aio against the local stub hub and fixture server from servers.py:
+the AsyncBrowser commands and waits, wait_any, the keep-alive HTTP pool reusing
+connections and retrying on a fresh one when the hub dropped an idle connection,
+and hub URLs with credentials or an https scheme.
+
+    python benchmarks/check_aio.py
+    python benchmarks/check_aio.py --filter pool
+"""
+
+import argparse
+import asyncio
+import sys
+import traceback
+
+from typing import Awaitable, Callable, Dict
+
+# servers also puts the repository root on sys.path for the phantomime imports below
+from servers import StaticServer, StubHub, start_servers
+
+from phantomime import aio
+from phantomime import waits
+from phantomime.constants import SELECTOR_TYPE_CSS, SELECTOR_TYPE_XPATH
+
+
+class Context:
+    def __init__(self, hub: StubHub, static: StaticServer):
+        self.hub = hub
+        self.static = static
+
+    def page(self, name: str) -> str:
+        return f"{self.static.url}/{name}"
+
+
+async def _browser_commands(ctx: Context):
+    browser = await aio.connect(ctx.hub.url)
+    try:
+        await browser.load_page(ctx.page("page.html"))
+        assert await browser.get_page_title() == "phantomime test", "unexpected page title"
+
+        title = await browser.find_element(SELECTOR_TYPE_CSS, "h1#page-title")
+        assert title is not None, "h1#page-title not found"
+        assert await browser.find_element(SELECTOR_TYPE_CSS, "#does-not-exist") is None, "missing element found"
+
+        subtitle = await browser.find_element(SELECTOR_TYPE_XPATH, '//h2[@class="page-subtitle"]')
+        assert subtitle is not None, "xpath lookup failed"
+
+        links = await browser.find_elements(SELECTOR_TYPE_CSS, "ul#items li.item a")
+        assert len(links) > 1, f"expected several links, got {len(links)}"
+
+        assert await browser.is_text_on_page("this text is expected"), "expected text not found"
+        assert await browser.execute_script("return document.title;") == "phantomime test", "script result"
+    finally:
+        await browser.quit()
+
+    assert not ctx.hub.sessions, "session left open after quit"
+
+
+async def _waits(ctx: Context):
+    for in_page_waits in (True, False):
+        browser = await aio.connect(ctx.hub.url)
+        browser.in_page_waits = in_page_waits
+        try:
+            await browser.load_page(ctx.page("delayed.html"))
+            await browser.wait_element_exists(SELECTOR_TYPE_CSS, "#content p.result", timeout=5)
+            await browser.wait_text_on_page("the content arrived", timeout=5)
+        finally:
+            await browser.quit()
+
+
+async def _wait_any(ctx: Context):
+    browser = await aio.connect(ctx.hub.url)
+    try:
+        await browser.load_page(ctx.page("delayed.html"))
+        fired, value = await browser.wait_any({
+            "never": waits.element_exists(SELECTOR_TYPE_CSS, "#does-not-exist"),
+            "content": waits.element_exists(SELECTOR_TYPE_CSS, "#content p.result"),
+        }, timeout=5)
+        assert fired == "content", f"wrong condition fired: {fired}"
+        assert isinstance(value, aio.AsyncElement), f"expected the element, got {value!r}"
+
+        fired, _ = await browser.wait_any([
+            waits.element_exists(SELECTOR_TYPE_CSS, "#does-not-exist"),
+            waits.text_on_page("the content arrived"),
+        ], timeout=5)
+        assert fired == 1, f"wrong condition fired: {fired}"
+
+        try:
+            await browser.wait_any({"never": waits.element_exists(SELECTOR_TYPE_CSS, "#does-not-exist")}, timeout=0.3)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("wait_any did not time out")
+    finally:
+        await browser.quit()
+
+
+async def _pool_keep_alive(ctx: Context):
+    browser = await aio.connect(ctx.hub.url)
+    try:
+        connections = ctx.hub.connections
+        for _ in range(20):
+            await browser.get_page_title()
+
+        assert ctx.hub.connections == connections, \
+            f"20 sequential requests opened {ctx.hub.connections - connections} connections"
+
+        # concurrent requests each take a connection, up to max_connections
+        await asyncio.gather(*(browser.get_page_title() for _ in range(aio.DEFAULT_MAX_CONNECTIONS * 2)))
+        opened = ctx.hub.connections - connections
+        assert opened <= aio.DEFAULT_MAX_CONNECTIONS, f"{opened} connections over max_connections"
+    finally:
+        await browser.quit()
+
+
+async def _pool_stale_retry(ctx: Context):
+    browser = await aio.connect(ctx.hub.url)
+    try:
+        await browser.get_page_title()
+        connections = ctx.hub.connections
+
+        ctx.hub.drop_connections()
+        await asyncio.sleep(0.05)
+
+        # the idle connection is dead now, the request has to go out again on a fresh one
+        await browser.load_page(ctx.page("page.html"))
+        assert await browser.get_page_title() == "phantomime test", "unexpected page title"
+        assert ctx.hub.connections == connections + 1, \
+            f"expected one new connection, got {ctx.hub.connections - connections}"
+    finally:
+        await browser.quit()
+
+
+async def _shared_http_pool(ctx: Context):
+    first = await aio.connect(ctx.hub.url)
+    second = await aio.AsyncBrowser.connect(ctx.hub.url, http=first._http)
+    try:
+        await asyncio.gather(first.load_page(ctx.page("page.html")), second.load_page(ctx.page("delayed.html")))
+        titles = await asyncio.gather(first.get_page_title(), second.get_page_title())
+        assert titles == ["phantomime test", "phantomime delayed"], f"sessions got mixed up: {titles}"
+    finally:
+        await second.quit()
+        await first.quit()
+
+
+async def _hub_url(ctx: Context):
+    scheme, rest = ctx.hub.url.split("://", 1)
+    browser = await aio.connect(f"{scheme}://alice:p%40ss@{rest}")
+    try:
+        assert await browser.get_page_title() is not None
+        assert ctx.hub.authorization == "Basic YWxpY2U6cEBzcw==", f"unexpected authorization {ctx.hub.authorization!r}"
+    finally:
+        await browser.quit()
+
+    pool = aio._HTTPConnectionPool.for_url("https://hub.example/wd/hub")
+    assert (pool.port, pool.secure, pool.authorization) == (443, True, None), "https defaults"
+
+    try:
+        aio._HTTPConnectionPool.for_url("ftp://hub.example/wd/hub")
+    except Exception:
+        pass
+    else:
+        raise AssertionError("unsupported scheme accepted")
+
+
+CHECKS: Dict[str, Callable[[Context], Awaitable[None]]] = {
+    "browser_commands": _browser_commands,
+    "waits": _waits,
+    "wait_any": _wait_any,
+    "pool_keep_alive": _pool_keep_alive,
+    "pool_stale_retry": _pool_stale_retry,
+    "shared_http_pool": _shared_http_pool,
+    "hub_url": _hub_url,
+}
+
+
+async def run(ctx: Context, name_filter: str) -> int:
+    failed = 0
+    for name, check in CHECKS.items():
+        if name_filter not in name:
+            continue
+
+        try:
+            await asyncio.wait_for(check(ctx), 30)
+        except Exception:
+            failed += 1
+            print(f"{name:<24}FAILED")
+            traceback.print_exc()
+            continue
+
+        print(f"{name:<24}ok")
+
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="phantomime.aio checks against a local stub hub")
+    parser.add_argument("--filter", default="", help="only run checks whose name contains this")
+    parser.add_argument("--latency-ms", type=float, default=0, help="stub hub latency per request")
+    args = parser.parse_args()
+
+    hub, static = start_servers(args.latency_ms)
+    try:
+        failed = asyncio.run(run(Context(hub, static), args.filter))
+    finally:
+        hub.shutdown()
+        static.shutdown()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Measures how long importing phantomime modules takes in a fresh interpreter and checks that
+the heavy dependencies are not loaded until they are used.
+
+    python benchmarks/import_time.py                  # phantomime.phantomime, phantomime.aio and phantomime.pool
+    python benchmarks/import_time.py --max-ms 60      # exit 1 if a module takes longer than 60ms
+    python benchmarks/import_time.py phantomime.crawl
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from typing import Dict, List
+
+REPO_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES: List[str] = ["phantomime.phantomime", "phantomime.aio", "phantomime.pool"]
+
+# loaded on first use only: selenium with the first session, docker with the first container,
+# backoff while waiting for a hub and asyncio by the sync API's async wait helper
+DEFERRED_MODULES: List[str] = ["selenium", "docker", "backoff", "requests", "urllib3", "asyncio"]
+
+# phantomime.aio needs asyncio itself
+_ALLOWED: Dict[str, List[str]] = {"phantomime.aio": ["asyncio"]}
+
+_CHECK = "import sys, {module}; print(','.join(m for m in {deferred!r} if m in sys.modules))"
+
+
+def import_ms(module: str) -> float:
+    """
+    Import module in a fresh interpreter and return the cumulative import time reported by -X importtime.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+
+    raise Exception(f"no import time reported for {module}")
+
+
+def loaded_deferred_modules(module: str) -> List[str]:
+    result = subprocess.run([sys.executable, "-c", _CHECK.format(module=module, deferred=DEFERRED_MODULES)],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+
+    return [m for m in loaded if m not in _ALLOWED.get(module, [])]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="phantomime import time benchmark")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when the median import takes longer")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<28}{'median ms':>11}{'min ms':>9}  deferred modules loaded")
+    for module in args.modules:
+        samples = [import_ms(module) for _ in range(args.runs)]
+        median = statistics.median(samples)
+        loaded = loaded_deferred_modules(module)
+
+        slow = args.max_ms is not None and median > args.max_ms
+        failed = failed or slow or bool(loaded)
+
+        print(f"{module:<28}{median:>11.1f}{min(samples):>9.1f}  {', '.join(loaded) or '-'}"
+              f"{'  OVER BUDGET' if slow else ''}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""
+Benchmarks phantomime against the local stub hub and fixture server from servers.py,
+reporting ops/sec and p50/p99 latency per operation.
+
+    python benchmarks/run.py                                  # run everything, save results/latest.json
+    python benchmarks/run.py --filter wait --latency-ms 5     # only the waits, with a slower hub
+    python benchmarks/run.py --save results/baseline.json     # keep a baseline
+    python benchmarks/run.py --compare results/baseline.json  # exit 1 on a regression past --threshold
+
+Numbers are only comparable between runs on the same machine with the same options.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from typing import Any, Callable, Dict, List
+
+# servers also puts the repository root on sys.path for the phantomime imports below
+from servers import FIXTURES_DIR, start_servers
+
+from phantomime.browser import Browser
+from phantomime.constants import SCREENSHOT_OUTPUT_TYPE_BASE64, SELECTOR_TYPE_CSS, SELECTOR_TYPE_XPATH
+
+BENCHMARKS_DIR: str = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_PATH: str = os.path.join(BENCHMARKS_DIR, "results", "latest.json")
+
+RESULTS_VERSION: int = 1
+
+
+class Context:
+    def __init__(self, hub_url: str, static_url: str):
+        self.hub_url = hub_url
+        self.static_url = static_url
+        self._browser = None
+
+    def page(self, name: str) -> str:
+        return f"{self.static_url}/{name}"
+
+    def browser(self) -> Browser:
+        # one session for every benchmark that does not measure session start/stop itself
+        if self._browser is None:
+            self._browser = Browser.connect(self.hub_url)
+
+        return self._browser
+
+    def loaded(self, name: str = "page.html", in_page_waits: bool = True) -> Browser:
+        browser = self.browser()
+        browser.in_page_waits = in_page_waits
+        browser.load_page(self.page(name))
+
+        return browser
+
+    def close(self):
+        if self._browser is not None:
+            self._browser.quit()
+
+
+def _session_start_stop(ctx: Context) -> Callable:
+    return lambda: Browser.connect(ctx.hub_url).quit()
+
+
+def _load_page(ctx: Context) -> Callable:
+    browser, url = ctx.browser(), ctx.page("page.html")
+    return lambda: browser.load_page(url)
+
+
+def _find_element_css(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.find_element(SELECTOR_TYPE_CSS, "h1#page-title")
+
+
+def _find_element_xpath(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.find_element(SELECTOR_TYPE_XPATH, '//h2[@class="page-subtitle"]')
+
+
+def _find_element_missing(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.find_element(SELECTOR_TYPE_CSS, "#does-not-exist")
+
+
+def _find_elements_css(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.find_elements(SELECTOR_TYPE_CSS, "ul#items li.item a")
+
+
+def _execute_script(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.execute_script("return document.title;")
+
+
+def _is_text_on_page(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.is_text_on_page("this text is expected")
+
+
+def _wait_page_ready(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.wait_page_ready()
+
+
+def _wait_element_exists(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.wait_element_exists(SELECTOR_TYPE_CSS, "h1#page-title")
+
+
+def _wait_text_on_page(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.wait_text_on_page("this text is expected")
+
+
+def _wait_element_is_visible(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    element = browser.find_element(SELECTOR_TYPE_CSS, "h1#page-title")
+    return lambda: browser.wait_element_is_visible(element)
+
+
+def _delayed_element(in_page_waits: bool) -> Callable[[Context], Callable]:
+    # the element shows up 50ms after the page loaded, so this measures how late the wait notices it
+    def setup(ctx: Context) -> Callable:
+        browser, url = ctx.loaded(in_page_waits=in_page_waits), ctx.page("delayed.html")
+
+        def op():
+            browser.load_page(url)
+            browser.wait_element_exists(SELECTOR_TYPE_CSS, "#content p.result")
+
+        return op
+
+    return setup
+
+
+def _screenshot_base64(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.screenshot(SCREENSHOT_OUTPUT_TYPE_BASE64)
+
+
+def _capture_screenshot(ctx: Context) -> Callable:
+    browser = ctx.loaded()
+    return lambda: browser.capture_screenshot()
+
+
+BENCHMARKS: Dict[str, Callable[[Context], Callable]] = {
+    "session_start_stop": _session_start_stop,
+    "load_page": _load_page,
+    "find_element_css": _find_element_css,
+    "find_element_xpath": _find_element_xpath,
+    "find_element_missing": _find_element_missing,
+    "find_elements_css": _find_elements_css,
+    "execute_script": _execute_script,
+    "is_text_on_page": _is_text_on_page,
+    "wait_page_ready": _wait_page_ready,
+    "wait_element_exists": _wait_element_exists,
+    "wait_text_on_page": _wait_text_on_page,
+    "wait_element_is_visible": _wait_element_is_visible,
+    "wait_delayed_element_in_page": _delayed_element(True),
+    "wait_delayed_element_polling": _delayed_element(False),
+    "screenshot_base64": _screenshot_base64,
+    "capture_screenshot": _capture_screenshot,
+}
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    # nearest rank
+    index = max(0, min(len(sorted_samples) - 1, int(round(q * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+
+def measure(op: Callable, iterations: int, warmup: int, max_seconds: float) -> Dict[str, Any]:
+    """
+    Call op warmup times and then up to iterations times or until max_seconds passed, timing every call.
+    """
+    for _ in range(warmup):
+        op()
+
+    samples = []
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    while len(samples) < iterations:
+        t = time.perf_counter()
+        op()
+        done = time.perf_counter()
+        samples.append(done - t)
+        if done >= deadline:
+            break
+
+    elapsed = time.perf_counter() - started
+    samples.sort()
+
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": len(samples) / elapsed,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": _percentile(samples, 0.5) * 1000,
+        "p99_ms": _percentile(samples, 0.99) * 1000,
+        "min_ms": samples[0] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print the change of every benchmark against baseline and return the names that
+    got slower by more than threshold, either in p50 latency or in ops/sec.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<32}{'p50 change':>12}{'ops/sec change':>16}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<32}{'new':>12}{'new':>16}")
+            continue
+
+        p50_change = result["p50_ms"] / base["p50_ms"] - 1
+        ops_change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        regressed = p50_change > threshold or ops_change < -threshold
+        if regressed:
+            regressions.append(name)
+
+        print(f"{name:<32}{p50_change:>+12.1%}{ops_change:>+16.1%}{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="phantomime benchmarks against a local stub hub")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=5, help="time budget per benchmark")
+    parser.add_argument("--latency-ms", type=float, default=1, help="stub hub latency per request")
+    parser.add_argument("--session-start-ms", type=float, default=0, help="extra stub hub latency per new session")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--save", default=DEFAULT_RESULTS_PATH, help="where to write the results as JSON")
+    parser.add_argument("--compare", default=None, help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    hub, static = start_servers(args.latency_ms, args.session_start_ms, args.fixtures)
+    ctx = Context(hub.url, static.url)
+
+    results = {}
+    print(f"{'benchmark':<32}{'ops/sec':>10}{'p50 ms':>10}{'p99 ms':>10}{'round trips':>13}")
+    try:
+        for name, setup in BENCHMARKS.items():
+            if args.filter not in name:
+                continue
+
+            op = setup(ctx)
+            requests_before = hub.requests
+            result = measure(op, args.iterations, args.warmup, args.max_seconds)
+            result["round_trips"] = (hub.requests - requests_before) / (result["iterations"] + args.warmup)
+            results[name] = result
+
+            print(f"{name:<32}{result['ops_per_sec']:>10.1f}{result['p50_ms']:>10.2f}"
+                  f"{result['p99_ms']:>10.2f}{result['round_trips']:>13.1f}")
+    finally:
+        ctx.close()
+        hub.shutdown()
+        static.shutdown()
+
+    current = {
+        "version": RESULTS_VERSION,
+        "created_at": time.time(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            "latency_ms": args.latency_ms,
+            "session_start_ms": args.session_start_ms,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if baseline.get("options") != current["options"]:
+            print("\nwarning: the baseline was run with different options", file=sys.stderr)
+
+        if compare(baseline, current, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,707 @@
+"""
+Local servers for the benchmarks: a static HTTP server for the page fixtures and a stub
+Selenium Hub speaking enough of the W3C WebDriver protocol to drive phantomime against them.
+
+The stub parses the fixture pages into a small DOM and answers element lookups, the phantomime
+wait/text scripts and screenshots from it, after sleeping latency_ms to stand in for the hub and
+browser. Elements with a data-stub-appear-ms or data-stub-remove-ms attribute only exist from
+or until that many milliseconds after the page was loaded, so that the waits have something to wait for.
+
+Run it on its own to point anything at it:
+
+    python benchmarks/servers.py --port 4444 --latency-ms 2
+"""
+
+import argparse
+import base64
+import functools
+import json
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phantomime import scripts  # noqa: E402
+
+FIXTURES_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ELEMENT_KEY: str = "element-6066-11e4-a52e-4f735466cecf"
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_HIDDEN_TAGS = {"head", "script", "style", "template", "title", "noscript"}
+
+IS_PAGE_READY_SCRIPT: str = 'return document.readyState == "complete";'
+TITLE_SCRIPT: str = "return document.title;"
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent", "appear_ms", "remove_ms")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: "_Node" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Any] = []
+        self.parent = parent
+        self.appear_ms = float(attrs.get("data-stub-appear-ms", 0))
+        self.remove_ms = float(attrs.get("data-stub-remove-ms", "inf"))
+
+    def present(self, elapsed_ms: float) -> bool:
+        node = self
+        while node is not None:
+            if not node.appear_ms <= elapsed_ms < node.remove_ms:
+                return False
+            node = node.parent
+        return True
+
+    def visible(self) -> bool:
+        node = self
+        while node is not None:
+            style = node.attrs.get("style", "").replace(" ", "").lower()
+            if (node.tag in _HIDDEN_TAGS or "hidden" in node.attrs
+                    or "display:none" in style or "visibility:hidden" in style):
+                return False
+            node = node.parent
+        return True
+
+    def elements(self, elapsed_ms: float):
+        for child in self.children:
+            if isinstance(child, _Node) and child.present(elapsed_ms):
+                yield child
+                yield from child.elements(elapsed_ms)
+
+    def text(self, elapsed_ms: float) -> str:
+        parts = []
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.present(elapsed_ms) and child.visible():
+                parts.append(child.text(elapsed_ms))
+        return re.sub(r"\s+", " ", " ".join(parts)).strip()
+
+
+class _DomBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.root = _Node("#document", {})
+        self.current = self.root
+        self.title = ""
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, {k: v if v is not None else "" for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in _VOID_TAGS:
+            self.current = node
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+        if self.current.tag == "title":
+            self.title += data
+
+
+# simple selectors only: tag, #id, .class, [attr], [attr=value] compounds joined by descendant/child combinators
+_CSS_COMPOUND = re.compile(r"""([a-zA-Z*][\w-]*)?((?:[#.][\w-]+|\[[\w-]+(?:=(?:"[^"]*"|'[^']*'|[^\]]*))?\])*)""")
+_CSS_PART = re.compile(r"""([#.])([\w-]+)|\[([\w-]+)(?:=("[^"]*"|'[^']*'|[^\]]*))?\]""")
+# //tag[@attr="value"] style location paths
+_XPATH_STEP = re.compile(r"""(//|/)([a-zA-Z*][\w-]*)((?:\[@[\w-]+(?:=(?:"[^"]*"|'[^']*'))?\])*)""")
+_XPATH_PREDICATE = re.compile(r"""\[@([\w-]+)(?:=("[^"]*"|'[^']*'))?\]""")
+
+
+class InvalidSelector(Exception):
+    pass
+
+
+def _unquote(value: str) -> str:
+    if value is not None and len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def _compound_matcher(tag: str, parts: List[Tuple[str, str, str]]) -> Callable[[_Node], bool]:
+    def matches(node: _Node) -> bool:
+        if tag not in (None, "*") and node.tag != tag.lower():
+            return False
+        for kind, name, value in parts:
+            if kind == "#" and node.attrs.get("id") != name:
+                return False
+            if kind == "." and name not in node.attrs.get("class", "").split():
+                return False
+            if kind == "[" and (name not in node.attrs or (value is not None and node.attrs[name] != value)):
+                return False
+        return True
+
+    return matches
+
+
+def _parse_css_compound(text: str) -> Callable[[_Node], bool]:
+    m = _CSS_COMPOUND.fullmatch(text)
+    if m is None or not text:
+        raise InvalidSelector(f"unsupported css selector {text}")
+
+    parts = []
+    for kind, name, attr, value in _CSS_PART.findall(m.group(2)):
+        if kind:
+            parts.append((kind, name, None))
+        else:
+            parts.append(("[", attr, _unquote(value) if value else None))
+
+    return _compound_matcher(m.group(1), parts)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_css(selector: str) -> List[List[Tuple[str, Callable]]]:
+    groups = []
+    for group in selector.split(","):
+        steps = []
+        combinator = " "
+        # attribute values may hold spaces, so brackets are kept whole
+        for token in re.findall(r">|(?:\[[^\]]*\]|[^\s>\[])+", group.strip()):
+            if token == ">":
+                combinator = ">"
+                continue
+            steps.append((combinator, _parse_css_compound(token)))
+            combinator = " "
+        if not steps:
+            raise InvalidSelector(f"empty css selector {selector}")
+        groups.append(steps)
+    return groups
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_xpath(selector: str) -> List[Tuple[str, Callable]]:
+    steps = []
+    pos = 0
+    while pos < len(selector):
+        m = _XPATH_STEP.match(selector, pos)
+        if m is None:
+            raise InvalidSelector(f"unsupported xpath {selector}")
+        parts = [("[", name, _unquote(value) if value else None) for name, value in _XPATH_PREDICATE.findall(m.group(3))]
+        steps.append((" " if m.group(1) == "//" else ">", _compound_matcher(m.group(2), parts)))
+        pos = m.end()
+    if not steps:
+        raise InvalidSelector(f"empty xpath {selector}")
+    return steps
+
+
+def _matches_steps(node: _Node, steps: List[Tuple[str, Callable]], scope: _Node) -> bool:
+    # right to left, like browsers do
+    combinator, matches = steps[-1]
+    if not matches(node):
+        return False
+    if len(steps) == 1:
+        return combinator == " " or node.parent is scope
+
+    ancestor = node.parent
+    while ancestor is not None and ancestor is not scope:
+        if _matches_steps(ancestor, steps[:-1], scope):
+            return True
+        if combinator == ">":
+            return False
+        ancestor = ancestor.parent
+    return False
+
+
+def find_all(root: _Node, using: str, value: str, elapsed_ms: float) -> List[_Node]:
+    if using == "css selector":
+        groups = _compile_css(value)
+        return [n for n in root.elements(elapsed_ms) if any(_matches_steps(n, steps, None) for steps in groups)]
+
+    if using == "xpath":
+        steps = _compile_xpath(value.lstrip("."))
+        # paths that are not relative are evaluated from the document even when searching under an element
+        if not value.startswith("."):
+            while root.parent is not None:
+                root = root.parent
+        return [n for n in root.elements(elapsed_ms) if _matches_steps(n, steps, root)]
+
+    raise InvalidSelector(f"unsupported locator strategy {using}")
+
+
+def _png(width: int, height: int, seed: int = 0) -> bytes:
+    # noisy pixels so that the screenshot has the size of a real one instead of compressing away
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b""))
+
+
+class WebDriverError(Exception):
+    def __init__(self, status: int, error: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+
+
+class _Page:
+    def __init__(self, url: str, html: str):
+        builder = _DomBuilder()
+        builder.feed(html)
+        self.url = url
+        self.html = html
+        self.root = builder.root
+        self.title = builder.title.strip()
+        self.loaded_at = time.monotonic()
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.loaded_at) * 1000
+
+
+class _Session:
+    def __init__(self, session_id: str, browser_name: str):
+        self.id = session_id
+        self.browser_name = browser_name
+        self.page = _Page("about:blank", "<html><head><title></title></head><body></body></html>")
+        self.cookies: Dict[str, Dict[str, Any]] = {}
+        self.window = {"x": 0, "y": 0, "width": 1280, "height": 720}
+        self._ids: Dict[int, str] = {}
+        self._nodes: Dict[str, _Node] = {}
+
+    def ref(self, node: _Node) -> Dict[str, str]:
+        element_id = self._ids.get(id(node))
+        if element_id is None:
+            element_id = self._ids[id(node)] = uuid.uuid4().hex
+            self._nodes[element_id] = node
+        return {ELEMENT_KEY: element_id}
+
+    def node(self, element_id: str) -> _Node:
+        node = self._nodes.get(element_id)
+        if node is None or not node.present(self.page.elapsed_ms()) or not self._attached(node):
+            raise WebDriverError(404, "stale element reference", f"element {element_id} is stale")
+        return node
+
+    def _attached(self, node: _Node) -> bool:
+        while node.parent is not None:
+            node = node.parent
+        return node is self.page.root
+
+    def resolve(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            if ELEMENT_KEY in value:
+                return self.node(value[ELEMENT_KEY])
+            return {k: self.resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        return value
+
+    def navigate(self, url: str):
+        with urlopen(url) as response:
+            html = response.read().decode("utf-8")
+        self.page = _Page(url, html)
+        self._ids = {}
+        self._nodes = {}
+
+
+class StubHub(ThreadingHTTPServer):
+    """
+    A Selenium Hub stand-in. Every request sleeps latency_ms before it is answered
+    and creating a session sleeps session_start_ms on top of it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), latency_ms: float = 1,
+                 session_start_ms: float = 0, screenshot_size: Tuple[int, int] = (1280, 720)):
+        super().__init__(address, _HubHandler)
+        self.latency_ms = latency_ms
+        self.session_start_ms = session_start_ms
+        self.sessions: Dict[str, _Session] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.authorization = None
+        self._sockets = set()
+        self.screenshot = base64.b64encode(_png(*screenshot_size)).decode("ascii")
+        self.element_screenshot = base64.b64encode(_png(200, 50, seed=1)).decode("ascii")
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/wd/hub"
+
+    def drop_connections(self):
+        """
+        Close every open client connection, like a hub dropping idle keep-alive connections.
+        """
+        with self.lock:
+            sockets = list(self._sockets)
+
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class StaticServer(ThreadingHTTPServer):
+    """
+    Serves the fixture pages from directory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory: str = FIXTURES_DIR, address: Tuple[str, int] = ("127.0.0.1", 0)):
+        super().__init__(address, functools.partial(_QuietStaticHandler, directory=directory))
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+class _QuietStaticHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _count_text(text: str, query: Dict[str, Any], limit: int) -> int:
+    pattern = query["text"] if query["regex"] else re.escape(query["text"])
+    flags = re.IGNORECASE if query["ignoreCase"] else 0
+    count = 0
+    for _ in re.finditer(pattern, text, flags):
+        count += 1
+        if limit and count >= limit:
+            break
+    return count
+
+
+def _detect_challenge(root: _Node, params: Dict[str, str], elapsed_ms: float) -> str:
+    if find_all(root, "css selector", params["hcaptcha"], elapsed_ms):
+        return "hcaptcha"
+    if find_all(root, "css selector", params["button"], elapsed_ms):
+        return "verify_button"
+    if _count_text(root.text(elapsed_ms), {"text": params["text"], "regex": False, "ignoreCase": False}, 1):
+        return "interstitial"
+    return "none"
+
+
+class _HubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, which would otherwise hit the 40ms delayed ACK
+    disable_nagle_algorithm = True
+    server: StubHub
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server._sockets.add(self.connection)
+
+    def finish(self):
+        with self.server.lock:
+            self.server._sockets.discard(self.connection)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _reply(self, status: int, value: Any):
+        body = json.dumps({"value": value}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.authorization = self.headers.get("Authorization")
+
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+        # the hub may be mounted anywhere, e.g. under /wd/hub
+        path = self.path.split("?")[0]
+        for marker in ("/session", "/status"):
+            i = path.find(marker)
+            if i >= 0:
+                path = path[i:]
+                break
+
+        try:
+            self._reply(200, self._route(method, path.rstrip("/").split("/")[1:], payload))
+        except WebDriverError as e:
+            self._reply(e.status, {"error": e.error, "message": str(e), "stacktrace": ""})
+        except InvalidSelector as e:
+            self._reply(400, {"error": "invalid selector", "message": str(e), "stacktrace": ""})
+        except Exception as e:
+            self._reply(500, {"error": "unknown error", "message": repr(e), "stacktrace": ""})
+
+    def _route(self, method: str, parts: List[str], payload: Dict[str, Any]) -> Any:
+        if parts == ["status"]:
+            return {"ready": True, "message": "stub hub ready"}
+
+        if parts == ["session"] and method == "POST":
+            return self._new_session(payload)
+
+        if len(parts) < 2 or parts[0] != "session":
+            raise WebDriverError(404, "unknown command", f"unknown command {method} /{'/'.join(parts)}")
+
+        session = self.server.sessions.get(parts[1])
+        if session is None:
+            raise WebDriverError(404, "invalid session id", f"no session {parts[1]}")
+
+        command = parts[2:]
+        if not command and method == "DELETE":
+            with self.server.lock:
+                del self.server.sessions[session.id]
+            return None
+
+        return self._session_command(session, method, command, payload)
+
+    def _new_session(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.server.session_start_ms:
+            time.sleep(self.server.session_start_ms / 1000)
+
+        capabilities = payload.get("capabilities", {}).get("alwaysMatch", {})
+        browser_name = capabilities.get("browserName", "firefox")
+        session = _Session(uuid.uuid4().hex, browser_name)
+        with self.server.lock:
+            self.server.sessions[session.id] = session
+
+        return {"sessionId": session.id, "capabilities": {"browserName": browser_name, "browserVersion": "stub"}}
+
+    def _session_command(self, session: _Session, method: str, command: List[str], payload: Dict[str, Any]) -> Any:
+        page = session.page
+        name = "/".join(command)
+
+        if name == "url":
+            if method == "POST":
+                session.navigate(payload["url"])
+                return None
+            return page.url
+
+        if name == "title":
+            return page.title
+
+        if name == "source":
+            return page.html
+
+        if name in ("timeouts", "window/maximize"):
+            return None
+
+        if name == "window/rect":
+            if method == "POST":
+                session.window.update({k: v for k, v in payload.items() if v is not None})
+            return session.window
+
+        if name in ("element", "elements"):
+            return self._find(session, page.root, payload, name == "elements")
+
+        if name in ("execute/sync", "execute/async"):
+            return self._execute(session, payload["script"], session.resolve(payload.get("args", [])))
+
+        if name in ("screenshot", "moz/screenshot/full"):
+            return self.server.screenshot
+
+        if name == "cookie":
+            if method == "POST":
+                session.cookies[payload["cookie"]["name"]] = payload["cookie"]
+                return None
+            if method == "DELETE":
+                session.cookies.clear()
+                return None
+            return list(session.cookies.values())
+
+        if len(command) == 2 and command[0] == "cookie":
+            if method == "DELETE":
+                session.cookies.pop(command[1], None)
+                return None
+            if command[1] not in session.cookies:
+                raise WebDriverError(404, "no such cookie", f"no cookie {command[1]}")
+            return session.cookies[command[1]]
+
+        if name == "goog/cdp/execute":
+            return {"cookies": []} if payload["cmd"] == "Network.getAllCookies" else {}
+
+        if name == "alert/text":
+            raise WebDriverError(404, "no such alert", "no alert is open")
+
+        if command[0] == "element" and len(command) >= 3:
+            return self._element_command(session, session.node(command[1]), method, command[2:], payload)
+
+        raise WebDriverError(404, "unknown command", f"unknown command {method} {name}")
+
+    def _find(self, session: _Session, root: _Node, payload: Dict[str, Any], many: bool) -> Any:
+        nodes = find_all(root, payload["using"], payload["value"], session.page.elapsed_ms())
+        if many:
+            return [session.ref(n) for n in nodes]
+
+        if not nodes:
+            raise WebDriverError(404, "no such element", f"no element matches {payload['value']}")
+
+        return session.ref(nodes[0])
+
+    def _element_command(self, session: _Session, node: _Node, method: str, command: List[str],
+                         payload: Dict[str, Any]) -> Any:
+        name = "/".join(command)
+        elapsed_ms = session.page.elapsed_ms()
+
+        if name in ("element", "elements"):
+            return self._find(session, node, payload, name == "elements")
+
+        if name == "text":
+            return node.text(elapsed_ms) if node.visible() else ""
+
+        if name == "name":
+            return node.tag
+
+        if name == "displayed":
+            return node.visible()
+
+        if command[0] in ("attribute", "property") and len(command) == 2:
+            return node.attrs.get(command[1])
+
+        if name == "rect":
+            return {"x": 0, "y": 0, "width": 200, "height": 50}
+
+        if name == "screenshot":
+            return self.server.element_screenshot
+
+        if name in ("click", "clear", "value"):
+            return None
+
+        raise WebDriverError(404, "unknown command", f"unknown element command {method} {name}")
+
+    def _check(self, session: _Session, condition: Dict[str, Any]) -> Dict[str, Any]:
+        page = session.page
+        elapsed_ms = page.elapsed_ms()
+        kind = condition["type"]
+
+        if kind in ("exists", "not_exists"):
+            root = condition.get("root") or page.root
+            nodes = find_all(root, "xpath" if condition["xpath"] else "css selector", condition["selector"], elapsed_ms)
+            if kind == "exists":
+                return {"met": bool(nodes), "value": session.ref(nodes[0]) if nodes else None}
+            return {"met": not nodes, "value": None}
+
+        if kind in ("text", "no_text"):
+            found = _count_text(page.root.text(elapsed_ms), condition["query"], 1) > 0
+            return {"met": found == (kind == "text"), "value": None}
+
+        if kind in ("visible", "not_visible", "in_viewport"):
+            visible = condition["element"].present(elapsed_ms) and condition["element"].visible()
+            return {"met": visible != (kind == "not_visible"), "value": None}
+
+        if kind == "page_ready":
+            return {"met": True, "value": None}
+
+        raise WebDriverError(500, "javascript error", f"unknown condition type {kind}")
+
+    def _wait(self, session: _Session, conditions: List[Dict[str, Any]], mode: str, timeout_ms: int) -> Dict:
+        check = any if mode == "any" else all
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            results = [self._check(session, c) for c in conditions]
+            if check(r["met"] for r in results):
+                return {"met": True, "results": results}
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"met": False}
+
+            # the page would notice a mutation right away, 5ms is close enough
+            time.sleep(min(0.005, remaining))
+
+    def _execute(self, session: _Session, script: str, args: List[Any]) -> Any:
+        page = session.page
+
+        if script == IS_PAGE_READY_SCRIPT:
+            return True
+
+        if script == TITLE_SCRIPT:
+            return page.title
+
+        if script == scripts.COUNT_TEXT:
+            return _count_text(page.root.text(page.elapsed_ms()), args[0], args[1])
+
+        if script == scripts.CHECK_CONDITIONS:
+            return [self._check(session, c) for c in args[0]]
+
+        if script == scripts.WAIT_FOR_CONDITIONS:
+            return self._wait(session, args[0], args[1], args[2])
+
+        if script == scripts.DETECT_CHALLENGE:
+            return _detect_challenge(page.root, args[0], page.elapsed_ms())
+
+        if script.startswith("/* isDisplayed */"):
+            return args[0].present(page.elapsed_ms()) and args[0].visible()
+
+        return None
+
+
+def _serve(server: ThreadingHTTPServer) -> ThreadingHTTPServer:
+    threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True).start()
+    return server
+
+
+def start_servers(latency_ms: float = 1, session_start_ms: float = 0,
+                  fixtures_dir: str = FIXTURES_DIR) -> Tuple[StubHub, StaticServer]:
+    """
+    Start a StubHub and a StaticServer on free ports in background threads.
+    """
+    return (_serve(StubHub(latency_ms=latency_ms, session_start_ms=session_start_ms)),
+            _serve(StaticServer(fixtures_dir)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stub selenium hub and fixture server for the benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--static-port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=1)
+    parser.add_argument("--session-start-ms", type=float, default=0)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    hub = StubHub((args.host, args.port), args.latency_ms, args.session_start_ms)
+    static = _serve(StaticServer(args.fixtures, (args.host, args.static_port)))
+
+    print(f"stub hub on {hub.url}, fixtures on {static.url}")
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,15 @@
 __all__ = [
+    'aio',
+    'blocking',
+    'browser',
+    'clearance',
+    'crawl',
+    'docker',
+    'metrics',
     'phantomime',
+    'pool',
+    'profile',
+    'state',
+    'template',
+    'waits',
 ]
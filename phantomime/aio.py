@@ -0,0 +1,1200 @@
+import asyncio
+import base64
+import json
+import logging
+
+from collections import deque
+from time import monotonic, time
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Tuple, Union
+from urllib.parse import unquote, urlsplit
+from . import metrics
+from . import scripts
+from . import screenshots
+from . import waits
+from . import state
+from . import utils
+from .clearance import (
+    ClearanceCache,
+    _CLOUDFLARE_HCAPTCHA_SELECTOR,
+    _CLOUDFLARE_VERIFY_BUTTON_SELECTOR,
+    _CLOUDFLARE_INTERSTITIAL_TEXT,
+    _HUMAN_VERIF_SETTLE_TIMEOUT,
+    _load_page_flow,
+)
+from .query import compile_query_spec
+from .blocking import ResourceBlocking, _resource_report
+from .browser import (
+    DEFAULT_MAX_MUTATIONS,
+    DEFAULT_MAX_SCROLLS,
+    DEFAULT_SCROLL_IDLE_MS,
+    _IN_PAGE_WAIT_MAX_CHUNK,
+    _WAIT_MODE_ANY,
+    _WAIT_MODE_ALL,
+    _by,
+    _scroll_max_wait_ms,
+)
+from .profile import SessionProfile
+from .waits import WaitPolicy, get_default_wait_policy
+from .constants import (
+    DEFAULT_WINDOW_WITDH,
+    DEFAULT_WINDOW_HEIGHT,
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+    SELECTOR_TYPE_CSS,
+    SCREENSHOT_OUTPUT_TYPE_BASE64,
+    SCREENSHOT_OUTPUT_TYPE_FILE,
+    SCREENSHOT_FORMAT_PNG,
+    CHALLENGE_NONE,
+    CHALLENGE_HCAPTCHA,
+    CHALLENGE_VERIFY_BUTTON,
+)
+
+_log = logging.getLogger(__package__)
+
+DEFAULT_MAX_CONNECTIONS: int = 8
+DEFAULT_REQUEST_TIMEOUT: int = 120
+
+_ELEMENT_KEY: str = "element-6066-11e4-a52e-4f735466cecf"
+
+class WebDriverError(Exception):
+    """
+    An error returned by the WebDriver remote end.
+    """
+
+    def __init__(self, status: int, error: str, message: str):
+        super().__init__(f"webdriver error {error} ({status}): {message}")
+        self.status = status
+        self.error = error
+        self.message = message
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class _HTTPConnectionPool:
+    """
+    A minimal HTTP/1.1 client keeping up to max_connections keep-alive connections to one host.
+    With secure set the connections use TLS, authorization is sent as the Authorization header of every request.
+    """
+
+    def __init__(self, host: str, port: int, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 request_timeout: int = DEFAULT_REQUEST_TIMEOUT, secure: bool = False, authorization: str = None):
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.secure = secure
+        self.authorization = authorization
+        self._idle: Deque[_Connection] = deque()
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+    @classmethod
+    def for_url(cls, selenium_hub_url: str, max_connections: int = DEFAULT_MAX_CONNECTIONS) -> "_HTTPConnectionPool":
+        """
+        Create a pool for the host of an http or https hub URL, sending its user:pass@ credentials as basic auth.
+        """
+        url = urlsplit(selenium_hub_url)
+        if url.scheme not in ("http", "https"):
+            raise Exception(f"unsupported selenium hub url scheme {url.scheme}, use http or https")
+
+        secure = url.scheme == "https"
+        authorization = None
+        if url.username is not None:
+            credentials = f"{unquote(url.username)}:{unquote(url.password or '')}"
+            authorization = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+
+        return cls(url.hostname, url.port or (443 if secure else 80), max_connections,
+                   secure=secure, authorization=authorization)
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=True if self.secure else None)
+
+        return _Connection(reader, writer)
+
+    async def _read_body(self, conn: _Connection, headers: Dict[str, str]) -> bytes:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size_line = await conn.reader.readuntil(b"\r\n")
+                size = int(size_line.split(b";", 1)[0], 16)
+                if size == 0:
+                    # skip trailers up to the final empty line
+                    while await conn.reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+
+                    return bytes(body)
+
+                body += await conn.reader.readexactly(size)
+                await conn.reader.readexactly(2)
+
+        if "content-length" in headers:
+            return await conn.reader.readexactly(int(headers["content-length"]))
+
+        headers["connection"] = "close"
+
+        return await conn.reader.read()
+
+    async def _roundtrip(self, conn: _Connection, request: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        conn.writer.write(request)
+        await conn.writer.drain()
+
+        status_line = await conn.reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+
+        headers = {}
+        while True:
+            line = await conn.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = await self._read_body(conn, headers)
+
+        return status, headers, body
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+        """
+        Send a request, reusing an idle keep-alive connection when there is one.
+        """
+        request = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Accept: application/json\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            + (f"Authorization: {self.authorization}\r\n" if self.authorization is not None else "")
+            + "\r\n"
+        ).encode("latin-1") + body
+
+        async with self._semaphore:
+            while True:
+                reused = bool(self._idle)
+                conn = self._idle.popleft() if reused else await self._connect()
+
+                try:
+                    status, headers, response_body = await asyncio.wait_for(
+                        self._roundtrip(conn, request), self.request_timeout)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    conn.close()
+                    if reused:
+                        # the remote end closed the idle connection, retry on a fresh one
+                        _log.debug("idle connection to %s:%s went stale: %s", self.host, self.port, e)
+                        continue
+
+                    raise
+                except:
+                    conn.close()
+                    raise
+
+                if headers.get("connection", "").lower() == "close":
+                    conn.close()
+                else:
+                    self._idle.append(conn)
+
+                return status, response_body
+
+    async def close(self):
+        """
+        Close all idle connections.
+        """
+        while self._idle:
+            conn = self._idle.popleft()
+            conn.close()
+            try:
+                await conn.writer.wait_closed()
+            except Exception:
+                pass
+
+
+class AsyncElement:
+    """
+    A reference to an element of an AsyncBrowser session.
+    """
+
+    def __init__(self, browser: "AsyncBrowser", element_id: str):
+        self.browser = browser
+        self.id = element_id
+
+    def __repr__(self) -> str:
+        return f"<AsyncElement {self.id}>"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AsyncElement) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def to_json(self) -> Dict[str, str]:
+        return {_ELEMENT_KEY: self.id}
+
+    async def click(self):
+        await self.browser._command("POST", f"/element/{self.id}/click", {})
+
+    async def send_keys(self, text: str):
+        await self.browser._command("POST", f"/element/{self.id}/value", {"text": text})
+
+    async def clear(self):
+        await self.browser._command("POST", f"/element/{self.id}/clear", {})
+
+    async def text(self) -> str:
+        return await self.browser._command("GET", f"/element/{self.id}/text")
+
+    async def get_attribute(self, name: str) -> Any:
+        return await self.browser._command("GET", f"/element/{self.id}/attribute/{name}")
+
+    async def get_property(self, name: str) -> Any:
+        return await self.browser._command("GET", f"/element/{self.id}/property/{name}")
+
+    async def is_displayed(self) -> bool:
+        return await self.browser._command("GET", f"/element/{self.id}/displayed")
+
+
+class AsyncAlert:
+    """
+    The user prompt currently shown by an AsyncBrowser session.
+    """
+
+    def __init__(self, browser: "AsyncBrowser", text: str):
+        self.browser = browser
+        self.text = text
+
+    async def accept(self):
+        await self.browser._command("POST", "/alert/accept", {})
+
+    async def dismiss(self):
+        await self.browser._command("POST", "/alert/dismiss", {})
+
+
+@metrics._instrument_methods
+class AsyncBrowser:
+    """
+    A browser session driven over the W3C WebDriver protocol without blocking the event loop.
+    Requests to the hub go through a pool of keep-alive connections, so one event loop can drive many sessions.
+    With in_page_waits the wait_* methods resolve in the page as soon as their condition holds.
+    """
+
+    def __init__(self, http: _HTTPConnectionPool, base_path: str, session_id: str, driver_type: str,
+                 owns_http: bool = True, in_page_waits: bool = True, resource_blocking: ResourceBlocking = None,
+                 profile: SessionProfile = None):
+        self._http = http
+        self._base_path = base_path
+        self._owns_http = owns_http
+        self.session_id = session_id
+        self.driver_type = driver_type
+        self.in_page_waits = in_page_waits
+        self.resource_blocking = resource_blocking
+        self.profile = profile
+        self._user_agent = None
+        # run once in an executor after the session quit, e.g. to release the container it runs in
+        self._on_quit: List[Callable[[], None]] = []
+
+    @classmethod
+    async def connect(
+        cls,
+        selenium_hub_url: str,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        driver_arguments: List[str] = [],
+        user_agent: str = "",
+        disable_notifications: bool = False,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        http: _HTTPConnectionPool = None,
+        in_page_waits: bool = True,
+        resource_blocking: ResourceBlocking = None,
+        profile: SessionProfile = None,
+    ) -> "AsyncBrowser":
+        """
+        Create a new session on the given Selenium Hub.
+        The session is created from profile if given, otherwise from a profile of the other arguments.
+        Pass the http pool of another AsyncBrowser to share its connections.
+        """
+        if profile is None:
+            profile = SessionProfile(driver_type, driver_arguments, user_agent=user_agent,
+                                     disable_notifications=disable_notifications,
+                                     resource_blocking=resource_blocking)
+
+        url = urlsplit(selenium_hub_url)
+        owns_http = http is None
+        if owns_http:
+            http = _HTTPConnectionPool.for_url(selenium_hub_url, max_connections)
+
+        base_path = url.path.rstrip("/")
+        payload = {
+            "capabilities": {
+                "alwaysMatch": profile._capabilities,
+            },
+        }
+
+        _log.debug("creating async %s session on %s", profile.driver_type, selenium_hub_url)
+
+        value = await _request(http, "POST", f"{base_path}/session", payload)
+
+        browser = cls(http, base_path, value["sessionId"], profile.driver_type, owns_http,
+                      in_page_waits, profile.resource_blocking, profile)
+        try:
+            for cmd, params in profile._cdp_commands:
+                await browser._execute_cdp(cmd, params)
+
+            await browser.set_window_size(DEFAULT_WINDOW_WITDH, DEFAULT_WINDOW_HEIGHT)
+        except:
+            await browser.quit()
+            raise
+
+        return browser
+
+    @property
+    def http(self) -> _HTTPConnectionPool:
+        return self._http
+
+    async def _command(self, method: str, path: str, payload: Any = None) -> Any:
+        return self._unwrap(await _request(
+            self._http, method, f"{self._base_path}/session/{self.session_id}{path}", payload))
+
+    async def _execute_cdp(self, cmd: str, params: Dict = {}) -> Any:
+        return await self._command("POST", "/goog/cdp/execute", {"cmd": cmd, "params": params})
+
+    def _unwrap(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self._unwrap(v) for v in value]
+
+        if isinstance(value, dict):
+            if _ELEMENT_KEY in value:
+                return AsyncElement(self, value[_ELEMENT_KEY])
+
+            return {k: self._unwrap(v) for k, v in value.items()}
+
+        return value
+
+    def _wrap(self, value: Any) -> Any:
+        if isinstance(value, AsyncElement):
+            return value.to_json()
+
+        if isinstance(value, (list, tuple)):
+            return [self._wrap(v) for v in value]
+
+        if isinstance(value, dict):
+            return {k: self._wrap(v) for k, v in value.items()}
+
+        return value
+
+    async def _wait_in_page(self, conditions: List[Dict], mode: str, deadline: float) -> List[Dict]:
+        """
+        Wait in the page until any or all of the conditions hold and return their results.
+        Returns None if the in-page wait could not run so that the caller can fall back to polling.
+        """
+        while True:
+            chunk_ms = int(min(deadline - monotonic(), _IN_PAGE_WAIT_MAX_CHUNK) * 1000)
+            if chunk_ms <= 0:
+                utils.backoff_raise_timeout_exception()
+
+            try:
+                result = await self.execute_async_script(scripts.WAIT_FOR_CONDITIONS, conditions, mode, chunk_ms)
+            except WebDriverError as e:
+                # e.g. the page navigated away or the script timeout is too low
+                _log.debug("in-page wait failed, falling back to polling: %s", e)
+                return None
+
+            if not isinstance(result, dict) or "error" in result:
+                _log.debug("in-page wait failed, falling back to polling: %s", result)
+                return None
+
+            if result["met"]:
+                return result["results"]
+
+    async def _wait_for_condition(self, condition: waits.Condition, timeout: float, wait_policy: WaitPolicy,
+                                  poll: Callable[[], Awaitable[Any]], done: Callable[[Any], bool]) -> Any:
+        deadline = monotonic() + timeout
+
+        if self.in_page_waits:
+            results = await self._wait_in_page([condition.params], _WAIT_MODE_ANY, deadline)
+            if results is not None:
+                return results[0]["value"]
+
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        return await wait_policy.poll_async(poll, done, max(deadline - monotonic(), 0))
+
+    async def _wait_for_conditions(self, conditions: List[Dict], mode: str, timeout: float,
+                                   wait_policy: WaitPolicy) -> List[Dict]:
+        deadline = monotonic() + timeout
+
+        if self.in_page_waits:
+            results = await self._wait_in_page(conditions, mode, deadline)
+            if results is not None:
+                return results
+
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        check = any if mode == _WAIT_MODE_ANY else all
+
+        return await wait_policy.poll_async(lambda: self.execute_script(scripts.CHECK_CONDITIONS, conditions),
+                                            lambda results: check(r["met"] for r in results),
+                                            max(deadline - monotonic(), 0))
+
+    async def wait_any(self, conditions: Union[Dict[Any, waits.Condition], List[waits.Condition]], timeout: int = 10,
+                       wait_policy: WaitPolicy = None) -> Tuple[Any, Any]:
+        """
+        Wait until any of the conditions holds, evaluating all of them in a single round-trip per check.
+        Conditions are given as a dict or a list and the key or index of the condition that fired
+        is returned along with its value, e.g. the element for waits.element_exists.
+        """
+        keys, compiled = waits._compile_conditions(conditions)
+        results = await self._wait_for_conditions(compiled, _WAIT_MODE_ANY, timeout, wait_policy)
+        for key, result in zip(keys, results):
+            if result["met"]:
+                return key, result["value"]
+
+    async def wait_all(self, conditions: Union[Dict[Any, waits.Condition], List[waits.Condition]], timeout: int = 10,
+                       wait_policy: WaitPolicy = None) -> Dict[Any, Any]:
+        """
+        Wait until all the conditions hold at the same time, evaluating them in a single round-trip per check.
+        Returns the value of every condition by its key or index.
+        """
+        keys, compiled = waits._compile_conditions(conditions)
+        results = await self._wait_for_conditions(compiled, _WAIT_MODE_ALL, timeout, wait_policy)
+
+        return {key: result["value"] for key, result in zip(keys, results)}
+
+    async def quit(self):
+        """
+        Quit the session and close the connections it owns.
+        """
+        try:
+            await _request(self._http, "DELETE",
+                           f"{self._base_path}/session/{self.session_id}")
+        finally:
+            if self._owns_http:
+                await self._http.close()
+
+            loop = asyncio.get_running_loop()
+            while self._on_quit:
+                await loop.run_in_executor(None, self._on_quit.pop())
+
+    async def set_page_load_timeout(self, page_load_timeout: int):
+        """
+        Set the page load timeout for the session.
+        """
+        await self._command("POST", "/timeouts", {"pageLoad": int(page_load_timeout * 1000)})
+
+    async def set_window_size(self, x: int, y: int):
+        """
+        Set the window size for the session.
+        """
+        await self._command("POST", "/window/rect", {"width": x, "height": y})
+
+    async def _bypass_cloudflare_site_connection_secure_check1(self) -> bool:
+        selector = _CLOUDFLARE_HCAPTCHA_SELECTOR
+
+        await self.switch_to_iframe(SELECTOR_TYPE_CSS, selector)
+
+        # leave the hcaptcha iframe even when the checkbox never showed up
+        try:
+            selector = "label.ctp-checkbox-label"
+            try:
+                el = await self.wait_element_exists(SELECTOR_TYPE_CSS, selector, 20)
+            except:
+                return False
+
+            await el.click()
+        finally:
+            await self.switch_to_main()
+
+        selector = _CLOUDFLARE_HCAPTCHA_SELECTOR
+        try:
+            await self.wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
+        except:
+            return False
+
+        return True
+
+    async def _bypass_cloudflare_site_connection_secure_check2(self) -> bool:
+        selector = _CLOUDFLARE_VERIFY_BUTTON_SELECTOR
+
+        el = await self.find_element(SELECTOR_TYPE_CSS, selector)
+        if el is None:
+            return True
+
+        await el.click()
+
+        try:
+            await self.wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
+        except:
+            return False
+
+        return True
+
+    async def detect_challenge(self) -> str:
+        """
+        Classify the human verification shown by the current page in one script call.
+        Returns one of CHALLENGE_NONE, CHALLENGE_HCAPTCHA, CHALLENGE_VERIFY_BUTTON or CHALLENGE_INTERSTITIAL.
+        """
+        return await self.execute_script(scripts.DETECT_CHALLENGE, {
+            "hcaptcha": _CLOUDFLARE_HCAPTCHA_SELECTOR,
+            "button": _CLOUDFLARE_VERIFY_BUTTON_SELECTOR,
+            "text": _CLOUDFLARE_INTERSTITIAL_TEXT,
+        })
+
+    async def bypass_cloudflare_site_connection_secure(self) -> bool:
+        """
+        Try to bypass the cloudflare site connection secure checker page.
+        Only the handler of the challenge the page shows runs, a page without one returns right away.
+        """
+        challenge = await self.detect_challenge()
+        _log.debug("detected human verification challenge: %s", challenge)
+
+        if challenge == CHALLENGE_NONE:
+            return True
+
+        if challenge == CHALLENGE_HCAPTCHA:
+            solved = await self._bypass_cloudflare_site_connection_secure_check1()
+        elif challenge == CHALLENGE_VERIFY_BUTTON:
+            solved = await self._bypass_cloudflare_site_connection_secure_check2()
+        else:
+            # the interstitial is still checking the browser, there is nothing to click yet
+            solved = False
+
+        if not solved:
+            return False
+
+        return await self.detect_challenge() == CHALLENGE_NONE
+
+    async def _get_user_agent(self) -> str:
+        if self._user_agent is None:
+            self._user_agent = await self.execute_script("return navigator.userAgent;")
+
+        return self._user_agent
+
+    async def _wait_human_verif_settled(self) -> str:
+        """
+        Wait until the page shows one of the cloudflare challenges or no interstitial at all.
+        Returns the CHALLENGE_* constant of what happened or None if the interstitial is still there after the settle timeout.
+        """
+        try:
+            key, _ = await self.wait_any({
+                CHALLENGE_HCAPTCHA: waits.element_exists(SELECTOR_TYPE_CSS, _CLOUDFLARE_HCAPTCHA_SELECTOR),
+                CHALLENGE_VERIFY_BUTTON: waits.element_exists(SELECTOR_TYPE_CSS, _CLOUDFLARE_VERIFY_BUTTON_SELECTOR),
+                CHALLENGE_NONE: waits.text_not_on_page(_CLOUDFLARE_INTERSTITIAL_TEXT),
+            }, _HUMAN_VERIF_SETTLE_TIMEOUT)
+        except Exception:
+            return None
+
+        return key
+
+    async def _inject_clearance(self, cookies: List[Dict[str, Any]], domain: str) -> bool:
+        # firefox can only set cookies for the domain of the current page
+        if self.driver_type != DRIVER_TYPE_CHROME and urlsplit(await self.get_page_url()).hostname != domain:
+            return False
+
+        await self._set_cookies(cookies)
+
+        return True
+
+    async def _navigate(self, url: str):
+        await self._command("POST", "/url", {"url": url})
+
+    async def load_page(self, url: str, try_human_verif_bypass: bool = False,
+                        clearance_cache: ClearanceCache = None):
+        """
+        Navigate to the specified URL.
+        With try_human_verif_bypass the cloudflare human verification is passed if the page shows it.
+        With a clearance_cache the clearance earned for the domain and user agent is injected
+        before navigating and the verification only runs on a cache miss or when it got rejected.
+        """
+        _log.debug("loading page %s", url)
+
+        if not try_human_verif_bypass:
+            await self._navigate(url)
+            return
+
+        flow = _load_page_flow(url, clearance_cache)
+        result = None
+        while True:
+            try:
+                name, args = flow.send(result)
+            except StopIteration:
+                return
+
+            result = await getattr(self, name)(*args)
+
+    async def get_page_source(self) -> str:
+        """
+        Get the HTML source of the current page.
+        """
+        return await self._command("GET", "/source")
+
+    async def get_changes(self, selector: str = None, max_mutations: int = DEFAULT_MAX_MUTATIONS,
+                          include_mutations: bool = True) -> Dict[str, Any]:
+        """
+        Report what changed in the page, or under the element matching the CSS selector, since the previous call.
+        The first call on a page installs a MutationObserver and returns a full snapshot with reset set,
+        later calls only return the mutations along with a hash of the content and no snapshot.
+        More than max_mutations mutations are replaced by a full snapshot, with mutations set to None.
+        Without include_mutations only changed and the hash are reported.
+        Returns a dict with the keys reset, changed, hash, mutations and snapshot.
+        """
+        result = await self.execute_script(scripts.TRACK_CHANGES, {
+            "selector": selector,
+            "maxMutations": max_mutations,
+            "includeMutations": include_mutations,
+        })
+
+        if "error" in result:
+            raise Exception(f"could not track changes: {result['error']}")
+
+        return result
+
+    async def stop_tracking_changes(self):
+        """
+        Remove the MutationObserver installed by get_changes.
+        """
+        await self.execute_script(scripts.STOP_TRACKING_CHANGES)
+
+    async def is_page_ready(self) -> bool:
+        """
+        Check if the current page is fully loaded.
+        """
+        return await self.execute_script('return document.readyState == "complete";')
+
+    async def wait_page_ready(self, timeout: int = 30, wait_policy: WaitPolicy = None):
+        """
+        Wait for the current page to be fully loaded.
+        """
+        _log.debug("waiting max %ssec for page to be ready", timeout)
+        await self._wait_for_condition(waits.page_ready(), timeout, wait_policy, self.is_page_ready, lambda x: x)
+
+    async def get_resource_report(self, baseline: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Returns the number of requests and bytes transferred by the current page along with
+        the number and URLs of the resources it referenced but did not load because of resource_blocking.
+        Pass the report of an unblocked load of the same page as baseline to get bytes_saved and requests_saved.
+        """
+        params = {"types": [], "patterns": []}
+        if self.resource_blocking is not None:
+            params = self.resource_blocking._report_params()
+
+        report = await self.execute_script(scripts.RESOURCE_REPORT, params)
+
+        return _resource_report(report, baseline)
+
+    async def get_page_title(self) -> str:
+        """
+        Returns the title of the current page.
+        """
+        return await self._command("GET", "/title")
+
+    async def get_page_url(self) -> str:
+        """
+        Returns the URL of the current page.
+        """
+        return await self._command("GET", "/url")
+
+    async def scroll_page(self):
+        """
+        Scrolls the page by its current height.
+        """
+        return await self.execute_script('window.scrollTo(0, document.body.scrollHeight);')
+
+    async def scroll_until_stable(self, max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_ms: int = DEFAULT_SCROLL_IDLE_MS,
+                                  item_selector: str = None) -> AsyncIterator[AsyncElement]:
+        """
+        Scroll to the bottom of the page until it stops growing and yield the elements matching item_selector
+        as they appear, the ones already on the page first. After every scroll the page is watched for new nodes
+        and considered settled once none were added for idle_ms, at most 20000. Stops when a scroll neither grew
+        the page nor added items, or after max_scrolls scrolls.
+        """
+        max_wait_ms = _scroll_max_wait_ms(idle_ms)
+
+        for scroll in range(max_scrolls):
+            result = await self.execute_async_script(scripts.SCROLL_AND_COLLECT, {
+                "selector": item_selector,
+                "idleMs": idle_ms,
+                "maxWaitMs": max_wait_ms,
+                "reset": scroll == 0,
+            })
+
+            for item in result["items"]:
+                yield item
+
+            if not result["grew"] and not result["added"]:
+                return
+
+    async def is_text_on_page(self, text: str, regex: bool = False, ignore_case: bool = False) -> bool:
+        """
+        Check if the given text is present in the rendered text of the current page.
+        If regex is set the text is used as a JavaScript regular expression.
+        """
+        return await self.execute_script(scripts.COUNT_TEXT, waits._text_query(text, regex, ignore_case), 1) > 0
+
+    async def count_text_on_page(self, text: str, regex: bool = False, ignore_case: bool = False) -> int:
+        """
+        Count the non-overlapping occurrences of the given text in the rendered text of the current page.
+        If regex is set the text is used as a JavaScript regular expression.
+        """
+        return await self.execute_script(scripts.COUNT_TEXT, waits._text_query(text, regex, ignore_case), 0)
+
+    async def wait_text_on_page(self, text: str, timeout: int = 30, wait_policy: WaitPolicy = None,
+                                regex: bool = False, ignore_case: bool = False):
+        """
+        Wait for the given text to appear on the current page.
+        """
+        _log.debug("waiting %ssec for page to contain text: %s", timeout, text)
+        await self._wait_for_condition(waits.text_on_page(text, regex, ignore_case), timeout, wait_policy,
+                                       lambda: self.is_text_on_page(text, regex, ignore_case), lambda x: x)
+
+    def _locator(self, selector_type: str, selector: str) -> Dict[str, str]:
+        return {"using": _by(selector_type), "value": selector}
+
+    async def find_element(self, selector_type: str, selector: str, parent_el: AsyncElement = None) -> AsyncElement:
+        """
+        Find the first element matching the given selector and selector type.
+        If parent_el is set, it will search for a child element.
+        """
+        locator = self._locator(selector_type, selector)
+        path = "/element" if parent_el is None else f"/element/{parent_el.id}/element"
+
+        try:
+            return await self._command("POST", path, locator)
+        except WebDriverError:
+            return None
+
+    async def find_elements(self, selector_type: str, selector: str, parent_el: AsyncElement = None) -> List[AsyncElement]:
+        """
+        Find all elements matching the given selector and selector type.
+        If parent_el is set, it will search for child elements.
+        """
+        locator = self._locator(selector_type, selector)
+        path = "/elements" if parent_el is None else f"/element/{parent_el.id}/elements"
+
+        try:
+            return await self._command("POST", path, locator)
+        except WebDriverError:
+            return None
+
+    async def wait_element_exists(self, selector_type: str, selector: str, timeout: int = 10,
+                                  parent_el: AsyncElement = None, wait_policy: WaitPolicy = None) -> AsyncElement:
+        """
+        Waits for an element matching the given selector by selector_type to exist on the current page.
+        If parent_el is set, it will wait for a child element.
+        """
+        return await self._wait_for_condition(waits.element_exists(selector_type, selector, parent_el),
+                                              timeout, wait_policy,
+                                              lambda: self.find_element(selector_type, selector, parent_el),
+                                              lambda el: el is not None)
+
+    async def wait_element_not_exists(self, selector_type: str, selector: str, timeout: int = 10,
+                                      parent_el: AsyncElement = None, wait_policy: WaitPolicy = None):
+        """
+        Waits for an element matching the given selector by selector_type to not exist on the current page.
+        If parent_el is set, it will wait for a child element.
+        """
+        await self._wait_for_condition(waits.element_not_exists(selector_type, selector, parent_el),
+                                       timeout, wait_policy,
+                                       lambda: self.find_element(selector_type, selector, parent_el),
+                                       lambda el: el is None)
+
+    async def query_many(self, spec: Dict[str, Union[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Run many named queries in a single execute_script round-trip and return plain Python data.
+        See query.compile_query_spec for the spec format. Single queries map to a dict of the
+        extracted fields or None if nothing matched, multiple queries map to a list of dicts.
+        """
+        return await self.execute_script(scripts.QUERY_MANY, compile_query_spec(spec))
+
+    async def is_element_visible(self, element: AsyncElement) -> bool:
+        """
+        Check if the given element is visible and in the current viewport.
+        """
+        return await element.is_displayed()
+
+    async def wait_element_is_visible(self, element: AsyncElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for the given element to be visible and in the current viewport.
+        """
+        await self._wait_for_condition(waits.element_visible(element), timeout, wait_policy,
+                                       lambda: self.is_element_visible(element), lambda x: x)
+
+    async def wait_element_not_visible(self, element: AsyncElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for the given element to not be visible.
+        """
+        await self._wait_for_condition(waits.element_not_visible(element), timeout, wait_policy,
+                                       lambda: self.is_element_visible(element), lambda x: not x)
+
+    async def is_element_in_viewport(self, element: AsyncElement) -> bool:
+        """
+        Check if an element is visible in the viewport
+        """
+        return await self.execute_script("""
+            var rect = arguments[0].getBoundingClientRect();
+            var width = document.documentElement.clientWidth;
+            var height = document.documentElement.clientHeight;
+            if (rect.right < 0 || rect.bottom < 0) {
+                return false;
+            }
+            return !(rect.left > width || rect.top > height);
+        """, element)
+
+    async def wait_element_in_viewport(self, element: AsyncElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for an element to be visible in viewport
+        """
+        await self._wait_for_condition(waits.element_in_viewport(element), timeout, wait_policy,
+                                       lambda: self.is_element_in_viewport(element), lambda x: x)
+
+    async def scroll_to_element(self, element: AsyncElement):
+        """
+        Scrolls the page so that the given element is visible.
+        """
+        await self.execute_script('return arguments[0].scrollIntoView(true);', element)
+
+    async def switch_to_iframe(self, selector_type: str, selector: str):
+        """
+        Move to an iframe
+        """
+        el = await self.find_element(selector_type, selector)
+        if el is None:
+            raise Exception(f"could not find iframe {selector} by {selector_type}")
+
+        await self._command("POST", "/frame", {"id": el.to_json()})
+
+    async def switch_to_main(self):
+        """
+        Switch to base frame
+        """
+        await self._command("POST", "/frame", {"id": None})
+
+    async def hover_on_element(self, element: AsyncElement):
+        """
+        Hovers the mouse pointer over the given element.
+        """
+        await self._command("POST", "/actions", {"actions": [{
+            "type": "pointer",
+            "id": "mouse",
+            "parameters": {"pointerType": "mouse"},
+            "actions": [{
+                "type": "pointerMove",
+                "duration": 250,
+                "origin": element.to_json(),
+                "x": 0,
+                "y": 0,
+            }],
+        }]})
+
+    async def click_by_js(self, element: AsyncElement):
+        """
+        Clicks the given element using JavaScript.
+        """
+        await self.execute_script('arguments[0].click();', element)
+
+    async def execute_script(self, script: str, *args) -> Any:
+        """
+        Execute a JavaScript script.
+        """
+        return await self._command("POST", "/execute/sync", {
+            "script": script,
+            "args": self._wrap(list(args)),
+        })
+
+    async def execute_async_script(self, script: str, *args) -> Any:
+        """
+        Execute an asynchronous JavaScript script which reports its result through the callback passed as its last argument.
+        """
+        return await self._command("POST", "/execute/async", {
+            "script": script,
+            "args": self._wrap(list(args)),
+        })
+
+    async def get_alert(self) -> AsyncAlert:
+        """
+        Returns the alert currently shown or None if there is none.
+        """
+        try:
+            return AsyncAlert(self, await self._command("GET", "/alert/text"))
+        except WebDriverError as e:
+            if e.error == "no such alert":
+                return None
+
+            raise
+
+    async def wait_for_alert(self, timeout: int = 3, wait_policy: WaitPolicy = None) -> AsyncAlert:
+        """
+        Wait for an alert to be present.
+        """
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        return await wait_policy.poll_async(self.get_alert, lambda alert: alert is not None, timeout)
+
+    async def add_cookie(self, name: str, value: str):
+        """
+        Add a cookie to the page
+        """
+        await self._command("POST", "/cookie", {"cookie": {"name": name, "value": value}})
+
+    async def get_cookie(self, name: str) -> Any:
+        """
+        Get a cookie by name
+        """
+        try:
+            return await self._command("GET", f"/cookie/{name}")
+        except WebDriverError as e:
+            if e.error == "no such cookie":
+                return None
+
+            raise
+
+    async def delete_cookie(self, name: str):
+        """
+        Delete a cookie by name
+        """
+        await self._command("DELETE", f"/cookie/{name}")
+
+    async def clear_cookies(self):
+        """
+        Clear all cookies.
+        """
+        await self._command("DELETE", "/cookie")
+
+    async def _get_cookies(self) -> List[Dict[str, Any]]:
+        # chrome sees the cookies of every domain, firefox only the ones of the current page
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            return [state._cookie_from_cdp(c)
+                    for c in (await self._execute_cdp("Network.getAllCookies"))["cookies"]]
+
+        return await self._command("GET", "/cookie")
+
+    async def _set_cookies(self, cookies: List[Dict[str, Any]]):
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            if cookies:
+                await self._execute_cdp("Network.setCookies",
+                                        {"cookies": [state._cookie_to_cdp(c) for c in cookies]})
+            return
+
+        for cookie in cookies:
+            try:
+                await self._command("POST", "/cookie", {"cookie": state._cookie_to_webdriver(cookie)})
+            except WebDriverError as e:
+                _log.debug("could not set cookie %s for %s: %s", cookie['name'], cookie.get('domain'), e)
+
+    async def export_session_state(self) -> Dict[str, Any]:
+        """
+        Capture the cookies with all their attributes and the localStorage and sessionStorage
+        of the current page's origin, as a JSON serializable dict.
+        Chrome sessions capture the cookies of every domain, Firefox only the ones visible to the current page.
+        """
+        url = await self.get_page_url()
+
+        return state._build_state(url, await self._get_cookies(), await self.execute_script(scripts.GET_STORAGE))
+
+    async def import_session_state(self, session_state: Dict[str, Any]):
+        """
+        Restore a state captured by export_session_state, skipping expired cookies.
+        Cookies and storage can only be set on their own origin, so the browser navigates
+        to the origin of the state first when it is elsewhere and has to.
+        """
+        state._validate_state(session_state)
+
+        cookies = state._live_cookies(session_state["cookies"], time())
+        origin = session_state["origin"]
+        has_storage = bool(session_state["local_storage"] or session_state["session_storage"])
+
+        if origin and (has_storage or self.driver_type != DRIVER_TYPE_CHROME):
+            if state._origin(await self.get_page_url()) != origin:
+                await self.load_page(f"{origin}/")
+
+        await self._set_cookies(cookies)
+
+        if origin and has_storage:
+            await self.execute_script(scripts.SET_STORAGE,
+                                      session_state["local_storage"], session_state["session_storage"])
+
+    async def screenshot(self, output_type: str, filename=None) -> str:
+        """
+        Take a screenshot.
+        """
+        output_type = output_type.upper()
+        if output_type not in (SCREENSHOT_OUTPUT_TYPE_BASE64, SCREENSHOT_OUTPUT_TYPE_FILE):
+            raise Exception(
+                f"invalid screenshot output type. supported: {SCREENSHOT_OUTPUT_TYPE_BASE64}, {SCREENSHOT_OUTPUT_TYPE_FILE}"
+            )
+
+        data = await self._command("GET", "/screenshot")
+        if output_type == SCREENSHOT_OUTPUT_TYPE_BASE64:
+            return data
+
+        png_filename = f"{filename}.png"
+        await asyncio.get_running_loop().run_in_executor(
+            None, _write_file, png_filename, base64.b64decode(data))
+
+        return png_filename
+
+    async def _full_page_png(self, page_metrics: Dict[str, float]) -> bytes:
+        try:
+            return base64.b64decode(await self._command("GET", "/moz/screenshot/full"))
+        except WebDriverError as e:
+            _log.debug("full page screenshot not available, stitching viewport screenshots: %s", e)
+
+        segments = await self._viewport_segments(page_metrics, 0, page_metrics["height"])
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, screenshots._stitch, segments, page_metrics["height"], page_metrics["dpr"])
+
+    async def _clip_png(self, page_metrics: Dict[str, float], clip: Dict[str, float]) -> Tuple[bytes, Dict[str, float]]:
+        # only the viewport screenshots covering clip are taken, returns them stitched and clip moved into the result
+        scroll_y = page_metrics["scrollY"]
+        if scroll_y <= clip["y"] and clip["y"] + clip["height"] <= scroll_y + page_metrics["viewportHeight"]:
+            return base64.b64decode(await self._command("GET", "/screenshot")), dict(clip, y=clip["y"] - scroll_y)
+
+        segments = await self._viewport_segments(page_metrics, clip["y"], clip["y"] + clip["height"])
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, screenshots._stitch_clip, segments, page_metrics["viewportHeight"], clip, page_metrics["dpr"])
+
+    async def _viewport_segments(
+        self,
+        page_metrics: Dict[str, float],
+        top: float,
+        bottom: float,
+    ) -> List[Tuple[float, bytes]]:
+        # viewport screenshots with their scroll offset, from top until bottom of the page is covered
+        segments = []
+        offset = top
+        try:
+            while True:
+                y = await self.execute_script(scripts.SCROLL_TO, offset)
+                if segments and y <= segments[-1][0]:
+                    break
+
+                segments.append((y, base64.b64decode(await self._command("GET", "/screenshot"))))
+                if y + page_metrics["viewportHeight"] >= bottom:
+                    break
+
+                offset = y + page_metrics["viewportHeight"]
+        finally:
+            await self.execute_script(scripts.SCROLL_TO, page_metrics["scrollY"])
+
+        return segments
+
+    async def capture_screenshot(
+        self,
+        element: AsyncElement = None,
+        clip: Tuple[float, float, float, float] = None,
+        full_page: bool = False,
+        image_format: str = SCREENSHOT_FORMAT_PNG,
+        quality: int = None,
+    ) -> bytes:
+        """
+        Take a screenshot and return the encoded image as bytes, without a base64 string or a file in between.
+        element captures only that element and clip an (x, y, width, height) region of the page in CSS pixels,
+        they can not be combined. full_page captures the whole page instead of the viewport.
+        Chrome crops and encodes JPEG/WEBP with the given quality itself,
+        Firefox needs Pillow for anything but plain viewport, element and full page PNGs
+        and only scrolls through the part of the page a clip covers unless full_page is set.
+        Cropping and re-encoding run in the default executor.
+        """
+        image_format = screenshots._validate_format(image_format, quality)
+        if element is not None and clip is not None:
+            raise Exception("screenshot element and clip can not be combined")
+
+        region = None
+        if clip is not None:
+            region = screenshots._clip(clip)
+
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            if element is not None:
+                region = await self.execute_script(scripts.ELEMENT_PAGE_RECT, element)
+            elif region is None and full_page:
+                page_metrics = await self.execute_script(scripts.PAGE_METRICS)
+                region = {"x": 0, "y": 0, "width": page_metrics["width"], "height": page_metrics["height"]}
+
+            result = await self._execute_cdp("Page.captureScreenshot",
+                                             screenshots._cdp_params(image_format, quality, region))
+
+            return base64.b64decode(result["data"])
+
+        scale = 1
+        if element is not None:
+            png = base64.b64decode(await self._command("GET", f"/element/{element.id}/screenshot"))
+        elif region is None and not full_page:
+            png = base64.b64decode(await self._command("GET", "/screenshot"))
+        else:
+            page_metrics = await self.execute_script(scripts.PAGE_METRICS)
+            if full_page:
+                png = await self._full_page_png(page_metrics)
+            else:
+                png, region = await self._clip_png(page_metrics, region)
+
+            scale = page_metrics["dpr"]
+
+        if region is None and image_format == SCREENSHOT_FORMAT_PNG:
+            return png
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, screenshots._convert, png, image_format, quality, region, scale)
+
+    async def write_screenshot(self, stream: Any, **kwargs) -> int:
+        """
+        Take a screenshot like capture_screenshot and write it to a binary file-like object or stream,
+        e.g. an asyncio.StreamWriter. Returns the number of bytes written.
+        """
+        data = await self.capture_screenshot(**kwargs)
+
+        written = stream.write(data)
+        if asyncio.iscoroutine(written):
+            await written
+
+        return len(data)
+
+
+def _write_file(filename: str, data: bytes):
+    with open(filename, "wb") as f:
+        f.write(data)
+
+
+async def _request(http: _HTTPConnectionPool, method: str, path: str, payload: Any = None) -> Any:
+    metrics._count_round_trip()
+
+    body = b""
+    if payload is not None:
+        body = json.dumps(payload).encode("utf-8")
+
+    status, response_body = await http.request(method, path, body)
+
+    response = {}
+    if response_body:
+        response = json.loads(response_body)
+
+    value = response.get("value") if isinstance(response, dict) else None
+    if status >= 400 or (isinstance(value, dict) and "error" in value):
+        if not isinstance(value, dict):
+            value = {}
+
+        raise WebDriverError(status, value.get("error", "unknown error"), value.get("message", ""))
+
+    return value
+
+
+async def connect(
+    selenium_hub_url: str,
+    driver_type: str = DRIVER_TYPE_FIREFOX,
+    driver_arguments: List[str] = [],
+    user_agent: str = "",
+    disable_notifications: bool = False,
+    resource_blocking: ResourceBlocking = None,
+    profile: SessionProfile = None,
+) -> AsyncBrowser:
+    """
+    Create a new async session on the given Selenium Hub.
+    """
+    return await AsyncBrowser.connect(selenium_hub_url, driver_type, driver_arguments,
+                                      user_agent, disable_notifications,
+                                      resource_blocking=resource_blocking, profile=profile)
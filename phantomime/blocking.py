@@ -0,0 +1,140 @@
+from typing import Any, Dict, List, Tuple
+from .constants import (
+    DRIVER_TYPE_CHROME,
+    RESOURCE_TYPE_IMAGE,
+    RESOURCE_TYPE_FONT,
+    RESOURCE_TYPE_MEDIA,
+    RESOURCE_TYPE_STYLESHEET,
+    RESOURCE_TYPE_TRACKER,
+)
+
+TRACKER_URL_PATTERNS: List[str] = [
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*googlesyndication.com/*",
+    "*doubleclick.net/*",
+    "*adservice.google.com/*",
+    "*connect.facebook.net/*",
+    "*hotjar.com/*",
+    "*scorecardresearch.com/*",
+    "*quantserve.com/*",
+]
+
+_resource_type_to_extensions: Dict[str, List[str]] = {
+    RESOURCE_TYPE_IMAGE: ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"],
+    RESOURCE_TYPE_FONT: ["woff", "woff2", "ttf", "otf", "eot"],
+    RESOURCE_TYPE_MEDIA: ["mp4", "webm", "ogg", "ogv", "mp3", "m4a", "m4v", "wav", "flac", "m3u8", "mpd"],
+    RESOURCE_TYPE_STYLESHEET: ["css"],
+}
+
+_resource_type_to_firefox_prefs: Dict[str, Dict[str, Any]] = {
+    RESOURCE_TYPE_IMAGE: {"permissions.default.image": 2},
+    RESOURCE_TYPE_FONT: {"gfx.downloadable_fonts.enabled": False},
+    RESOURCE_TYPE_MEDIA: {
+        "media.autoplay.default": 5,
+        "media.preload.default": 0,
+        "media.preload.auto": 0,
+    },
+    RESOURCE_TYPE_STYLESHEET: {"permissions.default.stylesheet": 2},
+    RESOURCE_TYPE_TRACKER: {
+        "privacy.trackingprotection.enabled": True,
+        "privacy.trackingprotection.socialtracking.enabled": True,
+    },
+}
+
+_resource_types: List[str] = [
+    RESOURCE_TYPE_IMAGE,
+    RESOURCE_TYPE_FONT,
+    RESOURCE_TYPE_MEDIA,
+    RESOURCE_TYPE_STYLESHEET,
+    RESOURCE_TYPE_TRACKER,
+]
+
+
+class ResourceBlocking:
+    """
+    Resources a browser session should not download, by resource type and by URL pattern.
+    URL patterns use * as a wildcard and are matched against the whole URL.
+    Chrome blocks images with a content setting and everything else through the
+    DevTools Network.setBlockedURLs command once the session is created.
+    Firefox blocks resource types with preferences and does not support URL patterns.
+    """
+
+    def __init__(self, resource_types: List[str] = [], url_patterns: List[str] = []):
+        for resource_type in resource_types:
+            if resource_type not in _resource_types:
+                raise Exception(
+                    f"invalid resource type {resource_type}. supported: {', '.join(_resource_types)}")
+
+        self.resource_types = tuple(resource_types)
+        self.url_patterns = tuple(url_patterns)
+
+    def __repr__(self) -> str:
+        return f"ResourceBlocking(resource_types={list(self.resource_types)}, url_patterns={list(self.url_patterns)})"
+
+    def blocked_url_patterns(self) -> List[str]:
+        """
+        All the URL patterns blocked in the page, including the ones derived from the resource types.
+        """
+        patterns = []
+        for resource_type in self.resource_types:
+            if resource_type == RESOURCE_TYPE_TRACKER:
+                patterns.extend(TRACKER_URL_PATTERNS)
+                continue
+
+            for extension in _resource_type_to_extensions[resource_type]:
+                patterns.append(f"*.{extension}")
+                patterns.append(f"*.{extension}?*")
+
+        patterns.extend(self.url_patterns)
+
+        return patterns
+
+    def _chrome_prefs(self) -> Dict[str, Any]:
+        if RESOURCE_TYPE_IMAGE in self.resource_types:
+            return {"profile.managed_default_content_settings.images": 2}
+
+        return {}
+
+    def _chrome_cdp_commands(self) -> List[Tuple[str, Dict]]:
+        patterns = self.blocked_url_patterns()
+        if not patterns:
+            return []
+
+        return [
+            ("Network.enable", {}),
+            ("Network.setBlockedURLs", {"urls": patterns}),
+        ]
+
+    def _firefox_prefs(self) -> Dict[str, Any]:
+        if self.url_patterns:
+            raise Exception(f"url pattern blocking is only supported by driver type {DRIVER_TYPE_CHROME}")
+
+        prefs = {}
+        for resource_type in self.resource_types:
+            prefs.update(_resource_type_to_firefox_prefs[resource_type])
+
+        return prefs
+
+    def _report_params(self) -> Dict[str, List[str]]:
+        patterns = list(self.url_patterns)
+        if RESOURCE_TYPE_TRACKER in self.resource_types:
+            patterns.extend(TRACKER_URL_PATTERNS)
+
+        return {"types": list(self.resource_types), "patterns": patterns}
+
+
+def _resource_report(report: Dict[str, Any], baseline: Dict[str, Any] = None) -> Dict[str, Any]:
+    result = {
+        "requests": report["requests"],
+        "bytes": report["bytes"],
+        "blocked_requests": report["blockedRequests"],
+        "blocked_urls": report["blockedUrls"],
+    }
+
+    # blocked resources were never fetched, so their size only shows against an unblocked load of the page
+    if baseline is not None:
+        result["bytes_saved"] = max(0, baseline["bytes"] - result["bytes"])
+        result["requests_saved"] = max(0, baseline["requests"] - result["requests"])
+
+    return result
@@ -0,0 +1,1014 @@
+from __future__ import annotations
+
+import base64
+import logging
+from . import metrics
+from . import utils
+from . import scripts
+from . import screenshots
+from . import waits
+from . import state
+from .query import compile_query_spec
+from .blocking import ResourceBlocking, _resource_report
+from .profile import SessionProfile, _validate_driver_type
+from .clearance import (
+    ClearanceCache,
+    _CLOUDFLARE_HCAPTCHA_SELECTOR,
+    _CLOUDFLARE_VERIFY_BUTTON_SELECTOR,
+    _CLOUDFLARE_INTERSTITIAL_TEXT,
+    _HUMAN_VERIF_SETTLE_TIMEOUT,
+    _load_page_flow,
+)
+from .waits import WaitPolicy, get_default_wait_policy
+
+from time import monotonic, time
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Iterator, Tuple, Union
+from urllib.parse import urlsplit
+from .constants import (
+    DEFAULT_WINDOW_WITDH,
+    DEFAULT_WINDOW_HEIGHT,
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+    SELECTOR_TYPE_XPATH,
+    SELECTOR_TYPE_CSS,
+    SCREENSHOT_OUTPUT_TYPE_BASE64,
+    SCREENSHOT_OUTPUT_TYPE_FILE,
+    SCREENSHOT_FORMAT_PNG,
+    CHALLENGE_NONE,
+    CHALLENGE_HCAPTCHA,
+    CHALLENGE_VERIFY_BUTTON,
+)
+
+if TYPE_CHECKING:
+    # any selenium.webdriver import loads every driver selenium ships, so the
+    # runtime imports are deferred to the functions that need them
+    from selenium.webdriver import Remote
+    from selenium.webdriver.common.alert import Alert
+    from selenium.webdriver.remote.webelement import WebElement
+    from selenium.webdriver.support.ui import Select
+
+_log = logging.getLogger(__package__)
+
+# in-page waits are split in chunks that stay below the default 30sec script timeout
+_IN_PAGE_WAIT_MAX_CHUNK: float = 20
+
+_WAIT_MODE_ANY: str = "any"
+_WAIT_MODE_ALL: str = "all"
+
+DEFAULT_MAX_SCROLLS: int = 50
+DEFAULT_SCROLL_IDLE_MS: int = 1000
+
+DEFAULT_MAX_MUTATIONS: int = 1000
+
+# the W3C locator strategies behind selenium's By.XPATH and By.CSS_SELECTOR
+_selector_type_to_by: Dict[str, str] = {
+    SELECTOR_TYPE_XPATH: "xpath",
+    SELECTOR_TYPE_CSS: "css selector",
+}
+
+_screenshot_output_types: List[str] = [
+    SCREENSHOT_OUTPUT_TYPE_BASE64,
+    SCREENSHOT_OUTPUT_TYPE_FILE,
+]
+
+
+def _by(selector_type: str) -> str:
+    """
+    Resolve a selector type to its selenium By strategy, validating it in the same lookup.
+    """
+    try:
+        return _selector_type_to_by[selector_type]
+    except KeyError:
+        raise Exception(
+            f"invalid selector type {selector_type}. supported: {', '.join(_selector_type_to_by)}"
+        )
+
+
+_CDP_EXECUTE_ROUTE: str = "/session/$sessionId/goog/cdp/execute"
+
+
+def _scroll_max_wait_ms(idle_ms: int) -> int:
+    # one scroll is a single async script, so its wait has to fit in the same chunk as the in-page waits
+    max_chunk_ms = int(_IN_PAGE_WAIT_MAX_CHUNK * 1000)
+    if not 0 < idle_ms <= max_chunk_ms:
+        raise Exception(f"idle_ms must be between 1 and {max_chunk_ms}")
+
+    return min(idle_ms * 10, max_chunk_ms)
+
+
+def _execute_cdp(driver: Remote, cmd: str, params: Dict = {}) -> Any:
+    """
+    Run a Chrome DevTools Protocol command through the hub on a chrome session.
+    webdriver.Remote talks to the hub through a plain RemoteConnection that lacks the route, so it is added on first use.
+    """
+    commands = driver.command_executor._commands
+    if "executeCdpCommand" not in commands:
+        commands["executeCdpCommand"] = ("POST", _CDP_EXECUTE_ROUTE)
+
+    return driver.execute("executeCdpCommand", {"cmd": cmd, "params": params})["value"]
+
+
+def _new_driver(selenium_hub_url: str, profile: SessionProfile) -> Remote:
+    """
+    Create a new webdriver.Remote session on the given Selenium Hub with the capabilities compiled by the profile.
+    """
+    from selenium.webdriver import Remote
+
+    driver = Remote(
+        command_executor=selenium_hub_url,
+        options=profile._selenium_options(),
+    )
+
+    if profile._cdp_commands:
+        try:
+            for cmd, params in profile._cdp_commands:
+                _execute_cdp(driver, cmd, params)
+        except:
+            driver.quit()
+            raise
+
+    driver.set_window_size(DEFAULT_WINDOW_WITDH, DEFAULT_WINDOW_HEIGHT)
+
+    return driver
+
+
+@metrics._instrument_methods
+class Browser:
+    """
+    A handle on one browser session.
+    All the phantomime functions are available as methods bound to the handle's own driver
+    so that several sessions can be driven side by side, e.g. from different threads.
+    With in_page_waits the wait_* methods resolve in the page as soon as their condition holds
+    and only fall back to polling from Python if the in-page wait can not run.
+    resource_blocking records what the session was created to block, see get_resource_report,
+    and profile the SessionProfile it was created from, if any.
+    """
+
+    def __init__(
+        self,
+        driver: Remote,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        in_page_waits: bool = True,
+        resource_blocking: ResourceBlocking = None,
+        profile: SessionProfile = None,
+    ):
+        self.driver_type = _validate_driver_type(driver_type)
+        self.driver = driver
+        self.in_page_waits = in_page_waits
+        self.resource_blocking = resource_blocking
+        self.profile = profile
+        self._user_agent = None
+        # run once after the session quit, e.g. to release the container it runs in
+        self._on_quit: List[Callable[[], None]] = []
+        metrics._count_connection_round_trips(getattr(driver, "command_executor", None))
+
+    @classmethod
+    def connect(
+        cls,
+        selenium_hub_url: str,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        driver_arguments: List[str] = [],
+        user_agent: str = "",
+        disable_notifications: bool = False,
+        in_page_waits: bool = True,
+        resource_blocking: ResourceBlocking = None,
+        profile: SessionProfile = None,
+    ) -> "Browser":
+        """
+        Create a new session on the given Selenium Hub and return a Browser handle on it.
+        The session is created from profile if given, otherwise from a profile of the other arguments.
+        """
+        if profile is None:
+            profile = SessionProfile(driver_type, driver_arguments, user_agent=user_agent,
+                                     disable_notifications=disable_notifications,
+                                     resource_blocking=resource_blocking)
+
+        return cls(
+            _new_driver(selenium_hub_url, profile),
+            profile.driver_type,
+            in_page_waits,
+            profile.resource_blocking,
+            profile,
+        )
+
+    def _wait_in_page(self, conditions: List[Dict], mode: str, deadline: float) -> List[Dict]:
+        """
+        Wait in the page until any or all of the conditions hold and return their results.
+        Returns None if the in-page wait could not run so that the caller can fall back to polling.
+        """
+        while True:
+            chunk_ms = int(min(deadline - monotonic(), _IN_PAGE_WAIT_MAX_CHUNK) * 1000)
+            if chunk_ms <= 0:
+                utils.backoff_raise_timeout_exception()
+
+            try:
+                result = self.driver.execute_async_script(
+                    scripts.WAIT_FOR_CONDITIONS, conditions, mode, chunk_ms)
+            except Exception as e:
+                # e.g. the page navigated away or the script timeout is too low
+                _log.debug("in-page wait failed, falling back to polling: %s", e)
+                return None
+
+            if not isinstance(result, dict) or "error" in result:
+                _log.debug("in-page wait failed, falling back to polling: %s", result)
+                return None
+
+            if result["met"]:
+                return result["results"]
+
+    def _wait_for_condition(self, condition: waits.Condition, timeout: float, wait_policy: WaitPolicy,
+                            poll: Callable, done: Callable[[Any], bool], *args) -> Any:
+        deadline = monotonic() + timeout
+
+        if self.in_page_waits:
+            results = self._wait_in_page([condition.params], _WAIT_MODE_ANY, deadline)
+            if results is not None:
+                return results[0]["value"]
+
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        return wait_policy.poll(poll, done, max(deadline - monotonic(), 0), *args)
+
+    def _wait_for_conditions(self, conditions: List[Dict], mode: str, timeout: float,
+                             wait_policy: WaitPolicy) -> List[Dict]:
+        deadline = monotonic() + timeout
+
+        if self.in_page_waits:
+            results = self._wait_in_page(conditions, mode, deadline)
+            if results is not None:
+                return results
+
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        check = any if mode == _WAIT_MODE_ANY else all
+
+        return wait_policy.poll(self.driver.execute_script, lambda results: check(r["met"] for r in results),
+                                max(deadline - monotonic(), 0), scripts.CHECK_CONDITIONS, conditions)
+
+    def wait_any(self, conditions: Union[Dict[Any, waits.Condition], List[waits.Condition]], timeout: int = 10,
+                 wait_policy: WaitPolicy = None) -> Tuple[Any, Any]:
+        """
+        Wait until any of the conditions holds, evaluating all of them in a single round-trip per check.
+        Conditions are given as a dict or a list and the key or index of the condition that fired
+        is returned along with its value, e.g. the element for waits.element_exists.
+        """
+        keys, compiled = waits._compile_conditions(conditions)
+
+        _log.debug("waiting %ssec for any of %s conditions", timeout, len(compiled))
+
+        results = self._wait_for_conditions(compiled, _WAIT_MODE_ANY, timeout, wait_policy)
+        for key, result in zip(keys, results):
+            if result["met"]:
+                return key, result["value"]
+
+    def wait_all(self, conditions: Union[Dict[Any, waits.Condition], List[waits.Condition]], timeout: int = 10,
+                 wait_policy: WaitPolicy = None) -> Dict[Any, Any]:
+        """
+        Wait until all the conditions hold at the same time, evaluating them in a single round-trip per check.
+        Returns the value of every condition by its key or index.
+        """
+        keys, compiled = waits._compile_conditions(conditions)
+
+        _log.debug("waiting %ssec for all of %s conditions", timeout, len(compiled))
+
+        results = self._wait_for_conditions(compiled, _WAIT_MODE_ALL, timeout, wait_policy)
+
+        return {key: result["value"] for key, result in zip(keys, results)}
+
+    def quit(self):
+        """
+        Quit the session.
+        """
+        try:
+            self.driver.quit()
+        finally:
+            while self._on_quit:
+                self._on_quit.pop()()
+
+    def set_page_load_timeout(self, page_load_timeout: int):
+        """
+        Set the page load timeout for the session.
+        """
+        self.driver.set_page_load_timeout(page_load_timeout)
+
+    def set_window_size(self, x: int, y: int):
+        """
+        Set the window size for the session.
+        """
+        self.driver.set_window_size(x, y)
+
+    def _bypass_cloudflare_site_connection_secure_check1(self) -> bool:
+        selector = _CLOUDFLARE_HCAPTCHA_SELECTOR
+
+        self.switch_to_iframe(SELECTOR_TYPE_CSS, selector)
+
+        # leave the hcaptcha iframe even when the checkbox never showed up
+        try:
+            selector = "label.ctp-checkbox-label"
+            try:
+                el = self.wait_element_exists(SELECTOR_TYPE_CSS, selector, 20)
+            except:
+                return False
+
+            el.click()
+        finally:
+            self.switch_to_main()
+
+        selector = _CLOUDFLARE_HCAPTCHA_SELECTOR
+        try:
+            self.wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
+        except:
+            return False
+
+        return True
+
+    def _bypass_cloudflare_site_connection_secure_check2(self) -> bool:
+        selector = _CLOUDFLARE_VERIFY_BUTTON_SELECTOR
+
+        el = self.find_element(SELECTOR_TYPE_CSS, selector)
+        if el is None:
+            return True
+
+        el.click()
+
+        try:
+            self.wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
+        except:
+            return False
+
+        return True
+
+    def detect_challenge(self) -> str:
+        """
+        Classify the human verification shown by the current page in one script call.
+        Returns one of CHALLENGE_NONE, CHALLENGE_HCAPTCHA, CHALLENGE_VERIFY_BUTTON or CHALLENGE_INTERSTITIAL.
+        """
+        return self.execute_script(scripts.DETECT_CHALLENGE, {
+            "hcaptcha": _CLOUDFLARE_HCAPTCHA_SELECTOR,
+            "button": _CLOUDFLARE_VERIFY_BUTTON_SELECTOR,
+            "text": _CLOUDFLARE_INTERSTITIAL_TEXT,
+        })
+
+    def bypass_cloudflare_site_connection_secure(self) -> bool:
+        """
+        Try to bypass the cloudflare site connection secure checker page.
+        Only the handler of the challenge the page shows runs, a page without one returns right away.
+        """
+        challenge = self.detect_challenge()
+        _log.debug("detected human verification challenge: %s", challenge)
+
+        if challenge == CHALLENGE_NONE:
+            return True
+
+        if challenge == CHALLENGE_HCAPTCHA:
+            solved = self._bypass_cloudflare_site_connection_secure_check1()
+        elif challenge == CHALLENGE_VERIFY_BUTTON:
+            solved = self._bypass_cloudflare_site_connection_secure_check2()
+        else:
+            # the interstitial is still checking the browser, there is nothing to click yet
+            solved = False
+
+        if not solved:
+            return False
+
+        return self.detect_challenge() == CHALLENGE_NONE
+
+    def _get_user_agent(self) -> str:
+        if self._user_agent is None:
+            self._user_agent = self.execute_script("return navigator.userAgent;")
+
+        return self._user_agent
+
+    def _wait_human_verif_settled(self) -> str:
+        """
+        Wait until the page shows one of the cloudflare challenges or no interstitial at all.
+        Returns the CHALLENGE_* constant of what happened or None if the interstitial is still there after the settle timeout.
+        """
+        try:
+            key, _ = self.wait_any({
+                CHALLENGE_HCAPTCHA: waits.element_exists(SELECTOR_TYPE_CSS, _CLOUDFLARE_HCAPTCHA_SELECTOR),
+                CHALLENGE_VERIFY_BUTTON: waits.element_exists(SELECTOR_TYPE_CSS, _CLOUDFLARE_VERIFY_BUTTON_SELECTOR),
+                CHALLENGE_NONE: waits.text_not_on_page(_CLOUDFLARE_INTERSTITIAL_TEXT),
+            }, _HUMAN_VERIF_SETTLE_TIMEOUT)
+        except Exception:
+            return None
+
+        return key
+
+    def _inject_clearance(self, cookies: List[Dict[str, Any]], domain: str) -> bool:
+        # firefox can only set cookies for the domain of the current page
+        if self.driver_type != DRIVER_TYPE_CHROME and urlsplit(self.driver.current_url).hostname != domain:
+            return False
+
+        self._set_cookies(cookies)
+
+        return True
+
+    def _navigate(self, url: str):
+        self.driver.get(url)
+
+    def load_page(self, url: str, try_human_verif_bypass: bool = False,
+                  clearance_cache: ClearanceCache = None) -> str:
+        """
+        Navigate to the specified URL.
+        With try_human_verif_bypass the cloudflare human verification is passed if the page shows it.
+        With a clearance_cache the clearance earned for the domain and user agent is injected
+        before navigating and the verification only runs on a cache miss or when it got rejected.
+        """
+        _log.debug("loading page %s", url)
+
+        if not try_human_verif_bypass:
+            self._navigate(url)
+            return
+
+        flow = _load_page_flow(url, clearance_cache)
+        result = None
+        while True:
+            try:
+                name, args = flow.send(result)
+            except StopIteration:
+                return
+
+            result = getattr(self, name)(*args)
+
+    def get_page_source(self) -> str:
+        """
+        Get the HTML source of the current page.
+        """
+        return self.driver.page_source
+
+    def get_changes(self, selector: str = None, max_mutations: int = DEFAULT_MAX_MUTATIONS,
+                    include_mutations: bool = True) -> Dict[str, Any]:
+        """
+        Report what changed in the page, or under the element matching the CSS selector, since the previous call.
+        The first call on a page installs a MutationObserver and returns a full snapshot with reset set,
+        later calls only return the mutations along with a hash of the content and no snapshot.
+        More than max_mutations mutations are replaced by a full snapshot, with mutations set to None.
+        Without include_mutations only changed and the hash are reported.
+        Returns a dict with the keys reset, changed, hash, mutations and snapshot.
+        """
+        result = self.execute_script(scripts.TRACK_CHANGES, {
+            "selector": selector,
+            "maxMutations": max_mutations,
+            "includeMutations": include_mutations,
+        })
+
+        if "error" in result:
+            raise Exception(f"could not track changes: {result['error']}")
+
+        return result
+
+    def stop_tracking_changes(self):
+        """
+        Remove the MutationObserver installed by get_changes.
+        """
+        self.execute_script(scripts.STOP_TRACKING_CHANGES)
+
+    def is_page_ready(self) -> bool:
+        """
+        Check if the current page is fully loaded.
+        """
+        _log.debug("checking if page is ready")
+
+        return self.execute_script(
+            'return document.readyState == "complete";'
+        )
+
+    def wait_page_ready(self, timeout: int = 30, wait_policy: WaitPolicy = None):
+        """
+        Wait for the current page to be fully loaded.
+        """
+        _log.debug("waiting max %ssec for page to be ready", timeout)
+
+        self._wait_for_condition(waits.page_ready(), timeout, wait_policy, self.is_page_ready, lambda x: x)
+
+    def get_resource_report(self, baseline: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Returns the number of requests and bytes transferred by the current page along with
+        the number and URLs of the resources it referenced but did not load because of resource_blocking.
+        The size of a blocked resource is never known, so pass the report of an unblocked load of the same page
+        as baseline to get bytes_saved and requests_saved.
+        """
+        params = {"types": [], "patterns": []}
+        if self.resource_blocking is not None:
+            params = self.resource_blocking._report_params()
+
+        report = self.execute_script(scripts.RESOURCE_REPORT, params)
+
+        return _resource_report(report, baseline)
+
+    def get_page_title(self) -> str:
+        """
+        Returns the title of the current page.
+        """
+        return self.driver.title
+
+    def get_page_url(self) -> str:
+        """
+        Returns the URL of the current page.
+        """
+        return self.driver.current_url
+
+    def scroll_page(self):
+        """
+        Scrolls the page by its current height.
+        """
+        _log.debug("scrolling page")
+
+        return self.execute_script('window.scrollTo(0, document.body.scrollHeight);')
+
+    def scroll_until_stable(self, max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_ms: int = DEFAULT_SCROLL_IDLE_MS,
+                            item_selector: str = None) -> Iterator[WebElement]:
+        """
+        Scroll to the bottom of the page until it stops growing and yield the elements matching item_selector
+        as they appear, the ones already on the page first. After every scroll the page is watched for new nodes
+        and considered settled once none were added for idle_ms, at most 20000. Stops when a scroll neither grew
+        the page nor added items, or after max_scrolls scrolls.
+        """
+        max_wait_ms = _scroll_max_wait_ms(idle_ms)
+
+        for scroll in range(max_scrolls):
+            _log.debug("scrolling page until stable, scroll %s/%s", scroll + 1, max_scrolls)
+
+            result = self.driver.execute_async_script(scripts.SCROLL_AND_COLLECT, {
+                "selector": item_selector,
+                "idleMs": idle_ms,
+                "maxWaitMs": max_wait_ms,
+                "reset": scroll == 0,
+            })
+
+            yield from result["items"]
+
+            if not result["grew"] and not result["added"]:
+                return
+
+    def is_text_on_page(self, text: str, regex: bool = False, ignore_case: bool = False) -> bool:
+        """
+        Check if the given text is present in the rendered text of the current page.
+        If regex is set the text is used as a JavaScript regular expression.
+        """
+        _log.debug("checking if page contains text: %s", text)
+
+        return self.execute_script(scripts.COUNT_TEXT, waits._text_query(text, regex, ignore_case), 1) > 0
+
+    def count_text_on_page(self, text: str, regex: bool = False, ignore_case: bool = False) -> int:
+        """
+        Count the non-overlapping occurrences of the given text in the rendered text of the current page.
+        If regex is set the text is used as a JavaScript regular expression.
+        """
+        _log.debug("counting occurrences of text on page: %s", text)
+
+        return self.execute_script(scripts.COUNT_TEXT, waits._text_query(text, regex, ignore_case), 0)
+
+    def wait_text_on_page(self, text: str, timeout: int = 30, wait_policy: WaitPolicy = None,
+                          regex: bool = False, ignore_case: bool = False):
+        """
+        Wait for the given text to appear on the current page.
+        """
+        _log.debug("waiting %ssec for page to contain text: %s", timeout, text)
+
+        self._wait_for_condition(waits.text_on_page(text, regex, ignore_case),
+                                 timeout, wait_policy, self.is_text_on_page, lambda x: x, text, regex, ignore_case)
+
+    def find_element(self, selector_type: str, selector: str, parent_el: WebElement = None) -> WebElement:
+        """
+        Find the first element matching the given selector and selector type.
+        If parent_el is set, it will search for a child element.
+        """
+        by = _by(selector_type)
+
+        _log.debug(
+            "finding element matching %s by selector type %s", selector, selector_type)
+
+        try:
+            root_el = self.driver
+            if parent_el is not None:
+                root_el = parent_el
+
+            return root_el.find_element(by, selector)
+        except:
+            return None
+
+    def find_select_element(self, selector_type: str, selector: str, parent_el: WebElement = None) -> Select:
+        """
+        Find the first element matching the given selector and selector type and return it as a Select wrapped WebElement.
+        If parent_el is set, it will search for a child element.
+        """
+        _log.debug(
+            "finding element matching %s by selector type %s and returning it as a Select wrapped WebElement", selector, selector_type)
+
+        from selenium.webdriver.support.ui import Select
+
+        return Select(self.find_element(selector_type, selector, parent_el))
+
+    def find_elements(self, selector_type: str, selector: str, parent_el: WebElement = None) -> List[WebElement]:
+        """
+        Find all elements matching the given selector and selector type.
+        If parent_el is set, it will search for child elements.
+        """
+        by = _by(selector_type)
+
+        _log.debug(
+            "finding elements matching %s by selector type %s", selector, selector_type)
+
+        try:
+            root_el = self.driver
+            if parent_el is not None:
+                root_el = parent_el
+
+            return root_el.find_elements(by, selector)
+        except:
+            return None
+
+    def wait_element_exists(self, selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None,
+                            wait_policy: WaitPolicy = None) -> WebElement:
+        """
+        Waits for an element matching the given selector by selector_type to exist on the current page.
+        If parent_el is set, it will wait for a child element.
+        """
+        _log.debug(
+            "waiting for element matching %s by selector type %s to exist", selector, selector_type)
+
+        return self._wait_for_condition(waits.element_exists(selector_type, selector, parent_el),
+                                        timeout, wait_policy, self.find_element, lambda el: el is not None,
+                                        selector_type, selector, parent_el)
+
+    def wait_element_not_exists(self, selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None,
+                                wait_policy: WaitPolicy = None):
+        """
+        Waits for an element matching the given selector by selector_type to not exist on the current page.
+        If parent_el is set, it will wait for a child element.
+        """
+        _log.debug(
+            "waiting for element matching %s by selector type %s to not exist", selector, selector_type)
+
+        self._wait_for_condition(waits.element_not_exists(selector_type, selector, parent_el),
+                                 timeout, wait_policy, self.find_element, lambda el: el is None,
+                                 selector_type, selector, parent_el)
+
+    def query_many(self, spec: Dict[str, Union[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Run many named queries in a single execute_script round-trip and return plain Python data.
+        See query.compile_query_spec for the spec format. Single queries map to a dict of the
+        extracted fields or None if nothing matched, multiple queries map to a list of dicts.
+        """
+        queries = compile_query_spec(spec)
+
+        _log.debug("running %s queries in one script", len(queries))
+
+        return self.execute_script(scripts.QUERY_MANY, queries)
+
+    def is_element_visible(self, element: WebElement) -> bool:
+        """
+        Check if the given element is visible and in the current viewport.
+        """
+        return element.is_displayed()
+
+    def wait_element_is_visible(self, element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for the given element to be visible and in the current viewport.
+        """
+        _log.debug(
+            "waiting %ssec for element to be visible and in the current viewport: %s", timeout, element)
+
+        self._wait_for_condition(waits.element_visible(element),
+                                 timeout, wait_policy, self.is_element_visible, lambda x: x, element)
+
+    def wait_element_not_visible(self, element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for the given element to not be visible.
+        """
+        _log.debug(
+            "waiting %ssec for element to not be visible: %s", timeout, element)
+
+        self._wait_for_condition(waits.element_not_visible(element),
+                                 timeout, wait_policy, self.is_element_visible, lambda x: not x, element)
+
+    def is_element_in_viewport(self, element: WebElement) -> bool:
+        """
+        Check if an element is visible in the viewport
+        """
+        _log.debug("checking if element %s is in viewport", element)
+
+        bounding_rect = self.execute_script("""
+            var rect = arguments[0].getBoundingClientRect();
+            return {
+                x: rect.x,
+                y: rect.y,
+                width: rect.width,
+                height: rect.height,
+                top: rect.top,
+                right: rect.right,
+                bottom: rect.bottom,
+                left: rect.left
+            };
+        """, element)
+
+        viewport_size = self.execute_script("""
+            return {
+                width: document.documentElement.clientWidth,
+                height: document.documentElement.clientHeight
+            };
+        """)
+
+        if bounding_rect["right"] < 0 or bounding_rect["bottom"] < 0:
+            return False
+        if bounding_rect["left"] > viewport_size["width"] or bounding_rect["top"] > viewport_size["height"]:
+            return False
+        return True
+
+    def wait_element_in_viewport(self, element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
+        """
+        Wait for an element to be visible in viewport
+        """
+        _log.debug("waiting %ssec for element %s to be viewport", timeout, element)
+
+        self._wait_for_condition(waits.element_in_viewport(element),
+                                 timeout, wait_policy, self.is_element_in_viewport, lambda x: x, element)
+
+    def scroll_to_element(self, element: WebElement):
+        """
+        Scrolls the page so that the given element is visible.
+        """
+        _log.debug("scrolling to element %s", element)
+        self.execute_script('return arguments[0].scrollIntoView(true);', element)
+
+    def switch_to_iframe(self, selector_type: str, selector: str):
+        """
+        Move to an iframe
+        """
+        _log.debug("switching to iframe %s by %s", selector, selector_type)
+        el = self.find_element(selector_type, selector)
+        if el is None:
+            raise Exception(f"could not find iframe {selector} by {selector_type}")
+
+        self.driver.switch_to.frame(el)
+
+    def switch_to_main(self):
+        """
+        Switch to base frame
+        """
+        _log.debug("switching to main")
+        self.driver.switch_to.default_content()
+
+    def hover_on_element(self, element: WebElement):
+        """
+        Hovers the mouse pointer over the given element.
+        """
+        _log.debug("hovering to element %s", element)
+
+        from selenium.webdriver.common.action_chains import ActionChains
+
+        actions = ActionChains(self.driver)
+        actions.move_to_element(element)
+        actions.perform()
+
+    def click_by_js(self, element: WebElement):
+        """
+        Clicks the given element using JavaScript.
+        """
+        _log.debug("clicking on element %s by JS", element)
+        self.execute_script('arguments[0].click();', element)
+
+    def execute_script(self, script: str, *args) -> Any:
+        """
+        Execute a JavaScript script.
+        """
+        _log.debug("executing script %s", script)
+
+        return self.driver.execute_script(script, *args)
+
+    def wait_for_alert(self, timeout: int = 3, wait_policy: WaitPolicy = None) -> Alert:
+        """
+        Wait for an alert to be present.
+        """
+        _log.debug("waiting %ssec for an alert", timeout)
+
+        if wait_policy is None:
+            wait_policy = get_default_wait_policy()
+
+        return wait_policy.poll(self._get_alert, lambda alert: alert is not None, timeout)
+
+    def _get_alert(self) -> Alert:
+        from selenium.common.exceptions import NoAlertPresentException
+
+        try:
+            return self.driver.switch_to.alert
+        except NoAlertPresentException:
+            return None
+
+    def add_cookie(self, name: str, value: str):
+        """
+        Add a cookie to the page
+        """
+        _log.debug("adding cookie %s = %s", name, value)
+
+        cookie = {
+            "name": name,
+            "value": value,
+        }
+
+        self.driver.add_cookie(cookie)
+
+    def get_cookie(self, name: str) -> Any:
+        """
+        Get a cookie by name
+        """
+        _log.debug("getting cookie %s", name)
+
+        return self.driver.get_cookie(name)
+
+    def delete_cookie(self, name: str):
+        """
+        Delete a cookie by name
+        """
+        _log.debug("deleting cookie %s", name)
+
+        return self.driver.delete_cookie(name)
+
+    def clear_cookies(self):
+        """
+        Clear all cookies.
+        """
+        self.driver.delete_all_cookies()
+
+    def _get_cookies(self) -> List[Dict[str, Any]]:
+        # chrome sees the cookies of every domain, firefox only the ones of the current page
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            return [state._cookie_from_cdp(c) for c in _execute_cdp(self.driver, "Network.getAllCookies")["cookies"]]
+
+        return self.driver.get_cookies()
+
+    def _set_cookies(self, cookies: List[Dict[str, Any]]):
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            if cookies:
+                _execute_cdp(self.driver, "Network.setCookies",
+                             {"cookies": [state._cookie_to_cdp(c) for c in cookies]})
+            return
+
+        for cookie in cookies:
+            try:
+                self.driver.add_cookie(state._cookie_to_webdriver(cookie))
+            except Exception as e:
+                _log.debug("could not set cookie %s for %s: %s", cookie['name'], cookie.get('domain'), e)
+
+    def export_session_state(self) -> Dict[str, Any]:
+        """
+        Capture the cookies with all their attributes and the localStorage and sessionStorage
+        of the current page's origin, as a JSON serializable dict.
+        Chrome sessions capture the cookies of every domain, Firefox only the ones visible to the current page.
+        """
+        url = self.driver.current_url
+        _log.debug("exporting session state of %s", url)
+
+        return state._build_state(url, self._get_cookies(), self.execute_script(scripts.GET_STORAGE))
+
+    def import_session_state(self, session_state: Dict[str, Any]):
+        """
+        Restore a state captured by export_session_state, skipping expired cookies.
+        Cookies and storage can only be set on their own origin, so the browser navigates
+        to the origin of the state first when it is elsewhere and has to.
+        """
+        state._validate_state(session_state)
+
+        cookies = state._live_cookies(session_state["cookies"], time())
+        origin = session_state["origin"]
+        has_storage = bool(session_state["local_storage"] or session_state["session_storage"])
+        _log.debug("importing session state of %s with %s cookies", origin, len(cookies))
+
+        if origin and (has_storage or self.driver_type != DRIVER_TYPE_CHROME):
+            if state._origin(self.driver.current_url) != origin:
+                self.load_page(f"{origin}/")
+
+        self._set_cookies(cookies)
+
+        if origin and has_storage:
+            self.execute_script(scripts.SET_STORAGE,
+                                session_state["local_storage"], session_state["session_storage"])
+
+    def screenshot(self, output_type: str, filename=None) -> str:
+        """
+        Take a screenshot.
+        """
+        output_type = output_type.upper()
+        if output_type not in _screenshot_output_types:
+            raise Exception(
+                f"invalid screenshot output type. supported: {', '.join(_screenshot_output_types)}"
+            )
+
+        filename_log_part = f" and filename {filename}"
+        _log.debug(
+            "taking a screenshot having output type %s%s", output_type, filename_log_part)
+
+        if output_type == SCREENSHOT_OUTPUT_TYPE_BASE64:
+            return self.driver.get_screenshot_as_base64()
+
+        png_filename = f"{filename}.png"
+        if not self.driver.get_screenshot_as_file(png_filename):
+            raise Exception("could not get screenshot as file")
+
+        return png_filename
+
+    def _full_page_png(self, page_metrics: Dict[str, float]) -> bytes:
+        try:
+            return base64.b64decode(self.driver.execute("FULL_PAGE_SCREENSHOT")["value"])
+        except Exception as e:
+            _log.debug("full page screenshot not available, stitching viewport screenshots: %s", e)
+
+        segments = self._viewport_segments(page_metrics, 0, page_metrics["height"])
+
+        return screenshots._stitch(segments, page_metrics["height"], page_metrics["dpr"])
+
+    def _clip_png(self, page_metrics: Dict[str, float], clip: Dict[str, float]) -> Tuple[bytes, Dict[str, float]]:
+        # only the viewport screenshots covering clip are taken, returns them stitched and clip moved into the result
+        scroll_y = page_metrics["scrollY"]
+        if scroll_y <= clip["y"] and clip["y"] + clip["height"] <= scroll_y + page_metrics["viewportHeight"]:
+            return self.driver.get_screenshot_as_png(), dict(clip, y=clip["y"] - scroll_y)
+
+        segments = self._viewport_segments(page_metrics, clip["y"], clip["y"] + clip["height"])
+
+        return screenshots._stitch_clip(segments, page_metrics["viewportHeight"], clip, page_metrics["dpr"])
+
+    def _viewport_segments(self, page_metrics: Dict[str, float], top: float, bottom: float) -> List[Tuple[float, bytes]]:
+        # viewport screenshots with their scroll offset, from top until bottom of the page is covered
+        segments = []
+        offset = top
+        try:
+            while True:
+                y = self.execute_script(scripts.SCROLL_TO, offset)
+                if segments and y <= segments[-1][0]:
+                    break
+
+                segments.append((y, self.driver.get_screenshot_as_png()))
+                if y + page_metrics["viewportHeight"] >= bottom:
+                    break
+
+                offset = y + page_metrics["viewportHeight"]
+        finally:
+            self.execute_script(scripts.SCROLL_TO, page_metrics["scrollY"])
+
+        return segments
+
+    def capture_screenshot(
+        self,
+        element: WebElement = None,
+        clip: Tuple[float, float, float, float] = None,
+        full_page: bool = False,
+        image_format: str = SCREENSHOT_FORMAT_PNG,
+        quality: int = None,
+    ) -> bytes:
+        """
+        Take a screenshot and return the encoded image as bytes, without a base64 string or a file in between.
+        element captures only that element and clip an (x, y, width, height) region of the page in CSS pixels,
+        they can not be combined. full_page captures the whole page instead of the viewport.
+        Chrome crops and encodes JPEG/WEBP with the given quality itself,
+        Firefox needs Pillow for anything but plain viewport, element and full page PNGs
+        and only scrolls through the part of the page a clip covers unless full_page is set.
+        """
+        image_format = screenshots._validate_format(image_format, quality)
+        if element is not None and clip is not None:
+            raise Exception("screenshot element and clip can not be combined")
+
+        _log.debug("capturing %s screenshot", image_format)
+
+        region = None
+        if clip is not None:
+            region = screenshots._clip(clip)
+
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            if element is not None:
+                region = self.execute_script(scripts.ELEMENT_PAGE_RECT, element)
+            elif region is None and full_page:
+                page_metrics = self.execute_script(scripts.PAGE_METRICS)
+                region = {"x": 0, "y": 0, "width": page_metrics["width"], "height": page_metrics["height"]}
+
+            data = _execute_cdp(self.driver, "Page.captureScreenshot",
+                                screenshots._cdp_params(image_format, quality, region))["data"]
+
+            return base64.b64decode(data)
+
+        if element is not None:
+            return screenshots._convert(element.screenshot_as_png, image_format, quality)
+
+        if region is None and not full_page:
+            return screenshots._convert(self.driver.get_screenshot_as_png(), image_format, quality)
+
+        page_metrics = self.execute_script(scripts.PAGE_METRICS)
+        if full_page:
+            png = self._full_page_png(page_metrics)
+        else:
+            png, region = self._clip_png(page_metrics, region)
+
+        return screenshots._convert(png, image_format, quality, region, page_metrics["dpr"])
+
+    def write_screenshot(self, stream: Any, **kwargs) -> int:
+        """
+        Take a screenshot like capture_screenshot and write it to a binary file-like object or stream.
+        Returns the number of bytes written.
+        """
+        data = self.capture_screenshot(**kwargs)
+        stream.write(data)
+
+        return len(data)
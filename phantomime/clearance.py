@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import threading
+
+from time import time
+from typing import Any, Dict, Generator, List, Tuple
+from urllib.parse import urlsplit
+from . import state
+from .constants import CHALLENGE_NONE
+
+_log = logging.getLogger(__package__)
+
+DEFAULT_CLEARANCE_TTL: int = 1800
+
+CLEARANCE_COOKIE_NAME: str = "cf_clearance"
+
+_CLOUDFLARE_HCAPTCHA_SELECTOR: str = 'div.hcaptcha-box iframe'
+_CLOUDFLARE_VERIFY_BUTTON_SELECTOR: str = 'input[type="button"][value="Verify you are human"]'
+_CLOUDFLARE_INTERSTITIAL_TEXT: str = "Checking if the site connection is secure"
+
+_HUMAN_VERIF_MAX_ATTEMPTS: int = 20
+# how long the cloudflare interstitial may take to either go away or show its challenge
+_HUMAN_VERIF_SETTLE_TIMEOUT: int = 10
+
+
+def _is_clearance_cookie(cookie: Dict[str, Any]) -> bool:
+    # cf_clearance along with the __cf_bm bot management and other cloudflare cookies it is bound to
+    name = cookie["name"]
+    return name.startswith("cf_") or name.startswith("__cf")
+
+
+def _cookie_matches_host(cookie: Dict[str, Any], host: str) -> bool:
+    domain = cookie.get("domain", "").lstrip(".").lower()
+    return domain == "" or host == domain or host.endswith(f".{domain}")
+
+
+class ClearanceCache:
+    """
+    Cloudflare clearance cookies per domain and user agent, since cf_clearance is only honored
+    for the user agent that earned it. Entries expire with the cf_clearance cookie or after
+    default_ttl seconds if it has no expiry. With a directory the entries are also kept on disk
+    in a SessionStateStore and shared across processes.
+    """
+
+    def __init__(self, default_ttl: int = DEFAULT_CLEARANCE_TTL, directory: str = None):
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[List[Dict[str, Any]], float]] = {}
+        self._store = None
+        if directory is not None:
+            self._store = state.SessionStateStore(directory)
+
+    @staticmethod
+    def _store_key(domain: str, user_agent: str) -> str:
+        return f"{domain}-{hashlib.sha1(user_agent.encode()).hexdigest()[:16]}"
+
+    def get(self, domain: str, user_agent: str) -> List[Dict[str, Any]]:
+        """
+        Returns the clearance cookies cached for domain and user agent or None on a miss or expiry.
+        """
+        key = (domain.lower(), user_agent)
+        now = time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cookies, expires_at = entry
+                if expires_at > now:
+                    return state._live_cookies(cookies, now)
+
+                del self._entries[key]
+
+        if self._store is None:
+            return None
+
+        saved = self._store.load(self._store_key(*key))
+        if saved is None or not any(c["name"] == CLEARANCE_COOKIE_NAME for c in saved["cookies"]):
+            return None
+
+        with self._lock:
+            self._entries[key] = (saved["cookies"], self._expires_at(saved["cookies"], now))
+
+        return saved["cookies"]
+
+    def _expires_at(self, cookies: List[Dict[str, Any]], now: float) -> float:
+        for cookie in cookies:
+            if cookie["name"] == CLEARANCE_COOKIE_NAME and "expiry" in cookie:
+                return cookie["expiry"]
+
+        return now + self.default_ttl
+
+    def put(self, domain: str, user_agent: str, cookies: List[Dict[str, Any]]) -> bool:
+        """
+        Cache the cloudflare cookies among the given ones for domain and user agent.
+        Returns False and caches nothing if there is no cf_clearance cookie for domain among them.
+        """
+        domain = domain.lower()
+        cookies = [c for c in cookies if _is_clearance_cookie(c) and _cookie_matches_host(c, domain)]
+        if not any(c["name"] == CLEARANCE_COOKIE_NAME for c in cookies):
+            return False
+
+        now = time()
+        expires_at = self._expires_at(cookies, now)
+
+        _log.debug("caching cloudflare clearance for %s for %ssec", domain, int(expires_at - now))
+
+        with self._lock:
+            self._entries[(domain, user_agent)] = (cookies, expires_at)
+
+        if self._store is not None:
+            self._store.save(state._build_state(f"https://{domain}/", cookies, {"local": {}, "session": {}}),
+                             self._store_key(domain, user_agent), int(expires_at - now))
+
+        return True
+
+    def invalidate(self, domain: str, user_agent: str):
+        """
+        Forget the clearance cached for domain and user agent, e.g. after cloudflare rejected it.
+        """
+        key = (domain.lower(), user_agent)
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self._store is not None:
+            self._store.delete(self._store_key(*key))
+
+
+def _load_page_flow(url: str, clearance_cache: ClearanceCache) -> Generator[Tuple[str, Tuple], Any, None]:
+    """
+    The page load with cloudflare human verification, shared by Browser.load_page and AsyncBrowser.load_page.
+    Yields (method name, args) for the browser to call and is sent back the result,
+    so the sync and async browsers run the same steps with their own I/O.
+    """
+    domain = urlsplit(url).hostname or ""
+    user_agent = None
+    cached = None
+    injected = False
+    if clearance_cache is not None:
+        user_agent = yield "_get_user_agent", ()
+        cached = clearance_cache.get(domain, user_agent)
+        if cached is not None:
+            injected = yield "_inject_clearance", (cached, domain)
+
+    yield "_navigate", (url,)
+    settled = yield "_wait_human_verif_settled", ()
+
+    if cached is not None:
+        if settled == CHALLENGE_NONE:
+            return
+
+        if not injected and (yield "_inject_clearance", (cached, domain)):
+            yield "_navigate", (url,)
+            settled = yield "_wait_human_verif_settled", ()
+            if settled == CHALLENGE_NONE:
+                return
+
+        _log.debug("cached cloudflare clearance for %s was rejected", domain)
+        clearance_cache.invalidate(domain, user_agent)
+
+    c = 1
+    while True:
+        if (yield "bypass_cloudflare_site_connection_secure", ()):
+            if clearance_cache is not None:
+                clearance_cache.put(domain, user_agent, (yield "_get_cookies", ()))
+
+            return
+
+        if c >= _HUMAN_VERIF_MAX_ATTEMPTS:
+            raise Exception("could not bypass captcha")
+
+        c += 1
+        yield "_wait_human_verif_settled", ()
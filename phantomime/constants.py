@@ -0,0 +1,39 @@
+DEFAULT_WINDOW_WITDH: int = 640
+DEFAULT_WINDOW_HEIGHT: int = 480
+
+DRIVER_TYPE_FIREFOX: str = "FIREFOX"
+DRIVER_TYPE_CHROME: str = "CHROME"
+
+SELECTOR_TYPE_XPATH: str = "XPATH"
+SELECTOR_TYPE_CSS: str = "CSS_SELECTOR"
+
+SELECT_OPTION_SELECTOR_TYPE_INDEX: str = "INDEX"
+SELECT_OPTION_SELECTOR_TYPE_TEXT: str = "TEXT"
+SELECT_OPTION_SELECTOR_TYPE_VALUE: str = "VALUE"
+
+SCREENSHOT_OUTPUT_TYPE_BASE64: str = "BASE64"
+SCREENSHOT_OUTPUT_TYPE_FILE: str = "FILE"
+
+SCREENSHOT_FORMAT_PNG: str = "PNG"
+SCREENSHOT_FORMAT_JPEG: str = "JPEG"
+SCREENSHOT_FORMAT_WEBP: str = "WEBP"
+
+QUERY_FIELD_TEXT: str = "text"
+QUERY_FIELD_HTML: str = "html"
+QUERY_FIELD_VISIBLE: str = "visible"
+QUERY_FIELD_RECT: str = "rect"
+
+WAIT_STRATEGY_CONSTANT: str = "CONSTANT"
+WAIT_STRATEGY_EXPONENTIAL: str = "EXPONENTIAL"
+WAIT_STRATEGY_FIBONACCI: str = "FIBONACCI"
+
+RESOURCE_TYPE_IMAGE: str = "image"
+RESOURCE_TYPE_FONT: str = "font"
+RESOURCE_TYPE_MEDIA: str = "media"
+RESOURCE_TYPE_STYLESHEET: str = "stylesheet"
+RESOURCE_TYPE_TRACKER: str = "tracker"
+
+CHALLENGE_NONE: str = "none"
+CHALLENGE_HCAPTCHA: str = "hcaptcha"
+CHALLENGE_VERIFY_BUTTON: str = "verify_button"
+CHALLENGE_INTERSTITIAL: str = "interstitial"
@@ -0,0 +1,214 @@
+import logging
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import urlsplit
+from .browser import Browser
+from .pool import SessionPool
+from .blocking import ResourceBlocking
+from .profile import SessionProfile
+from .constants import DRIVER_TYPE_FIREFOX
+
+_log = logging.getLogger(__package__)
+
+DEFAULT_CONCURRENCY: int = 4
+DEFAULT_MAX_RETRIES: int = 1
+
+# how many urls per worker may be read ahead of time while their hosts are at max_per_host
+_MAX_DEFERRED_PER_WORKER: int = 16
+
+
+class CrawlResult:
+    """
+    The outcome of crawling one url.
+    value holds what the handler returned and error the exception of the last attempt if all attempts failed.
+    """
+
+    def __init__(self, url: str, value: Any = None, error: Exception = None, attempts: int = 0):
+        self.url = url
+        self.value = value
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return f"CrawlResult(url={self.url!r}, ok={self.ok}, attempts={self.attempts})"
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+class _Crawl:
+    def __init__(
+        self,
+        urls: Iterable[str],
+        handler: Callable[[Browser, str], Any],
+        session_pool: SessionPool,
+        concurrency: int,
+        max_retries: int,
+        max_per_host: int,
+        page_ready_timeout: int,
+    ):
+        self.urls = iter(urls)
+        self.handler = handler
+        self.session_pool = session_pool
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_per_host = max_per_host
+        self.page_ready_timeout = page_ready_timeout
+
+        self._exhausted = False
+        self._deferred: Deque[Tuple[str, int]] = deque()
+        self._active_per_host: Dict[str, int] = {}
+
+    def _host_available(self, url: str) -> bool:
+        if self.max_per_host is None:
+            return True
+
+        return self._active_per_host.get(_host(url), 0) < self.max_per_host
+
+    def _next(self) -> Tuple[str, int]:
+        # retries and urls held back by the per host limit go first
+        for i, item in enumerate(self._deferred):
+            if self._host_available(item[0]):
+                del self._deferred[i]
+                return item
+
+        while not self._exhausted and len(self._deferred) < self.concurrency * _MAX_DEFERRED_PER_WORKER:
+            try:
+                url = next(self.urls)
+            except StopIteration:
+                self._exhausted = True
+                break
+
+            if self._host_available(url):
+                return url, 0
+
+            self._deferred.append((url, 0))
+
+        return None
+
+    def _visit(self, url: str) -> Any:
+        browser = self.session_pool.checkout()
+        try:
+            browser.load_page(url)
+            browser.wait_page_ready(self.page_ready_timeout)
+            value = self.handler(browser, url)
+        except:
+            # the session may be the cause, the retry gets another one
+            self.session_pool.checkin(browser, discard=True)
+            raise
+
+        self.session_pool.checkin(browser)
+
+        return value
+
+    def run(self, executor: ThreadPoolExecutor) -> Iterator[CrawlResult]:
+        in_flight: Dict[Future, Tuple[str, int]] = {}
+        try:
+            while True:
+                while len(in_flight) < self.concurrency:
+                    item = self._next()
+                    if item is None:
+                        break
+
+                    url, attempts = item
+                    host = _host(url)
+                    self._active_per_host[host] = self._active_per_host.get(host, 0) + 1
+                    in_flight[executor.submit(self._visit, url)] = (url, attempts + 1)
+
+                if not in_flight:
+                    return
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, attempts = in_flight.pop(future)
+                    host = _host(url)
+                    self._active_per_host[host] -= 1
+
+                    error = future.exception()
+                    if error is None:
+                        yield CrawlResult(url, value=future.result(), attempts=attempts)
+                        continue
+
+                    if attempts <= self.max_retries:
+                        _log.debug("retrying %s after attempt %s failed: %s", url, attempts, error)
+                        self._deferred.appendleft((url, attempts))
+                        continue
+
+                    _log.debug("giving up on %s after %s attempts: %s", url, attempts, error)
+                    yield CrawlResult(url, error=error, attempts=attempts)
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def crawl(
+    urls: Iterable[str],
+    handler: Callable[[Browser, str], Any],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    selenium_hub_url: str = None,
+    session_pool: SessionPool = None,
+    driver_type: str = DRIVER_TYPE_FIREFOX,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    max_per_host: int = None,
+    page_ready_timeout: int = 30,
+    driver_arguments: List[str] = [],
+    user_agent: str = "",
+    disable_notifications: bool = False,
+    resource_blocking: ResourceBlocking = None,
+    profile: SessionProfile = None,
+) -> Iterator[CrawlResult]:
+    """
+    Load every url in one of concurrency browser sessions, wait for the page to be ready and
+    call handler(browser, url) on it. Results are yielded as CrawlResult objects in completion order.
+    urls can be any iterable, including a generator, and is consumed lazily.
+    A failed page is retried up to max_retries times on another session and at most max_per_host
+    pages of the same host are loaded at the same time when max_per_host is set.
+    Sessions come from session_pool if given or from a pool of concurrency sessions
+    on selenium_hub_url that lives for the duration of the crawl, created from profile if given.
+    That pool is only created once the first result is requested and closed when the crawl ends,
+    so a returned iterator that is never iterated holds no sessions.
+    """
+    if concurrency < 1:
+        raise Exception("concurrency must be at least 1")
+
+    if max_per_host is not None and max_per_host < 1:
+        raise Exception("max_per_host must be at least 1")
+
+    new_pool = None
+    if session_pool is None:
+        if selenium_hub_url is None:
+            raise Exception("either selenium_hub_url or session_pool is required")
+
+        new_pool = partial(SessionPool, selenium_hub_url, driver_type, max_size=concurrency,
+                           driver_arguments=driver_arguments, user_agent=user_agent,
+                           disable_notifications=disable_notifications,
+                           resource_blocking=resource_blocking, profile=profile)
+
+    job = _Crawl(urls, handler, session_pool, concurrency, max_retries, max_per_host, page_ready_timeout)
+
+    return _run(job, new_pool)
+
+
+def _run(job: _Crawl, new_pool: Callable[[], SessionPool]) -> Iterator[CrawlResult]:
+    # runs on the first next(), so the pool owned by the crawl never outlives an iterator that was dropped unused
+    owns_pool = new_pool is not None
+    if owns_pool:
+        job.session_pool = new_pool()
+
+    _log.debug("crawling with %s sessions", job.concurrency)
+
+    executor = ThreadPoolExecutor(max_workers=job.concurrency, thread_name_prefix="phantomime-crawl")
+    try:
+        yield from job.run(executor)
+    finally:
+        executor.shutdown(wait=True)
+        if owns_pool:
+            job.session_pool.close()
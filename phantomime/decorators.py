@@ -25,26 +25,6 @@ def _must_have_driver_uninitialized(fn: Callable) -> Any:
     return wrapper
 
 
-def _must_have_supported_selector_type(fn: Callable) -> Any:
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        selector_type = args[0].upper()
-
-        supported_selector_types = [
-            phantomime.SELECTOR_TYPE_XPATH,
-            phantomime.SELECTOR_TYPE_CSS
-        ]
-
-        if selector_type not in supported_selector_types:
-            raise Exception(
-                f"invalid selector type {selector_type}. supported: {', '.join(supported_selector_types)}"
-            )
-
-        return fn(*args, **kwargs)
-
-    return wrapper
-
-
 def _must_have_supported_select_option_selector_type(fn: Callable) -> Any:
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -69,7 +49,7 @@ def _must_have_supported_select_option_selector_type(fn: Callable) -> Any:
 def _must_have_supported_driver_type(fn: Callable) -> Any:
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        driver_type = args[0].upper()
+        driver_type = (args[0] if args else kwargs.get("driver_type", phantomime.DRIVER_TYPE_FIREFOX)).upper()
 
         supported_driver_types = [
             phantomime.DRIVER_TYPE_FIREFOX,
@@ -85,22 +65,3 @@ def _must_have_supported_driver_type(fn: Callable) -> Any:
 
     return wrapper
 
-
-def _must_have_supported_screenshot_output_type(fn: Callable) -> Any:
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        output_type = args[0].upper()
-
-        supported_output_types = [
-            phantomime.SCREENSHOT_OUTPUT_TYPE_BASE64,
-            phantomime.SCREENSHOT_OUTPUT_TYPE_FILE
-        ]
-
-        if output_type not in supported_output_types:
-            raise Exception(
-                f"invalid screenshot output type. supported: {', '.join(supported_output_types)}"
-            )
-
-        return fn(*args, **kwargs)
-
-    return wrapper
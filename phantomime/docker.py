@@ -1,33 +1,219 @@
-import docker
+from __future__ import annotations
+
 import logging
+import re
+import threading
+import uuid
+
+from contextlib import contextmanager
+
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple, Union
 from . import utils
-from . import decorators
+from .browser import Browser, _validate_driver_type
+from .profile import SessionProfile
+
+if TYPE_CHECKING:
+    import docker
+    from .aio import AsyncBrowser
+    from .template import ProfileTemplate
 
 _log = logging.getLogger(__package__)
 _container = None
 
+DEFAULT_CONTAINER_HEALTH_TIMEOUT: int = 60
+DEFAULT_CONTAINER_MAX_USES: int = 50
+DEFAULT_SHARED_CONTAINER_MAX_SESSIONS: int = 4
 
-@decorators._must_have_supported_driver_type
-def _start_container(driver_type: str) -> int:
-    global _container
-    if _container is not None:
-        raise Exception("docker container already running")
+DEFAULT_SHM_SIZE: str = "2g"
+
+# rough footprints used by host_capacity when no better numbers are given
+DEFAULT_BROWSER_MEMORY: str = "1g"
+DEFAULT_BROWSER_CPUS: float = 0.5
+DEFAULT_CONTAINER_OVERHEAD_MEMORY: str = "512m"
+DEFAULT_HOST_RESERVED_MEMORY: str = "1g"
+
+LIMITED_BY_MEMORY: str = "memory"
+LIMITED_BY_CPU: str = "cpu"
+
+_SELENIUM_EVENT_BUS_PUBLISH_PORT: int = 4442
+_SELENIUM_EVENT_BUS_SUBSCRIBE_PORT: int = 4443
+
+
+_size_units: Dict[str, int] = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def _parse_size(size: Union[int, str]) -> int:
+    """
+    Convert a docker size like 512m or 2g to bytes.
+    """
+    if isinstance(size, int):
+        return size
+
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)b?", size.strip().lower())
+    if match is None:
+        raise Exception(f"invalid size {size}")
+
+    return int(float(match.group(1)) * _size_units[match.group(2)])
+
+
+class ContainerSpec:
+    """
+    The resources of the selenium containers phantomime starts.
+    shm_size sizes /dev/shm, tmpfs maps container paths to tmpfs mount options, e.g. {"/tmp": "size=1g"},
+    and cpus and mem_limit cap the container. max_sessions is how many sessions one container runs side by side,
+    override_max_sessions lets it run more sessions than it has CPUs.
+    """
+
+    def __init__(
+        self,
+        shm_size: Union[int, str] = DEFAULT_SHM_SIZE,
+        tmpfs: Dict[str, str] = {},
+        cpus: float = None,
+        mem_limit: Union[int, str] = None,
+        max_sessions: int = 1,
+        override_max_sessions: bool = False,
+        environment: Dict[str, str] = {},
+    ):
+        if max_sessions < 1:
+            raise Exception("max_sessions must be at least 1")
+
+        if cpus is not None and cpus <= 0:
+            raise Exception("cpus must be greater than 0")
+
+        if mem_limit is not None and _parse_size(mem_limit) <= 0:
+            raise Exception("mem_limit must be greater than 0")
+
+        self.shm_size = shm_size
+        self.tmpfs = dict(tmpfs)
+        self.cpus = cpus
+        self.mem_limit = mem_limit
+        self.max_sessions = max_sessions
+        self.override_max_sessions = override_max_sessions
+        self.environment = dict(environment)
+
+    def __repr__(self) -> str:
+        return (f"ContainerSpec(shm_size={self.shm_size!r}, cpus={self.cpus!r}, mem_limit={self.mem_limit!r}, "
+                f"max_sessions={self.max_sessions!r})")
+
+    def _run_kwargs(self) -> Dict[str, Any]:
+        environment = dict(self.environment)
+        environment["SE_NODE_MAX_SESSIONS"] = str(self.max_sessions)
+        environment["SE_NODE_OVERRIDE_MAX_SESSIONS"] = "true" if self.override_max_sessions else "false"
+
+        kwargs = {
+            "shm_size": self.shm_size,
+            "environment": environment,
+        }
+
+        if self.tmpfs:
+            kwargs["tmpfs"] = dict(self.tmpfs)
+
+        if self.cpus is not None:
+            kwargs["nano_cpus"] = int(self.cpus * 1e9)
+
+        if self.mem_limit is not None:
+            kwargs["mem_limit"] = self.mem_limit
+
+        return kwargs
+
+
+def host_capacity(
+    spec: ContainerSpec = None,
+    host_memory: Union[int, str] = None,
+    host_cpus: float = None,
+    browser_memory: Union[int, str] = DEFAULT_BROWSER_MEMORY,
+    browser_cpus: float = DEFAULT_BROWSER_CPUS,
+    container_overhead_memory: Union[int, str] = DEFAULT_CONTAINER_OVERHEAD_MEMORY,
+    reserved_memory: Union[int, str] = DEFAULT_HOST_RESERVED_MEMORY,
+) -> Dict[str, Any]:
+    """
+    Compute how many containers of spec and how many browsers fit on the docker host.
+    host_memory and host_cpus default to what the docker daemon reports.
+    A container is counted with its mem_limit and cpus if the spec sets them, otherwise with
+    container_overhead_memory plus browser_memory and browser_cpus per session.
+    Returns containers, browsers, memory_per_container, cpus_per_container and limited_by.
+    """
+    spec = spec or ContainerSpec()
+
+    if host_memory is None or host_cpus is None:
+        info = _docker_client().info()
+        host_memory = info["MemTotal"] if host_memory is None else host_memory
+        host_cpus = info["NCPU"] if host_cpus is None else host_cpus
+
+    if spec.mem_limit is not None:
+        memory_per_container = _parse_size(spec.mem_limit)
+    else:
+        memory_per_container = (_parse_size(container_overhead_memory)
+                                + spec.max_sessions * _parse_size(browser_memory))
 
-    client = docker.from_env()
+    if memory_per_container <= 0:
+        raise Exception("memory per container must be greater than 0")
+
+    cpus_per_container = spec.cpus if spec.cpus is not None else spec.max_sessions * browser_cpus
+
+    available_memory = max(0, _parse_size(host_memory) - _parse_size(reserved_memory))
+    by_memory = available_memory // memory_per_container
+    by_cpu = int(host_cpus // cpus_per_container) if cpus_per_container > 0 else by_memory
+    containers = int(min(by_memory, by_cpu))
+
+    return {
+        "containers": containers,
+        "browsers": containers * spec.max_sessions,
+        "memory_per_container": memory_per_container,
+        "cpus_per_container": cpus_per_container,
+        "limited_by": LIMITED_BY_MEMORY if by_memory <= by_cpu else LIMITED_BY_CPU,
+    }
+
+
+def _docker_client() -> docker.DockerClient:
+    # the docker SDK pulls in requests and urllib3, so it is only imported once a container is needed
+    import docker
+
+    return docker.from_env()
+
+
+def _run_standalone_container(client: docker.DockerClient, driver_type: str, volumes: Dict[str, Dict[str, Any]] = None,
+                              spec: ContainerSpec = None):
     selenium_hub_port = utils.get_random_ephemeral_port()
 
     image_name = f"selenium/standalone-{driver_type.lower()}"
+    spec = spec or ContainerSpec()
 
     _log.debug(
-        f"starting docker container based on {image_name} exposing hub port on {selenium_hub_port}")
+        "starting docker container based on %s exposing hub port on %s with %r", image_name, selenium_hub_port, spec)
+
+    container = client.containers.run(image_name,
+                                      ports={
+                                          4444: ('127.0.0.1', selenium_hub_port),
+                                          # 7900: ('127.0.0.1', 7900)
+                                      },
+                                      volumes=volumes or {},
+                                      detach=True,
+                                      **spec._run_kwargs())
 
-    _container = client.containers.run(image_name,
-                                       ports={
-                                           4444: ('127.0.0.1', selenium_hub_port),
-                                           # 7900: ('127.0.0.1', 7900)
-                                       },
-                                       shm_size="2g",
-                                       detach=True)
+    return container, selenium_hub_port
+
+
+def _remove_container(container):
+    try:
+        _log.debug("stopping docker container %s", container.short_id)
+        container.stop()
+
+        _log.debug("removing docker container %s", container.short_id)
+        container.remove()
+    except Exception as e:
+        _log.debug("could not remove docker container %s: %s", container.short_id, e)
+
+
+def _start_container(driver_type: str, template: ProfileTemplate = None, spec: ContainerSpec = None) -> int:
+    global _container
+    if _container is not None:
+        raise Exception("docker container already running")
+
+    driver_type = _validate_driver_type(driver_type)
+    volumes = template._volumes() if template is not None else None
+
+    _container, selenium_hub_port = _run_standalone_container(_docker_client(), driver_type, volumes, spec)
 
     return selenium_hub_port
 
@@ -44,3 +230,411 @@ def _stop_container():
     _container.remove()
 
     _container = None
+
+
+class PooledContainer:
+    """
+    A standalone Selenium container owned by a ContainerPool.
+    template is the ProfileTemplate mounted into it, if any.
+    """
+
+    def __init__(self, driver_type: str, container, selenium_hub_port: int, template: ProfileTemplate = None):
+        self.driver_type = driver_type
+        self.container = container
+        self.selenium_hub_port = selenium_hub_port
+        self.template = template
+        self.uses = 0
+        self.ready = False
+
+    @property
+    def hub_url(self) -> str:
+        return f"http://localhost:{self.selenium_hub_port}/wd/hub"
+
+
+class ContainerPool:
+    """
+    A pool of pre-warmed standalone Selenium containers per driver type.
+    Containers are reused across sessions and recycled after max_uses sessions
+    or when they fail a health check.
+    The built ProfileTemplate given for a driver type in templates is mounted into all of its containers.
+    spec sets the resources of every container.
+    """
+
+    def __init__(
+        self,
+        driver_types: List[str],
+        size: int = 1,
+        max_uses: int = DEFAULT_CONTAINER_MAX_USES,
+        health_timeout: int = DEFAULT_CONTAINER_HEALTH_TIMEOUT,
+        templates: List[ProfileTemplate] = [],
+        spec: ContainerSpec = None,
+    ):
+        self.driver_types = [_validate_driver_type(t) for t in driver_types]
+        self.size = size
+        self.max_uses = max_uses
+        self.health_timeout = health_timeout
+        self.spec = spec or ContainerSpec()
+        self.templates: Dict[str, ProfileTemplate] = {}
+        for template in templates:
+            if template.driver_type not in self.driver_types:
+                raise Exception(f"container pool does not serve driver type {template.driver_type}")
+
+            template._ensure_built()
+            self.templates[template.driver_type] = template
+
+        self._client = _docker_client()
+        self._lock = threading.Condition()
+        self._idle: Dict[str, List[PooledContainer]] = {t: [] for t in self.driver_types}
+        self._in_use: List[PooledContainer] = []
+        self._closed = False
+
+        try:
+            for driver_type in self.driver_types:
+                for _ in range(size):
+                    self._idle[driver_type].append(self._start(driver_type))
+        except:
+            self.close()
+            raise
+
+    def __enter__(self) -> "ContainerPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start(self, driver_type: str) -> PooledContainer:
+        template = self.templates.get(driver_type)
+        container, selenium_hub_port = _run_standalone_container(
+            self._client, driver_type, template._volumes() if template is not None else None, self.spec)
+
+        return PooledContainer(driver_type, container, selenium_hub_port, template)
+
+    def _is_healthy(self, pooled: PooledContainer) -> bool:
+        try:
+            if pooled.ready:
+                return utils.is_hub_ready(pooled.hub_url)
+
+            # containers that never served a session are still booting
+            utils.wait_hub_ready(pooled.hub_url, self.health_timeout)
+            pooled.ready = True
+        except Exception as e:
+            _log.debug("docker container %s failed health check: %s", pooled.container.short_id, e)
+            return False
+
+        return True
+
+    def acquire(self, driver_type: str) -> PooledContainer:
+        """
+        Take a healthy container for the given driver type out of the pool.
+        Starts a new container if none is idle.
+        """
+        driver_type = _validate_driver_type(driver_type)
+        if driver_type not in self._idle:
+            raise Exception(f"container pool does not serve driver type {driver_type}")
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise Exception("container pool is closed")
+
+                idle = self._idle[driver_type]
+                pooled = idle.pop(0) if idle else None
+
+            fresh = pooled is None
+            if fresh:
+                pooled = self._start(driver_type)
+
+            if not self._is_healthy(pooled):
+                _remove_container(pooled.container)
+                if fresh:
+                    raise Exception(f"docker container for {driver_type} did not become healthy")
+
+                # keep the pool at size, the next round takes the replacement if nothing else is idle
+                self._replenish(driver_type)
+                continue
+
+            pooled.uses += 1
+            with self._lock:
+                self._in_use.append(pooled)
+
+            return pooled
+
+    def release(self, pooled: PooledContainer, healthy: bool = True):
+        """
+        Return a container to the pool.
+        The container is replaced by a fresh one if it is unhealthy or served max_uses sessions.
+        """
+        with self._lock:
+            self._in_use.remove(pooled)
+            recycle = self._closed or not healthy or pooled.uses >= self.max_uses
+            if not recycle:
+                self._idle[pooled.driver_type].append(pooled)
+                return
+
+        _log.debug("recycling docker container %s", pooled.container.short_id)
+        _remove_container(pooled.container)
+        self._replenish(pooled.driver_type)
+
+    def _replenish(self, driver_type: str):
+        # start an idle container in place of one that was removed, unless the pool got closed meanwhile
+        with self._lock:
+            if self._closed:
+                return
+
+        replacement = self._start(driver_type)
+        with self._lock:
+            if not self._closed:
+                self._idle[driver_type].append(replacement)
+                return
+
+        _remove_container(replacement.container)
+
+    def close(self):
+        """
+        Stop and remove all the idle containers.
+        Containers still in use are removed when released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [p for containers in self._idle.values() for p in containers]
+            for containers in self._idle.values():
+                containers.clear()
+
+        for pooled in idle:
+            _remove_container(pooled.container)
+
+
+class SharedContainer:
+    """
+    A standalone Selenium container that runs several sessions side by side, up to spec.max_sessions at once
+    (DEFAULT_SHARED_CONTAINER_MAX_SESSIONS without a spec). Every session holds a reference on it: the first acquire() starts the container
+    and it is stopped and removed when the last reference is released.
+    """
+
+    def __init__(
+        self,
+        driver_type: str,
+        spec: ContainerSpec = None,
+        template: ProfileTemplate = None,
+        health_timeout: int = DEFAULT_CONTAINER_HEALTH_TIMEOUT,
+    ):
+        self.driver_type = _validate_driver_type(driver_type)
+        self.spec = spec or ContainerSpec(max_sessions=DEFAULT_SHARED_CONTAINER_MAX_SESSIONS)
+        self.health_timeout = health_timeout
+        self.template = template
+        if template is not None:
+            if template.driver_type != self.driver_type:
+                raise Exception(f"profile template is for driver type {template.driver_type}, not {self.driver_type}")
+
+            template._ensure_built()
+
+        self.container = None
+        self.selenium_hub_port = None
+        self.refs = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"SharedContainer(driver_type={self.driver_type!r}, refs={self.refs!r})"
+
+    @property
+    def hub_url(self) -> str:
+        if self.selenium_hub_port is None:
+            raise Exception("shared container is not running")
+
+        return f"http://localhost:{self.selenium_hub_port}/wd/hub"
+
+    def acquire(self) -> str:
+        """
+        Take a reference on the container, starting it if it is not running, and return its hub URL.
+        """
+        with self._lock:
+            if self.container is None:
+                volumes = self.template._volumes() if self.template is not None else None
+                container, selenium_hub_port = _run_standalone_container(
+                    _docker_client(), self.driver_type, volumes, self.spec)
+
+                try:
+                    utils.wait_hub_ready(f"http://localhost:{selenium_hub_port}/wd/hub", self.health_timeout)
+                except Exception:
+                    _remove_container(container)
+                    raise Exception(f"docker container for {self.driver_type} did not become healthy")
+
+                self.container = container
+                self.selenium_hub_port = selenium_hub_port
+
+            self.refs += 1
+            if self.refs > self.spec.max_sessions:
+                _log.debug("docker container %s has %s references for %s sessions, new sessions queue on the hub",
+                           self.container.short_id, self.refs, self.spec.max_sessions)
+
+            return self.hub_url
+
+    def release(self):
+        """
+        Give back a reference taken by acquire(). The last one stops and removes the container.
+        """
+        with self._lock:
+            container = self._drop_reference()
+
+        if container is not None:
+            _remove_container(container)
+
+    def _drop_reference(self):
+        # called with _lock held, returns the container to remove once the last reference is gone
+        if self.refs == 0:
+            raise Exception("shared container has no references to release")
+
+        self.refs -= 1
+        if self.refs > 0:
+            return None
+
+        container = self.container
+        self.container = None
+        self.selenium_hub_port = None
+
+        return container
+
+    def _new_user_data_dir(self, profile: SessionProfile) -> Tuple[SessionProfile, str]:
+        profile = profile or SessionProfile(self.driver_type)
+        if profile.driver_type != self.driver_type:
+            raise Exception(f"shared container runs driver type {self.driver_type}, not {profile.driver_type}")
+
+        if self.template is None:
+            return profile, None
+
+        user_data_dir = self.template.copy_into(self.container)
+
+        return self.template.session_profile(user_data_dir, profile), user_data_dir
+
+    def _session_closed(self, user_data_dir: str):
+        with self._lock:
+            # the container outlives the session unless it holds the last reference
+            if user_data_dir is not None and self.refs > 1:
+                self.template.remove_copy(self.container, user_data_dir)
+
+            container = self._drop_reference()
+
+        if container is not None:
+            _remove_container(container)
+
+    def connect(self, profile: SessionProfile = None, in_page_waits: bool = True) -> Browser:
+        """
+        Create a session in the container holding a reference that Browser.quit() gives back.
+        """
+        hub_url = self.acquire()
+        try:
+            profile, user_data_dir = self._new_user_data_dir(profile)
+            browser = Browser.connect(hub_url, in_page_waits=in_page_waits, profile=profile)
+        except:
+            self.release()
+            raise
+
+        browser._on_quit.append(lambda: self._session_closed(user_data_dir))
+
+        return browser
+
+    async def connect_async(self, profile: SessionProfile = None, in_page_waits: bool = True) -> AsyncBrowser:
+        """
+        Same as connect() for an AsyncBrowser, the container is started and stopped in an executor.
+        """
+        import asyncio
+        from .aio import AsyncBrowser
+
+        loop = asyncio.get_running_loop()
+        hub_url = await loop.run_in_executor(None, self.acquire)
+        try:
+            profile, user_data_dir = await loop.run_in_executor(None, self._new_user_data_dir, profile)
+            browser = await AsyncBrowser.connect(hub_url, in_page_waits=in_page_waits, profile=profile)
+        except:
+            await loop.run_in_executor(None, self.release)
+            raise
+
+        browser._on_quit.append(lambda: self._session_closed(user_data_dir))
+
+        return browser
+
+    @contextmanager
+    def session(self, profile: SessionProfile = None, in_page_waits: bool = True) -> Iterator[Browser]:
+        """
+        Context manager around connect() that quits the session on exit.
+        """
+        browser = self.connect(profile, in_page_waits)
+        try:
+            yield browser
+        finally:
+            browser.quit()
+
+
+class Grid:
+    """
+    A Selenium Grid made of one hub container and a number of node containers per driver type,
+    all attached to a private docker network. Sessions are created against hub_url.
+    spec sets the resources of every node container.
+    """
+
+    def __init__(self, nodes: Dict[str, int], health_timeout: int = DEFAULT_CONTAINER_HEALTH_TIMEOUT,
+                 spec: ContainerSpec = None):
+        client = _docker_client()
+        self.spec = spec or ContainerSpec()
+        name = f"phantomime-grid-{uuid.uuid4().hex[:8]}"
+
+        self.selenium_hub_port = utils.get_random_ephemeral_port()
+        self.nodes = []
+
+        _log.debug("creating docker network %s", name)
+        self.network = client.networks.create(name)
+
+        hub_name = f"{name}-hub"
+        _log.debug(
+            "starting selenium hub container %s exposing hub port on %s", hub_name, self.selenium_hub_port)
+        self.hub = client.containers.run("selenium/hub",
+                                         name=hub_name,
+                                         network=name,
+                                         ports={4444: ('127.0.0.1', self.selenium_hub_port)},
+                                         detach=True)
+
+        try:
+            for driver_type, count in nodes.items():
+                image_name = f"selenium/node-{_validate_driver_type(driver_type).lower()}"
+                for _ in range(count):
+                    _log.debug("starting selenium node container based on %s with %r", image_name, self.spec)
+                    run_kwargs = self.spec._run_kwargs()
+                    run_kwargs["environment"].update({
+                        "SE_EVENT_BUS_HOST": hub_name,
+                        "SE_EVENT_BUS_PUBLISH_PORT": str(_SELENIUM_EVENT_BUS_PUBLISH_PORT),
+                        "SE_EVENT_BUS_SUBSCRIBE_PORT": str(_SELENIUM_EVENT_BUS_SUBSCRIBE_PORT),
+                    })
+                    self.nodes.append(client.containers.run(image_name,
+                                                            network=name,
+                                                            detach=True,
+                                                            **run_kwargs))
+
+            utils.wait_hub_ready(self.hub_url, health_timeout)
+        except:
+            self.stop()
+            raise
+
+    def __enter__(self) -> "Grid":
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def hub_url(self) -> str:
+        return f"http://localhost:{self.selenium_hub_port}/wd/hub"
+
+    def stop(self):
+        """
+        Stop and remove the node and hub containers and the grid network.
+        """
+        for node in self.nodes:
+            _remove_container(node)
+
+        self.nodes = []
+        _remove_container(self.hub)
+
+        try:
+            self.network.remove()
+        except Exception as e:
+            _log.debug("could not remove docker network %s: %s", self.network.name, e)
@@ -0,0 +1,344 @@
+import inspect
+import logging
+import threading
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, Tuple
+
+_log = logging.getLogger(__package__)
+
+OUTCOME_OK: str = "ok"
+OUTCOME_ERROR: str = "error"
+
+DEFAULT_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# sinks are only looked at by the instrumented calls, nothing is measured while this is empty
+_sinks: List[Any] = []
+_sinks_lock = threading.Lock()
+
+# the public methods of the instrumented classes as {cls: {name: (original, instrumented)}},
+# the instrumented ones are only installed while a sink is registered so that calls pay nothing otherwise
+_instrumented_methods: Dict[type, Dict[str, Tuple[Any, Any]]] = {}
+
+# the round-trip counter of the innermost instrumented call running in the current thread or task
+_round_trips: ContextVar = ContextVar("phantomime_round_trips", default=None)
+
+
+class CallRecord:
+    """
+    The measurement of one instrumented call.
+    started_at is a unix timestamp, duration is in seconds and round_trips counts the
+    requests sent to the hub during the call, including the ones of nested calls.
+    """
+
+    __slots__ = ("name", "started_at", "duration", "outcome", "round_trips", "error")
+
+    def __init__(self, name: str, started_at: float, duration: float, outcome: str, round_trips: int,
+                 error: BaseException = None):
+        self.name = name
+        self.started_at = started_at
+        self.duration = duration
+        self.outcome = outcome
+        self.round_trips = round_trips
+        self.error = error
+
+    def __repr__(self) -> str:
+        return (f"CallRecord(name={self.name!r}, duration={self.duration:.6f}, "
+                f"outcome={self.outcome!r}, round_trips={self.round_trips})")
+
+
+def add_sink(sink: Any):
+    """
+    Start sending a CallRecord for every instrumented call to sink.record.
+    """
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+            if len(_sinks) == 1:
+                _install_methods(True)
+
+
+def remove_sink(sink: Any):
+    """
+    Stop sending records to sink. Instrumentation turns itself off when the last sink is removed.
+    """
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+            if not _sinks:
+                _install_methods(False)
+
+
+def is_enabled() -> bool:
+    return bool(_sinks)
+
+
+def _count_round_trip():
+    counter = _round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _emit(record: CallRecord):
+    for sink in list(_sinks):
+        try:
+            sink.record(record)
+        except Exception as e:
+            _log.debug("metrics sink %r failed: %s", sink, e)
+
+
+def _begin():
+    counter = [0]
+    return counter, _round_trips.set(counter), time(), perf_counter()
+
+
+def _end(name: str, state, error: BaseException):
+    counter, token, started_at, t = state
+    duration = perf_counter() - t
+    _round_trips.reset(token)
+
+    outer = _round_trips.get()
+    if outer is not None:
+        outer[0] += counter[0]
+
+    outcome = OUTCOME_OK if error is None else OUTCOME_ERROR
+    _emit(CallRecord(name, started_at, duration, outcome, counter[0], error))
+
+
+def _instrument(name: str) -> Callable:
+    """
+    Decorate a function or coroutine function so that every call is measured and sent to the sinks as name.
+    """
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _sinks:
+                    return await fn(*args, **kwargs)
+
+                state = _begin()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException as e:
+                    _end(name, state, e)
+                    raise
+
+                _end(name, state, None)
+
+                return result
+
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+
+            state = _begin()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                _end(name, state, e)
+                raise
+
+            _end(name, state, None)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _install_methods(instrumented: bool, classes: List[type] = None):
+    for cls in classes if classes is not None else list(_instrumented_methods):
+        for name, (original, wrapped) in _instrumented_methods[cls].items():
+            setattr(cls, name, wrapped if instrumented else original)
+
+
+def _instrument_methods(cls: type) -> type:
+    """
+    Instrument every public method of a class under its own name while a sink is registered.
+    Generators are left alone since their work happens after the call returns.
+    """
+    methods = {}
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_"):
+            continue
+
+        if isinstance(attr, classmethod):
+            methods[name] = (attr, classmethod(_instrument(name)(attr.__func__)))
+            continue
+
+        if not inspect.isfunction(attr) or inspect.isgeneratorfunction(attr) or inspect.isasyncgenfunction(attr):
+            continue
+
+        methods[name] = (attr, _instrument(name)(attr))
+
+    with _sinks_lock:
+        _instrumented_methods[cls] = methods
+        if _sinks:
+            _install_methods(True, [cls])
+
+    return cls
+
+
+def _count_connection_round_trips(connection: Any):
+    """
+    Count the requests a selenium RemoteConnection sends towards the call that is being measured.
+    """
+    execute = getattr(connection, "execute", None)
+    if execute is None or getattr(execute, "_phantomime_counting", False):
+        return
+
+    @wraps(execute)
+    def counting_execute(*args, **kwargs):
+        _count_round_trip()
+        return execute(*args, **kwargs)
+
+    counting_execute._phantomime_counting = True
+    connection.execute = counting_execute
+
+
+class _Histogram:
+    def __init__(self, buckets: List[float]):
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.round_trips = 0
+
+
+class StatsSink:
+    """
+    Keeps a latency histogram, error count and round-trip count per call name in memory.
+    snapshot() returns them as plain data and prometheus_text() in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS):
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+
+    def record(self, record: CallRecord):
+        with self._lock:
+            histogram = self._histograms.get(record.name)
+            if histogram is None:
+                histogram = self._histograms[record.name] = _Histogram(self.buckets)
+
+            histogram.bucket_counts[bisect_left(self.buckets, record.duration)] += 1
+            histogram.count += 1
+            histogram.sum += record.duration
+            histogram.round_trips += record.round_trips
+            if record.outcome != OUTCOME_OK:
+                histogram.errors += 1
+
+            if histogram.min is None or record.duration < histogram.min:
+                histogram.min = record.duration
+
+            if histogram.max is None or record.duration > histogram.max:
+                histogram.max = record.duration
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def _quantile(self, histogram: _Histogram, q: float) -> float:
+        # upper bound of the bucket holding the q-th call, capped by the max
+        rank = q * histogram.count
+        seen = 0
+        for i, count in enumerate(histogram.bucket_counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.buckets[i], histogram.max) if i < len(self.buckets) else histogram.max
+
+        return histogram.max
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns count, errors, sum, min, max, mean, approximate p50/p90/p99 and round trips per call name.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "errors": h.errors,
+                    "sum": h.sum,
+                    "min": h.min,
+                    "max": h.max,
+                    "mean": h.sum / h.count,
+                    "p50": self._quantile(h, 0.5),
+                    "p90": self._quantile(h, 0.9),
+                    "p99": self._quantile(h, 0.99),
+                    "round_trips": h.round_trips,
+                }
+                for name, h in self._histograms.items()
+            }
+
+    def prometheus_text(self, prefix: str = "phantomime") -> str:
+        """
+        Render the histograms in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {prefix}_call_duration_seconds Duration of phantomime calls.",
+            f"# TYPE {prefix}_call_duration_seconds histogram",
+        ]
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            for name, h in histograms:
+                cumulative = 0
+                for bound, count in zip(self.buckets, h.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_call_duration_seconds_bucket{{call="{name}",le="{bound}"}} {cumulative}')
+
+                lines.append(f'{prefix}_call_duration_seconds_bucket{{call="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_call_duration_seconds_sum{{call="{name}"}} {h.sum}')
+                lines.append(f'{prefix}_call_duration_seconds_count{{call="{name}"}} {h.count}')
+
+            lines.append(f"# HELP {prefix}_call_errors_total Phantomime calls that raised.")
+            lines.append(f"# TYPE {prefix}_call_errors_total counter")
+            for name, h in histograms:
+                lines.append(f'{prefix}_call_errors_total{{call="{name}"}} {h.errors}')
+
+            lines.append(f"# HELP {prefix}_call_round_trips_total Requests sent to the hub by phantomime calls.")
+            lines.append(f"# TYPE {prefix}_call_round_trips_total counter")
+            for name, h in histograms:
+                lines.append(f'{prefix}_call_round_trips_total{{call="{name}"}} {h.round_trips}')
+
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetrySink:
+    """
+    Turns every call into an OpenTelemetry span named phantomime.<call>.
+    Needs the opentelemetry-api package, the global tracer provider is used if no tracer is given.
+    """
+
+    def __init__(self, tracer: Any = None):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise Exception("OpenTelemetrySink needs opentelemetry-api, install it with pip install phantomime[otel]")
+
+        self._trace = trace
+        self.tracer = tracer if tracer is not None else trace.get_tracer("phantomime")
+
+    def record(self, record: CallRecord):
+        start_ns = int(record.started_at * 1e9)
+        span = self.tracer.start_span(f"phantomime.{record.name}", start_time=start_ns, attributes={
+            "phantomime.call": record.name,
+            "phantomime.outcome": record.outcome,
+            "phantomime.round_trips": record.round_trips,
+        })
+
+        if record.error is not None:
+            span.record_exception(record.error)
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(record.error)))
+
+        span.end(end_time=start_ns + int(record.duration * 1e9))
@@ -1,83 +1,100 @@
+from __future__ import annotations
+
 import logging
-import backoff
 from . import docker
 from . import decorators
 from . import utils
-
-from time import sleep
-from typing import Tuple, List, Dict, Any
-from selenium import webdriver
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver import Remote
-from selenium.webdriver.common.options import ArgOptions
-from selenium.webdriver.common.alert import Alert
+from . import metrics
+
+from time import monotonic
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Tuple, Union
+from .browser import Browser, DEFAULT_MAX_MUTATIONS, DEFAULT_MAX_SCROLLS, DEFAULT_SCROLL_IDLE_MS
+from .blocking import ResourceBlocking, TRACKER_URL_PATTERNS
+from .profile import SessionProfile
+from .template import ProfileTemplate
+from .state import SessionStateStore
+from .clearance import ClearanceCache
+from .waits import Condition, WaitPolicy, set_default_wait_policy, get_default_wait_policy
+from .constants import (
+    DEFAULT_WINDOW_WITDH,
+    DEFAULT_WINDOW_HEIGHT,
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+    SELECTOR_TYPE_XPATH,
+    SELECTOR_TYPE_CSS,
+    SELECT_OPTION_SELECTOR_TYPE_INDEX,
+    SELECT_OPTION_SELECTOR_TYPE_TEXT,
+    SELECT_OPTION_SELECTOR_TYPE_VALUE,
+    SCREENSHOT_OUTPUT_TYPE_BASE64,
+    SCREENSHOT_OUTPUT_TYPE_FILE,
+    SCREENSHOT_FORMAT_PNG,
+    SCREENSHOT_FORMAT_JPEG,
+    SCREENSHOT_FORMAT_WEBP,
+    QUERY_FIELD_TEXT,
+    QUERY_FIELD_HTML,
+    QUERY_FIELD_VISIBLE,
+    QUERY_FIELD_RECT,
+    WAIT_STRATEGY_CONSTANT,
+    WAIT_STRATEGY_EXPONENTIAL,
+    WAIT_STRATEGY_FIBONACCI,
+    RESOURCE_TYPE_IMAGE,
+    RESOURCE_TYPE_FONT,
+    RESOURCE_TYPE_MEDIA,
+    RESOURCE_TYPE_STYLESHEET,
+    RESOURCE_TYPE_TRACKER,
+    CHALLENGE_NONE,
+    CHALLENGE_HCAPTCHA,
+    CHALLENGE_VERIFY_BUTTON,
+    CHALLENGE_INTERSTITIAL,
+)
+
+if TYPE_CHECKING:
+    from selenium.webdriver import Remote
+    from selenium.webdriver.common.alert import Alert
+    from selenium.webdriver.remote.webelement import WebElement
+    from selenium.webdriver.support.ui import Select
 
 _log = logging.getLogger(__package__)
 
-DEFAULT_WINDOW_WITDH: int = 640
-DEFAULT_WINDOW_HEIGHT: int = 480
-
-DRIVER_TYPE_FIREFOX: str = "FIREFOX"
-DRIVER_TYPE_CHROME: str = "CHROME"
-
-SELECTOR_TYPE_XPATH: str = "XPATH"
-SELECTOR_TYPE_CSS: str = "CSS_SELECTOR"
-
-SELECT_OPTION_SELECTOR_TYPE_INDEX: str = "INDEX"
-SELECT_OPTION_SELECTOR_TYPE_TEXT: str = "TEXT"
-SELECT_OPTION_SELECTOR_TYPE_VALUE: str = "VALUE"
-
-SCREENSHOT_OUTPUT_TYPE_BASE64: str = "BASE64"
-SCREENSHOT_OUTPUT_TYPE_FILE: str = "FILE"
+DEFAULT_HUB_READY_TIMEOUT: int = 60
 
-_driver_type_to_options: Dict = {
-    DRIVER_TYPE_FIREFOX: webdriver.FirefoxOptions(),
-    DRIVER_TYPE_CHROME: webdriver.ChromeOptions()
-}
+STARTUP_PHASE_CONTAINER_CREATE: str = "container_create"
+STARTUP_PHASE_HUB_READY: str = "hub_ready"
+STARTUP_PHASE_SESSION_CREATE: str = "session_create"
 
+_browser: Browser = None
 _driver: Remote = None
+_container_pool: "docker.ContainerPool" = None
+_pooled_container: "docker.PooledContainer" = None
+_shared_container: "docker.SharedContainer" = None
+_profile_template: ProfileTemplate = None
+_user_data_dir: str = None
+_startup_timings: Dict[str, float] = {}
 
 
-@decorators._must_have_supported_driver_type
-@decorators._must_have_driver_uninitialized
-@backoff.on_exception(backoff.expo, Exception, max_time=30, on_giveup=utils.backoff_raise_timeout_exception)
-def _init_driver(
-    driver_type: str,
-    selenium_hub_url: str,
-    driver_arguments: List[str],
-    user_agent: str,
-    disable_notifications: bool,
-):
-    global _driver
-    options = _driver_type_to_options[driver_type]
+def _get_browser() -> Browser:
+    if _browser is None:
+        raise Exception("_driver is not initialized")
 
-    for driver_option in driver_arguments:
-        options.add_argument(driver_option)
+    return _browser
 
-    if user_agent != "":
-        if driver_type == DRIVER_TYPE_CHROME:
-            options.add_argument(f"--user-agent={user_agent}")
-        elif driver_type == DRIVER_TYPE_FIREFOX:
-            options.set_preference("general.useragent.override", user_agent)
 
-    if disable_notifications:
-        if driver_type == DRIVER_TYPE_CHROME:
-            options.add_argument("--disable-notifications")
-        elif driver_type == DRIVER_TYPE_FIREFOX:
-            options.set_preference("dom.webnotifications.enabled", False)
+def get_browser() -> Browser:
+    """
+    Get the Browser handle of the default session started by start().
+    """
+    return _get_browser()
 
-    _driver = webdriver.Remote(
-        command_executor=selenium_hub_url,
-        options=options,
-    )
 
-    set_window_size(DEFAULT_WINDOW_WITDH, DEFAULT_WINDOW_HEIGHT)
+@decorators._must_have_supported_driver_type
+@decorators._must_have_driver_uninitialized
+def _init_driver(driver_type: str, selenium_hub_url: str, profile: SessionProfile):
+    global _browser, _driver
+    _browser = Browser.connect(selenium_hub_url, profile=profile)
+    _driver = _browser.driver
 
 
+@metrics._instrument("start")
 @decorators._must_have_supported_driver_type
 @decorators._must_have_driver_uninitialized
 def start(
@@ -86,549 +103,519 @@ def start(
     driver_arguments: List[str] = [],
     user_agent: str = "",
     disable_notifications: bool = False,
+    container_pool: "docker.ContainerPool" = None,
+    hub_ready_timeout: int = DEFAULT_HUB_READY_TIMEOUT,
+    resource_blocking: ResourceBlocking = None,
+    profile: SessionProfile = None,
+    profile_template: ProfileTemplate = None,
+    container_spec: "docker.ContainerSpec" = None,
+    shared_container: "docker.SharedContainer" = None,
 ):
     """
     Start the session by initializing the driver and connecting to the given Selenium Hub URL.
     If the Selenium Hub URL is not provided, a docker container running the
     Selenium Hub will be started and the URL http://localhost:<random_ephemeral_port>/wd/hub will be used.
+    If a container pool is given, a warm container is taken from it instead and returned to it on stop().
+    The session is only created once the hub reports ready on its /status endpoint.
+    resource_blocking keeps the browser from downloading the given resource types and URL patterns.
+    A SessionProfile given as profile replaces driver_type and the browser settings.
+    With a built profile_template the browser runs on a copy of it, which needs a container started by phantomime.
+    container_spec sets the resources of the container started when neither a hub URL, a container pool nor a shared container is given.
+    With a shared container the session runs in it next to other sessions and holds a reference on it until stop().
     """
-    if selenium_hub_url is None:
-        selenium_hub_port = docker._start_container(driver_type)
-        selenium_hub_url = f"http://localhost:{selenium_hub_port}/wd/hub"
+    global _container_pool, _pooled_container, _shared_container, _profile_template, _user_data_dir, _startup_timings
+    if profile is None:
+        profile = SessionProfile(driver_type, driver_arguments, user_agent=user_agent,
+                                 disable_notifications=disable_notifications,
+                                 resource_blocking=resource_blocking)
 
-    _init_driver(driver_type, selenium_hub_url, driver_arguments,
-                 user_agent, disable_notifications)
+    driver_type = profile.driver_type
+    if container_spec is not None and (container_pool is not None or shared_container is not None):
+        raise Exception("container_spec only applies to the container started by start(), "
+                        "set it on the container pool or shared container instead")
 
+    if profile_template is not None:
+        if selenium_hub_url is not None:
+            raise Exception("profile_template needs a container started by phantomime, not selenium_hub_url")
 
-@decorators._must_have_driver_initialized
-def stop():
-    """
-    Stop the session by quitting the driver and stopping the Selenium hub container.
-    """
-    global _driver
-    _driver.quit()
-    _driver = None
+        if profile_template.driver_type != driver_type:
+            raise Exception(f"profile template is for driver type {profile_template.driver_type}, not {driver_type}")
 
-    docker._stop_container()
+        profile_template._ensure_built()
 
+    _startup_timings = {}
+    t = monotonic()
 
-@decorators._must_have_driver_initialized
-def set_page_load_timeout(page_load_timeout: int):
-    """
-    Set the page load timeout for the session.
-    """
-    _driver.set_page_load_timeout(page_load_timeout)
+    if selenium_hub_url is None:
+        if shared_container is not None:
+            if shared_container.driver_type != driver_type:
+                raise Exception(f"shared container runs driver type {shared_container.driver_type}, not {driver_type}")
 
+            if profile_template is not None and shared_container.template is not profile_template:
+                raise Exception("shared container does not mount this profile template")
 
-@decorators._must_have_driver_initialized
-def set_window_size(x: int, y: int):
-    """
-    Set the window size for the session.
-    """
-    _driver.set_window_size(x, y)
+            selenium_hub_url = shared_container.acquire()
+            _shared_container = shared_container
+        elif container_pool is not None:
+            if profile_template is not None and container_pool.templates.get(driver_type) is not profile_template:
+                raise Exception("container pool does not mount this profile template")
 
+            _pooled_container = container_pool.acquire(driver_type)
+            _container_pool = container_pool
+            selenium_hub_url = _pooled_container.hub_url
+        else:
+            selenium_hub_port = docker._start_container(driver_type, profile_template, container_spec)
+            selenium_hub_url = f"http://localhost:{selenium_hub_port}/wd/hub"
+
+    t = _record_startup_phase(STARTUP_PHASE_CONTAINER_CREATE, t)
 
-@decorators._must_have_driver_initialized
-def _bypass_cloudflare_site_connection_secure_check1() -> bool:
-    selector = 'div.hcaptcha-box iframe'
-    el = None
     try:
-        el = wait_element_exists(SELECTOR_TYPE_CSS, selector, 10)
-    except:
-        return True
+        try:
+            utils.wait_hub_ready(selenium_hub_url, hub_ready_timeout)
+        except Exception:
+            raise Exception(
+                f"selenium hub {selenium_hub_url} did not become ready in {hub_ready_timeout}sec")
 
-    switch_to_iframe(SELECTOR_TYPE_CSS, selector)
+        t = _record_startup_phase(STARTUP_PHASE_HUB_READY, t)
 
-    selector = "label.ctp-checkbox-label"
-    try:
-        el = wait_element_exists(SELECTOR_TYPE_CSS, selector, 20)
-    except:
-        return False
+        if profile_template is not None:
+            if _shared_container is not None:
+                container = _shared_container.container
+            elif _pooled_container is not None:
+                container = _pooled_container.container
+            else:
+                container = docker._container
 
-    el.click()
+            _user_data_dir = profile_template.copy_into(container)
+            _profile_template = profile_template
+            profile = profile_template.session_profile(_user_data_dir, profile)
 
-    switch_to_main()
+        _init_driver(driver_type, selenium_hub_url, profile)
 
-    selector = 'div.hcaptcha-box iframe'
-    try:
-        wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
+        _record_startup_phase(STARTUP_PHASE_SESSION_CREATE, t)
     except:
-        return False
+        _release_container(healthy=False)
+        raise
 
-    return True
 
+def _record_startup_phase(phase: str, started_at: float) -> float:
+    now = monotonic()
+    _startup_timings[phase] = now - started_at
+    _log.debug("startup phase %s took %.3fsec", phase, _startup_timings[phase])
 
-@decorators._must_have_driver_initialized
-def _bypass_cloudflare_site_connection_secure_check2() -> bool:
-    selector = 'input[type="button"][value="Verify you are human"]'
-    el = None
+    return now
 
-    try:
-        el = wait_element_exists(SELECTOR_TYPE_CSS, selector, 10)
-    except:
-        return True
 
-    el.click()
+def get_startup_timings() -> Dict[str, float]:
+    """
+    Returns how many seconds each phase of the last start() took:
+    container create, hub ready and session create.
+    """
+    return dict(_startup_timings)
 
-    try:
-        wait_element_not_exists(SELECTOR_TYPE_CSS, selector, 20)
-    except:
-        return False
 
-    return True
+def _release_container(healthy: bool = True):
+    global _container_pool, _pooled_container, _shared_container, _profile_template, _user_data_dir
+    if _shared_container is not None:
+        shared_container, user_data_dir = _shared_container, _user_data_dir
+        _shared_container = None
+        _profile_template = None
+        _user_data_dir = None
+        shared_container._session_closed(user_data_dir)
+        return
+
+    if _pooled_container is None:
+        _profile_template = None
+        _user_data_dir = None
+        docker._stop_container()
+        return
 
+    if _user_data_dir is not None:
+        # pooled containers outlive the session, so its profile copy goes now
+        _profile_template.remove_copy(_pooled_container.container, _user_data_dir)
+        _profile_template = None
+        _user_data_dir = None
 
+    _container_pool.release(_pooled_container, healthy)
+    _container_pool = None
+    _pooled_container = None
+
+
+@metrics._instrument("stop")
 @decorators._must_have_driver_initialized
-def bypass_cloudflare_site_connection_secure() -> bool:
+def stop():
     """
-    Try to bypass the cloudflare site connection secure checker page
+    Stop the session by quitting the driver and stopping the Selenium hub container.
     """
-    if not _bypass_cloudflare_site_connection_secure_check1():
-        return False
+    global _browser, _driver
+    _browser.quit()
+    _browser = None
+    _driver = None
 
-    if not _bypass_cloudflare_site_connection_secure_check2():
-        return False
+    _release_container()
 
-    if is_text_on_page("Checking if the site connection is secure"):
-        return False
 
-    return True
+def set_page_load_timeout(page_load_timeout: int):
+    """
+    Set the page load timeout for the session.
+    """
+    _get_browser().set_page_load_timeout(page_load_timeout)
 
 
-@decorators._must_have_driver_initialized
-def load_page(url: str, try_human_verif_bypass: bool = False) -> str:
+def set_window_size(x: int, y: int):
     """
-    Navigate to the specified URL.
+    Set the window size for the session.
     """
-    _log.debug(f"loading page {url}")
-    _driver.get(url)
+    _get_browser().set_window_size(x, y)
 
-    if try_human_verif_bypass:
-        c = 1
-        while True:
-            sleep(10)
-            if bypass_cloudflare_site_connection_secure():
-                return
 
-            if c >= 20:
-                raise Exception("could not bypass captcha")
+def detect_challenge() -> str:
+    """
+    Classify the human verification shown by the current page in one script call.
+    Returns one of CHALLENGE_NONE, CHALLENGE_HCAPTCHA, CHALLENGE_VERIFY_BUTTON or CHALLENGE_INTERSTITIAL.
+    """
+    return _get_browser().detect_challenge()
 
-            c += 1
+
+def bypass_cloudflare_site_connection_secure() -> bool:
+    """
+    Try to bypass the cloudflare site connection secure checker page.
+    Only the handler of the challenge the page shows runs, a page without one returns right away.
+    """
+    return _get_browser().bypass_cloudflare_site_connection_secure()
+
+
+def load_page(url: str, try_human_verif_bypass: bool = False, clearance_cache: ClearanceCache = None) -> str:
+    """
+    Navigate to the specified URL.
+    With a clearance_cache the cloudflare human verification only runs when no valid clearance is cached.
+    """
+    return _get_browser().load_page(url, try_human_verif_bypass, clearance_cache)
 
 
-@decorators._must_have_driver_initialized
 def get_page_source() -> str:
     """
     Get the HTML source of the current page.
     """
-    return _driver.page_source
+    return _get_browser().get_page_source()
+
+
+def get_changes(selector: str = None, max_mutations: int = DEFAULT_MAX_MUTATIONS,
+                include_mutations: bool = True) -> Dict[str, Any]:
+    """
+    Report what changed in the page, or under the element matching the CSS selector, since the previous call.
+    The first call on a page returns a full snapshot, later ones only the mutations and a content hash.
+    Returns a dict with the keys reset, changed, hash, mutations and snapshot.
+    """
+    return _get_browser().get_changes(selector, max_mutations, include_mutations)
+
+
+def stop_tracking_changes():
+    """
+    Remove the MutationObserver installed by get_changes.
+    """
+    _get_browser().stop_tracking_changes()
 
 
-@decorators._must_have_driver_initialized
 def is_page_ready() -> bool:
     """
     Check if the current page is fully loaded.
     """
-    _log.debug("checking if page is ready")
-
-    return execute_script(
-        'return document.readyState == "complete";'
-    )
+    return _get_browser().is_page_ready()
 
 
-@decorators._must_have_driver_initialized
-def wait_page_ready(timeout: int = 30):
+def wait_page_ready(timeout: int = 30, wait_policy: WaitPolicy = None):
     """
     Wait for the current page to be fully loaded.
     """
-    _log.debug(f"waiting max {timeout}sec for page to be ready")
+    _get_browser().wait_page_ready(timeout, wait_policy)
+
+
+def wait_any(conditions: Union[Dict[Any, Condition], List[Condition]], timeout: int = 10,
+             wait_policy: WaitPolicy = None) -> Tuple[Any, Any]:
+    """
+    Wait until any of the conditions holds, evaluating all of them in a single round-trip per check.
+    Conditions are given as a dict or a list and the key or index of the condition that fired
+    is returned along with its value, e.g. the element for waits.element_exists.
+    """
+    return _get_browser().wait_any(conditions, timeout, wait_policy)
 
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda x: not x,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
 
-    b(is_page_ready)()
+def wait_all(conditions: Union[Dict[Any, Condition], List[Condition]], timeout: int = 10,
+             wait_policy: WaitPolicy = None) -> Dict[Any, Any]:
+    """
+    Wait until all the conditions hold at the same time, evaluating them in a single round-trip per check.
+    Returns the value of every condition by its key or index.
+    """
+    return _get_browser().wait_all(conditions, timeout, wait_policy)
+
+
+def get_resource_report(baseline: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Returns the number of requests and bytes transferred by the current page along with
+    the number and URLs of the resources it referenced but did not load because of resource blocking.
+    Pass the report of an unblocked load of the same page as baseline to get bytes_saved and requests_saved.
+    """
+    return _get_browser().get_resource_report(baseline)
 
 
-@decorators._must_have_driver_initialized
 def get_page_title() -> str:
     """
     Returns the title of the current page.
     """
-    return _driver.title
+    return _get_browser().get_page_title()
 
 
-@decorators._must_have_driver_initialized
 def get_page_url() -> str:
     """
     Returns the URL of the current page.
     """
-    return _driver.current_url
+    return _get_browser().get_page_url()
 
 
-@decorators._must_have_driver_initialized
 def scroll_page():
     """
     Scrolls the page by its current height.
     """
-    _log.debug("scrolling page")
-
-    return execute_script('window.scrollTo(0, document.body.scrollHeight);')
+    return _get_browser().scroll_page()
 
 
-@decorators._must_have_driver_initialized
-def is_text_on_page(text: str) -> bool:
+def scroll_until_stable(max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_ms: int = DEFAULT_SCROLL_IDLE_MS,
+                        item_selector: str = None) -> Iterator[WebElement]:
     """
-    Check if the given text is present on the current page.
+    Scroll to the bottom of the page until it stops growing and yield the elements matching item_selector
+    as they appear, the ones already on the page first.
     """
-    _log.debug(f"checking if page contains text: {text}")
+    return _get_browser().scroll_until_stable(max_scrolls, idle_ms, item_selector)
 
-    if find_elements(SELECTOR_TYPE_XPATH, f'//*[contains(text(), "{text}")]'):
-        return True
 
-    return False
+def is_text_on_page(text: str, regex: bool = False, ignore_case: bool = False) -> bool:
+    """
+    Check if the given text is present in the rendered text of the current page.
+    If regex is set the text is used as a JavaScript regular expression.
+    """
+    return _get_browser().is_text_on_page(text, regex, ignore_case)
 
 
-@decorators._must_have_driver_initialized
-def wait_text_on_page(text: str, timeout: int = 30):
+def count_text_on_page(text: str, regex: bool = False, ignore_case: bool = False) -> int:
     """
-    Wait for the given text to appear on the current page.
+    Count the non-overlapping occurrences of the given text in the rendered text of the current page.
+    If regex is set the text is used as a JavaScript regular expression.
     """
-    _log.debug(f"waiting {timeout}sec for page to contain text: {text}")
+    return _get_browser().count_text_on_page(text, regex, ignore_case)
 
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda x: not x,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
 
-    b(is_text_on_page)(text)
+def wait_text_on_page(text: str, timeout: int = 30, wait_policy: WaitPolicy = None,
+                      regex: bool = False, ignore_case: bool = False):
+    """
+    Wait for the given text to appear on the current page.
+    """
+    _get_browser().wait_text_on_page(text, timeout, wait_policy, regex, ignore_case)
 
 
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
 def find_element(selector_type: str, selector: str, parent_el: WebElement = None) -> WebElement:
     """
     Find the first element matching the given selector and selector type.
     If parent_el is set, it will search for a child element.
     """
-    _log.debug(
-        f"finding element matching {selector} by selector type {selector_type}")
-
-    try:
-        root_el = _driver
-        if parent_el is not None:
-            root_el = parent_el
-
-        return root_el.find_element(getattr(By, selector_type), selector)
-    except:
-        return None
+    return _get_browser().find_element(selector_type, selector, parent_el)
 
 
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
 def find_select_element(selector_type: str, selector: str, parent_el: WebElement = None) -> Select:
     """
     Find the first element matching the given selector and selector type and return it as a Select wrapped WebElement.
     If parent_el is set, it will search for a child element.
     """
-    _log.debug(
-        f"finding element matching {selector} by selector type {selector_type} and returning it as a Select wrapped WebElement")
+    return _get_browser().find_select_element(selector_type, selector, parent_el)
 
-    return Select(find_element(selector_type, selector, parent_el))
 
-
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
 def find_elements(selector_type: str, selector: str, parent_el: WebElement = None) -> List[WebElement]:
     """
     Find all elements matching the given selector and selector type.
     If parent_el is set, it will search for child elements.
     """
-    _log.debug(
-        f"finding elements matching {selector} by selector type {selector_type}")
+    return _get_browser().find_elements(selector_type, selector, parent_el)
 
-    try:
-        root_el = _driver
-        if parent_el is not None:
-            root_el = parent_el
-
-        return root_el.find_elements(getattr(By, selector_type), selector)
-    except:
-        return None
 
-
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
-def wait_element_exists(selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None) -> WebElement:
+def wait_element_exists(selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None,
+                        wait_policy: WaitPolicy = None) -> WebElement:
     """
     Waits for an element matching the given selector by selector_type to exist on the current page.
     If parent_el is set, it will wait for a child element.
     """
-    _log.debug(
-        f"waiting for element matching {selector} by selector type {selector_type} to exist")
-
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda el: el is None,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
+    return _get_browser().wait_element_exists(selector_type, selector, timeout, parent_el, wait_policy)
 
-    return b(find_element)(selector_type, selector, parent_el)
 
-
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
-def wait_element_not_exists(selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None):
+def wait_element_not_exists(selector_type: str, selector: str, timeout: int = 10, parent_el: WebElement = None,
+                            wait_policy: WaitPolicy = None):
     """
     Waits for an element matching the given selector by selector_type to not exist on the current page.
     If parent_el is set, it will wait for a child element.
     """
-    _log.debug(
-        f"waiting for element matching {selector} by selector type {selector_type} to not exist")
+    _get_browser().wait_element_not_exists(selector_type, selector, timeout, parent_el, wait_policy)
 
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda el: el is not None,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
 
-    b(find_element)(selector_type, selector, parent_el)
+def query_many(spec: Dict[str, Union[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Run many named queries in a single execute_script round-trip and return plain Python data.
+    See query.compile_query_spec for the spec format. Single queries map to a dict of the
+    extracted fields or None if nothing matched, multiple queries map to a list of dicts.
+    """
+    return _get_browser().query_many(spec)
 
 
-@decorators._must_have_driver_initialized
 def is_element_visible(element: WebElement) -> bool:
     """
     Check if the given element is visible and in the current viewport.
     """
-    return element.is_displayed()
+    return _get_browser().is_element_visible(element)
 
 
-@decorators._must_have_driver_initialized
-def wait_element_is_visible(element: WebElement, timeout: int = 10):
+def wait_element_is_visible(element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
     """
     Wait for the given element to be visible and in the current viewport.
     """
-    _log.debug(
-        f"waiting {timeout}sec for element to be visible and in the current viewport: {element}")
-
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda x: not x,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
+    _get_browser().wait_element_is_visible(element, timeout, wait_policy)
 
-    b(is_element_visible)(element)
 
-
-@decorators._must_have_driver_initialized
-def wait_element_not_visible(element: WebElement, timeout: int = 10):
+def wait_element_not_visible(element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
     """
     Wait for the given element to not be visible.
     """
-    _log.debug(
-        f"waiting {timeout}sec for element to not be visible: {element}")
-
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda x: x,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
+    _get_browser().wait_element_not_visible(element, timeout, wait_policy)
 
-    b(is_element_visible)(element)
 
-
-@decorators._must_have_driver_initialized
 def is_element_in_viewport(element: WebElement) -> bool:
     """
     Check if an element is visible in the viewport
     """
-    _log.debug(f"checking if element {element} is in viewport")
-
-    bounding_rect = execute_script("""
-        var rect = arguments[0].getBoundingClientRect();
-        return {
-            x: rect.x,
-            y: rect.y,
-            width: rect.width,
-            height: rect.height,
-            top: rect.top,
-            right: rect.right,
-            bottom: rect.bottom,
-            left: rect.left
-        };
-    """, element)
-
-    viewport_size = execute_script("""
-        return {
-            width: document.documentElement.clientWidth,
-            height: document.documentElement.clientHeight
-        };
-    """)
-
-    if bounding_rect["right"] < 0 or bounding_rect["bottom"] < 0:
-        return False
-    if bounding_rect["left"] > viewport_size["width"] or bounding_rect["top"] > viewport_size["height"]:
-        return False
-    return True
+    return _get_browser().is_element_in_viewport(element)
 
 
-@decorators._must_have_driver_initialized
-def wait_element_in_viewport(element: WebElement, timeout: int = 10):
+def wait_element_in_viewport(element: WebElement, timeout: int = 10, wait_policy: WaitPolicy = None):
     """
     Wait for an element to be visible in viewport
     """
-    _log.debug(f"waiting {timeout}sec for element {element} to be viewport")
+    _get_browser().wait_element_in_viewport(element, timeout, wait_policy)
 
-    b = backoff.on_predicate(
-        backoff.expo,
-        lambda x: not x,
-        on_giveup=utils.backoff_raise_timeout_exception,
-        max_time=timeout
-    )
 
-    b(is_element_in_viewport)(element)
-
-
-@decorators._must_have_driver_initialized
 def scroll_to_element(element: WebElement):
     """
     Scrolls the page so that the given element is visible.
     """
-    _log.debug(f"scrolling to element {element}")
-    execute_script('return arguments[0].scrollIntoView(true);', element)
+    _get_browser().scroll_to_element(element)
 
 
-@decorators._must_have_supported_selector_type
-@decorators._must_have_driver_initialized
 def switch_to_iframe(selector_type: str, selector: str):
     """
     Move to an iframe
     """
-    _log.debug(f"switching to iframe {selector} by {selector_type}")
-    el = find_element(selector_type, selector)
-    if el is None:
-        raise Exception(f"could not find iframe {selector} by {selector_type}")
-
-    _driver.switch_to.frame(el)
+    _get_browser().switch_to_iframe(selector_type, selector)
 
 
-@decorators._must_have_driver_initialized
 def switch_to_main():
     """
     Switch to base frame
     """
-    _log.debug(f"switching to main")
-    _driver.switch_to.default_content()
+    _get_browser().switch_to_main()
 
 
-@decorators._must_have_driver_initialized
 def hover_on_element(element: WebElement):
     """
     Hovers the mouse pointer over the given element.
     """
-    _log.debug(f"hovering to element {element}")
-
-    actions = ActionChains(_driver)
-    actions.move_to_element(element)
-    actions.perform()
+    _get_browser().hover_on_element(element)
 
 
-@decorators._must_have_driver_initialized
 def click_by_js(element: WebElement):
     """
     Clicks the given element using JavaScript.
     """
-    _log.debug(f"clicking on element {element} by JS")
-    execute_script('arguments[0].click();', element)
+    _get_browser().click_by_js(element)
 
 
-@decorators._must_have_driver_initialized
 def execute_script(script: str, *args) -> Any:
     """
     Execute a JavaScript script.
     """
-    _log.debug(f"executing script {script}")
+    return _get_browser().execute_script(script, *args)
 
-    return _driver.execute_script(script, *args)
 
-
-@decorators._must_have_driver_initialized
-def wait_for_alert(timeout: int = 3) -> Alert:
+def wait_for_alert(timeout: int = 3, wait_policy: WaitPolicy = None) -> Alert:
     """
     Wait for an alert to be present.
     """
-    _log.debug(f"waiting {timeout}sec for an alert")
-
-    return WebDriverWait(_driver, timeout).until(EC.alert_is_present())
+    return _get_browser().wait_for_alert(timeout, wait_policy)
 
 
-@decorators._must_have_driver_initialized
 def add_cookie(name: str, value: str):
     """
     Add a cookie to the page
     """
-    _log.debug(f"adding cookie {name} = {value}")
-
-    cookie = {
-        "name": name,
-        "value": value,
-    }
+    _get_browser().add_cookie(name, value)
 
-    _driver.add_cookie(cookie)
 
-
-@decorators._must_have_driver_initialized
 def get_cookie(name: str) -> Any:
     """
     Get a cookie by name
     """
-    _log.debug(f"getting cookie {name}")
-
-    return _driver.get_cookie(name)
+    return _get_browser().get_cookie(name)
 
 
-@decorators._must_have_driver_initialized
 def delete_cookie(name: str):
     """
     Delete a cookie by name
     """
-    _log.debug(f"deleting cookie {name}")
-
-    return _driver.delete_cookie(name)
+    return _get_browser().delete_cookie(name)
 
 
-@decorators._must_have_driver_initialized
 def clear_cookies():
     """
     Clear all cookies.
     """
-    _driver.delete_all_cookies()
+    _get_browser().clear_cookies()
+
+
+def export_session_state() -> Dict[str, Any]:
+    """
+    Capture the cookies with all their attributes and the localStorage and sessionStorage
+    of the current page's origin, as a JSON serializable dict.
+    """
+    return _get_browser().export_session_state()
+
+
+def import_session_state(session_state: Dict[str, Any]):
+    """
+    Restore a state captured by export_session_state, navigating to its origin first if needed.
+    """
+    _get_browser().import_session_state(session_state)
 
 
-@decorators._must_have_supported_screenshot_output_type
-@decorators._must_have_driver_initialized
 def screenshot(output_type: str, filename=None) -> str:
     """
     Take a screenshot.
     """
-    filename_log_part = f" and filename {filename}"
-    _log.debug(
-        f"taking a screenshot having output type {output_type}{filename_log_part}")
+    return _get_browser().screenshot(output_type, filename)
 
-    if output_type is SCREENSHOT_OUTPUT_TYPE_BASE64:
-        return _driver.get_screenshot_as_base64()
 
-    png_filename = f"{filename}.png"
-    if not _driver.get_screenshot_as_file(png_filename):
-        raise Exception("could not get screenshot as file")
+def capture_screenshot(
+    element: WebElement = None,
+    clip: Tuple[float, float, float, float] = None,
+    full_page: bool = False,
+    image_format: str = SCREENSHOT_FORMAT_PNG,
+    quality: int = None,
+) -> bytes:
+    """
+    Take a screenshot and return the encoded image as bytes.
+    element captures only that element and clip an (x, y, width, height) region of the page in CSS pixels.
+    full_page captures the whole page instead of the viewport.
+    """
+    return _get_browser().capture_screenshot(element, clip, full_page, image_format, quality)
+
 
-    return png_filename
+def write_screenshot(stream: Any, **kwargs) -> int:
+    """
+    Take a screenshot like capture_screenshot and write it to a binary file-like object or stream.
+    Returns the number of bytes written.
+    """
+    return _get_browser().write_screenshot(stream, **kwargs)
@@ -0,0 +1,301 @@
+import logging
+import threading
+
+from contextlib import contextmanager
+from time import monotonic
+from typing import Dict, List, Iterator
+from . import metrics
+from .browser import Browser
+from .blocking import ResourceBlocking
+from .profile import SessionProfile
+from .constants import DRIVER_TYPE_FIREFOX
+
+_log = logging.getLogger(__package__)
+
+DEFAULT_MAX_SIZE: int = 4
+DEFAULT_MAX_IDLE_TIME: int = 300
+
+
+class _PooledSession:
+    def __init__(self, browser: Browser, profile: SessionProfile):
+        self.browser = browser
+        self.profile = profile
+        self.last_used = monotonic()
+
+
+class SessionPool:
+    """
+    A pool of warm browser sessions connected to one Selenium Hub.
+    Sessions are checked out as Browser handles for exclusive use and checked back in when done.
+    Idle sessions above min_size are evicted after max_idle_time seconds and
+    every idle session is health checked before it is handed out again.
+    Sessions are grouped by SessionProfile: checkout hands out a session of the requested
+    profile, the pool's own profile by default, and a full pool makes room for another
+    profile by quitting its least recently used idle session.
+    """
+
+    def __init__(
+        self,
+        selenium_hub_url: str,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        max_size: int = DEFAULT_MAX_SIZE,
+        min_size: int = 0,
+        max_idle_time: int = DEFAULT_MAX_IDLE_TIME,
+        checkout_timeout: int = None,
+        driver_arguments: List[str] = [],
+        user_agent: str = "",
+        disable_notifications: bool = False,
+        resource_blocking: ResourceBlocking = None,
+        profile: SessionProfile = None,
+    ):
+        if max_size < 1:
+            raise Exception("max_size must be at least 1")
+
+        if min_size > max_size:
+            raise Exception("min_size can not be greater than max_size")
+
+        if profile is None:
+            profile = SessionProfile(driver_type, driver_arguments, user_agent=user_agent,
+                                     disable_notifications=disable_notifications,
+                                     resource_blocking=resource_blocking)
+
+        self.selenium_hub_url = selenium_hub_url
+        self.profile = profile
+        self.driver_type = profile.driver_type
+        self.max_size = max_size
+        self.min_size = min_size
+        self.max_idle_time = max_idle_time
+        self.checkout_timeout = checkout_timeout
+
+        self._lock = threading.Condition()
+        self._idle: Dict[SessionProfile, List[_PooledSession]] = {}
+        self._size = 0
+        self._closed = False
+
+        try:
+            for _ in range(min_size):
+                browser = self._create_browser(profile)
+                with self._lock:
+                    self._size += 1
+                    self._idle.setdefault(profile, []).append(_PooledSession(browser, profile))
+        except:
+            # nobody gets a handle on a pool that failed to warm up, so its sessions have to go now
+            self.close()
+            raise
+
+    def __enter__(self) -> "SessionPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def size(self) -> int:
+        """
+        The number of sessions owned by the pool, checked out or idle.
+        """
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        """
+        The number of idle sessions waiting to be checked out, of any profile.
+        """
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def _create_browser(self, profile: SessionProfile) -> Browser:
+        _log.debug(
+            "creating pooled %s session with profile %s on %s",
+            profile.driver_type, profile.fingerprint, self.selenium_hub_url)
+
+        return Browser.connect(self.selenium_hub_url, profile=profile)
+
+    def _quit_browser(self, browser: Browser):
+        try:
+            browser.quit()
+        except Exception as e:
+            _log.debug("could not quit pooled session: %s", e)
+
+    def _is_healthy(self, browser: Browser) -> bool:
+        try:
+            browser.driver.current_url
+        except Exception as e:
+            _log.debug("pooled session failed health check: %s", e)
+            return False
+
+        return True
+
+    def _pop_expired(self) -> List[Browser]:
+        # must be called with self._lock held
+        now = monotonic()
+        expired = []
+        for profile, idle in list(self._idle.items()):
+            keep = []
+            for pooled in idle:
+                if self._size - len(expired) > self.min_size and now - pooled.last_used > self.max_idle_time:
+                    expired.append(pooled.browser)
+                    continue
+
+                keep.append(pooled)
+
+            if keep:
+                self._idle[profile] = keep
+            else:
+                del self._idle[profile]
+
+        self._size -= len(expired)
+        if expired:
+            self._lock.notify_all()
+
+        return expired
+
+    def _pop_idle(self, profile: SessionProfile) -> _PooledSession:
+        # must be called with self._lock held
+        idle = self._idle.get(profile)
+        if not idle:
+            return None
+
+        pooled = idle.pop()
+        if not idle:
+            del self._idle[profile]
+
+        return pooled
+
+    def _pop_least_recently_used(self) -> _PooledSession:
+        # must be called with self._lock held, sessions are checked in at the end so idle[0] is the oldest
+        if not self._idle:
+            return None
+
+        profile = min(self._idle, key=lambda p: self._idle[p][0].last_used)
+        idle = self._idle[profile]
+        pooled = idle.pop(0)
+        if not idle:
+            del self._idle[profile]
+
+        return pooled
+
+    def evict_idle(self) -> int:
+        """
+        Quit the idle sessions that exceeded max_idle_time while keeping at least min_size sessions.
+        Returns the number of evicted sessions.
+        """
+        with self._lock:
+            expired = self._pop_expired()
+
+        for browser in expired:
+            _log.debug("evicting idle pooled session")
+            self._quit_browser(browser)
+
+        return len(expired)
+
+    @metrics._instrument("session_pool.checkout")
+    def checkout(self, profile: SessionProfile = None) -> Browser:
+        """
+        Take a session of the given profile, the pool's profile by default, out of the pool.
+        A new one is created if none is idle and the pool is not full, or if the pool is full
+        but has an idle session of another profile to make room with.
+        Otherwise blocks until a session is checked in, raising an exception
+        if checkout_timeout is set and no session became available in time.
+        """
+        if profile is None:
+            profile = self.profile
+
+        deadline = None
+        if self.checkout_timeout is not None:
+            deadline = monotonic() + self.checkout_timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise Exception("session pool is closed")
+
+                expired = self._pop_expired()
+
+                pooled = self._pop_idle(profile)
+                if pooled is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                    elif self._idle:
+                        # the slot of the other profile's idle session goes to the new one
+                        expired.append(self._pop_least_recently_used().browser)
+                    else:
+                        remaining = None
+                        if deadline is not None:
+                            remaining = deadline - monotonic()
+                            if remaining <= 0:
+                                raise Exception("session pool checkout timeout")
+
+                        self._lock.wait(remaining)
+                        continue
+
+            for browser in expired:
+                self._quit_browser(browser)
+
+            if pooled is not None:
+                if self._is_healthy(pooled.browser):
+                    return pooled.browser
+
+                self._discard(pooled.browser)
+                continue
+
+            try:
+                return self._create_browser(profile)
+            except:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+
+                raise
+
+    def checkin(self, browser: Browser, discard: bool = False):
+        """
+        Return a checked out session to the pool.
+        If discard is set or the pool is closed the session is quit instead of being reused.
+        """
+        with self._lock:
+            if not discard and not self._closed:
+                profile = browser.profile or self.profile
+                self._idle.setdefault(profile, []).append(_PooledSession(browser, profile))
+                # waiters for other profiles may take this session's slot
+                self._lock.notify_all()
+                return
+
+        self._discard(browser)
+
+    def _discard(self, browser: Browser):
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+        self._quit_browser(browser)
+
+    @contextmanager
+    def session(self, profile: SessionProfile = None) -> Iterator[Browser]:
+        """
+        Check out a session for the duration of a with block.
+        The session is discarded instead of reused if the block raises an exception.
+        """
+        browser = self.checkout(profile)
+        try:
+            yield browser
+        except:
+            self.checkin(browser, discard=True)
+            raise
+
+        self.checkin(browser)
+
+    def close(self):
+        """
+        Quit all idle sessions and stop handing out new ones.
+        Sessions checked out at this point are quit when checked in.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [pooled for sessions in self._idle.values() for pooled in sessions]
+            self._idle = {}
+            self._size -= len(idle)
+            self._lock.notify_all()
+
+        for pooled in idle:
+            self._quit_browser(pooled.browser)
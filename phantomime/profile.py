@@ -0,0 +1,188 @@
+import copy
+import json
+
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+from .blocking import ResourceBlocking
+from .constants import (
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+)
+
+_driver_types: List[str] = [
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+]
+
+# the capabilities selenium's FirefoxOptions and ChromeOptions start out with
+_driver_type_to_default_capabilities: Dict[str, Dict[str, Any]] = {
+    DRIVER_TYPE_FIREFOX: {
+        "browserName": "firefox",
+        "acceptInsecureCerts": True,
+        "moz:debuggerAddress": True,
+        "pageLoadStrategy": "normal",
+    },
+    DRIVER_TYPE_CHROME: {
+        "browserName": "chrome",
+        "pageLoadStrategy": "normal",
+    },
+}
+
+_driver_type_to_options_key: Dict[str, str] = {
+    DRIVER_TYPE_FIREFOX: "moz:firefoxOptions",
+    DRIVER_TYPE_CHROME: "goog:chromeOptions",
+}
+
+
+def _validate_driver_type(driver_type: str) -> str:
+    driver_type = driver_type.upper()
+    if driver_type not in _driver_types:
+        raise Exception(
+            f"invalid driver type. supported: {', '.join(_driver_types)}"
+        )
+
+    return driver_type
+
+
+def _compile(driver_type: str, driver_arguments: Tuple[str, ...], preferences: Mapping[str, Any], user_agent: str,
+             disable_notifications: bool, resource_blocking: ResourceBlocking) -> Tuple[Dict, List[Tuple[str, Dict]]]:
+    args = list(driver_arguments)
+    prefs = dict(preferences)
+    cdp_commands = []
+
+    if driver_type == DRIVER_TYPE_CHROME:
+        if user_agent != "":
+            args.append(f"--user-agent={user_agent}")
+
+        if disable_notifications:
+            args.append("--disable-notifications")
+
+        if resource_blocking is not None:
+            prefs.update(resource_blocking._chrome_prefs())
+            cdp_commands = resource_blocking._chrome_cdp_commands()
+    else:
+        if user_agent != "":
+            prefs["general.useragent.override"] = user_agent
+
+        if disable_notifications:
+            prefs["dom.webnotifications.enabled"] = False
+
+        if resource_blocking is not None:
+            prefs.update(resource_blocking._firefox_prefs())
+
+    options = {"args": args}
+    if prefs:
+        options["prefs"] = prefs
+
+    capabilities = dict(_driver_type_to_default_capabilities[driver_type])
+    capabilities[_driver_type_to_options_key[driver_type]] = options
+
+    return capabilities, cdp_commands
+
+
+class SessionProfile:
+    """
+    Everything a browser session is created with: driver type, browser arguments and preferences,
+    user agent, notifications and resource blocking.
+    Profiles are immutable and compiled into W3C capabilities once when they are built.
+    Equal profiles hash the same, so sessions can be grouped and reused by profile.
+    """
+
+    __slots__ = (
+        "driver_type",
+        "driver_arguments",
+        "preferences",
+        "user_agent",
+        "disable_notifications",
+        "resource_blocking",
+        "_capabilities",
+        "_cdp_commands",
+        "_key",
+        "_hash",
+        "_options",
+    )
+
+    def __init__(
+        self,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        driver_arguments: List[str] = [],
+        preferences: Dict[str, Any] = {},
+        user_agent: str = "",
+        disable_notifications: bool = False,
+        resource_blocking: ResourceBlocking = None,
+    ):
+        driver_type = _validate_driver_type(driver_type)
+        driver_arguments = tuple(driver_arguments)
+        preferences = MappingProxyType(dict(preferences))
+
+        capabilities, cdp_commands = _compile(driver_type, driver_arguments, preferences,
+                                              user_agent, disable_notifications, resource_blocking)
+        key = json.dumps([capabilities, cdp_commands], sort_keys=True)
+
+        object.__setattr__(self, "driver_type", driver_type)
+        object.__setattr__(self, "driver_arguments", driver_arguments)
+        object.__setattr__(self, "preferences", preferences)
+        object.__setattr__(self, "user_agent", user_agent)
+        object.__setattr__(self, "disable_notifications", disable_notifications)
+        object.__setattr__(self, "resource_blocking", resource_blocking)
+        object.__setattr__(self, "_capabilities", capabilities)
+        object.__setattr__(self, "_cdp_commands", cdp_commands)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash(key))
+        object.__setattr__(self, "_options", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SessionProfile is immutable")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SessionProfile) and self._key == other._key
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"SessionProfile(driver_type={self.driver_type!r}, fingerprint={self.fingerprint!r})"
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        A short stable digest of the compiled profile, the same across processes for equal profiles.
+        """
+        import hashlib
+
+        return hashlib.sha1(self._key.encode()).hexdigest()[:12]
+
+    def capabilities(self) -> Dict[str, Any]:
+        """
+        Returns a copy of the W3C capabilities sessions of this profile are created with.
+        """
+        return copy.deepcopy(self._capabilities)
+
+    def replace(self, **changes) -> "SessionProfile":
+        """
+        Returns a new profile with the given fields changed.
+        """
+        fields = {
+            "driver_type": self.driver_type,
+            "driver_arguments": self.driver_arguments,
+            "preferences": self.preferences,
+            "user_agent": self.user_agent,
+            "disable_notifications": self.disable_notifications,
+            "resource_blocking": self.resource_blocking,
+        }
+        fields.update(changes)
+
+        return SessionProfile(**fields)
+
+    def _selenium_options(self) -> Any:
+        # built on the first session and shared by the following ones, webdriver.Remote only reads it
+        if self._options is None:
+            from selenium.webdriver.common.options import ArgOptions
+
+            options = ArgOptions()
+            for name, value in self.capabilities().items():
+                options.set_capability(name, value)
+
+            object.__setattr__(self, "_options", options)
+
+        return self._options
@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Union
+from .constants import (
+    SELECTOR_TYPE_XPATH,
+    SELECTOR_TYPE_CSS,
+    QUERY_FIELD_TEXT,
+    QUERY_FIELD_HTML,
+    QUERY_FIELD_VISIBLE,
+    QUERY_FIELD_RECT,
+)
+
+_supported_selector_types: List[str] = [
+    SELECTOR_TYPE_XPATH,
+    SELECTOR_TYPE_CSS,
+]
+
+_supported_fields: List[str] = [
+    QUERY_FIELD_TEXT,
+    QUERY_FIELD_HTML,
+    QUERY_FIELD_VISIBLE,
+    QUERY_FIELD_RECT,
+]
+
+
+def compile_query_spec(spec: Dict[str, Union[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Validate a query_many spec and turn it into the list of queries the in-page script expects.
+
+    Every key of the spec names a query and its value is either a CSS selector string,
+    which extracts the text of the first match, or a dict with the keys:
+    - selector: the selector, required
+    - selector_type: SELECTOR_TYPE_CSS (default) or SELECTOR_TYPE_XPATH
+    - fields: a list of QUERY_FIELD_* values, defaults to [QUERY_FIELD_TEXT]
+    - attributes: a list of attribute names to extract
+    - multiple: extract all the matches instead of the first one
+    """
+    queries = []
+    for name, query in spec.items():
+        if isinstance(query, str):
+            query = {"selector": query}
+
+        if "selector" not in query:
+            raise Exception(f"query {name} has no selector")
+
+        selector_type = query.get("selector_type", SELECTOR_TYPE_CSS).upper()
+        if selector_type not in _supported_selector_types:
+            raise Exception(
+                f"invalid selector type {selector_type} for query {name}. supported: {', '.join(_supported_selector_types)}"
+            )
+
+        fields = list(query.get("fields", [QUERY_FIELD_TEXT]))
+        for field in fields:
+            if field not in _supported_fields:
+                raise Exception(
+                    f"invalid field {field} for query {name}. supported: {', '.join(_supported_fields)}"
+                )
+
+        queries.append({
+            "name": name,
+            "selector": query["selector"],
+            "xpath": selector_type == SELECTOR_TYPE_XPATH,
+            "fields": fields,
+            "attributes": list(query.get("attributes", [])),
+            "multiple": bool(query.get("multiple", False)),
+        })
+
+    return queries
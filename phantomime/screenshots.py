@@ -0,0 +1,123 @@
+import io
+
+from typing import Any, Dict, List, Tuple
+from .constants import (
+    SCREENSHOT_FORMAT_PNG,
+    SCREENSHOT_FORMAT_JPEG,
+    SCREENSHOT_FORMAT_WEBP,
+)
+
+_screenshot_formats: List[str] = [
+    SCREENSHOT_FORMAT_PNG,
+    SCREENSHOT_FORMAT_JPEG,
+    SCREENSHOT_FORMAT_WEBP,
+]
+
+
+def _validate_format(image_format: str, quality: int) -> str:
+    image_format = image_format.upper()
+    if image_format not in _screenshot_formats:
+        raise Exception(
+            f"invalid screenshot format {image_format}. supported: {', '.join(_screenshot_formats)}")
+
+    if quality is not None and not 0 <= quality <= 100:
+        raise Exception("screenshot quality must be between 0 and 100")
+
+    return image_format
+
+
+def _image_module() -> Any:
+    # Pillow is only needed to crop, stitch and re-encode screenshots the browser can't produce itself
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Exception("this screenshot needs Pillow, install it with pip install phantomime[images]")
+
+    return Image
+
+
+def _cdp_params(image_format: str, quality: int, clip: Dict[str, float]) -> Dict[str, Any]:
+    params = {"format": image_format.lower(), "captureBeyondViewport": clip is not None}
+    if quality is not None and image_format != SCREENSHOT_FORMAT_PNG:
+        params["quality"] = quality
+
+    if clip is not None:
+        params["clip"] = dict(clip, scale=1)
+
+    return params
+
+
+def _clip(clip: Tuple[float, float, float, float]) -> Dict[str, float]:
+    x, y, width, height = clip
+    if width <= 0 or height <= 0:
+        raise Exception("screenshot clip must have a positive width and height")
+
+    return {"x": x, "y": y, "width": width, "height": height}
+
+
+def _encode(image: Any, image_format: str, quality: int) -> bytes:
+    if image_format == SCREENSHOT_FORMAT_JPEG and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    kwargs = {}
+    if quality is not None and image_format != SCREENSHOT_FORMAT_PNG:
+        kwargs["quality"] = quality
+
+    out = io.BytesIO()
+    image.save(out, image_format, **kwargs)
+
+    return out.getvalue()
+
+
+def _convert(png: bytes, image_format: str, quality: int, clip: Dict[str, float] = None, scale: float = 1) -> bytes:
+    """
+    Crop a PNG screenshot to clip, given in CSS pixels, and re-encode it to image_format.
+    PNG screenshots that need neither are returned as they are.
+    """
+    if clip is None and image_format == SCREENSHOT_FORMAT_PNG:
+        return png
+
+    image = _image_module().open(io.BytesIO(png))
+    if clip is not None:
+        image = image.crop((
+            round(clip["x"] * scale),
+            round(clip["y"] * scale),
+            round((clip["x"] + clip["width"]) * scale),
+            round((clip["y"] + clip["height"]) * scale),
+        ))
+
+    return _encode(image, image_format, quality)
+
+
+def _stitch(segments: List[Tuple[float, bytes]], height: float, scale: float) -> bytes:
+    """
+    Paste viewport screenshots taken at the given vertical scroll offsets, in CSS pixels,
+    into one PNG of the full page height.
+    """
+    Image = _image_module()
+
+    images = [(offset, Image.open(io.BytesIO(png))) for offset, png in segments]
+    page = Image.new("RGB", (images[0][1].width, round(height * scale)))
+    for offset, image in images:
+        page.paste(image, (0, round(offset * scale)))
+
+    out = io.BytesIO()
+    page.save(out, SCREENSHOT_FORMAT_PNG)
+
+    return out.getvalue()
+
+
+def _stitch_clip(
+    segments: List[Tuple[float, bytes]],
+    viewport_height: float,
+    clip: Dict[str, float],
+    scale: float,
+) -> Tuple[bytes, Dict[str, float]]:
+    """
+    Paste viewport screenshots taken to cover clip into one PNG starting at the first scroll offset.
+    Returns the PNG and clip moved into it.
+    """
+    top = segments[0][0]
+    png = _stitch([(offset - top, png) for offset, png in segments], segments[-1][0] + viewport_height - top, scale)
+
+    return png, dict(clip, y=clip["y"] - top)
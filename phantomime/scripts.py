@@ -0,0 +1,621 @@
+# JavaScript snippets executed in the page by phantomime.
+# Each one is sent as the body of an execute_script/execute_async_script call.
+
+_IS_VISIBLE: str = """
+function isVisible(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) {
+        return false;
+    }
+    var style = window.getComputedStyle(el);
+    return style.visibility !== "hidden" && style.display !== "none" && style.opacity !== "0";
+}
+"""
+
+QUERY_MANY: str = _IS_VISIBLE + """
+var queries = arguments[0];
+var result = {};
+
+function findAll(query) {
+    if (query.xpath) {
+        var type = query.multiple ? XPathResult.ORDERED_NODE_SNAPSHOT_TYPE : XPathResult.FIRST_ORDERED_NODE_TYPE;
+        var res = document.evaluate(query.selector, document, null, type, null);
+        if (!query.multiple) {
+            return res.singleNodeValue ? [res.singleNodeValue] : [];
+        }
+        var nodes = [];
+        for (var i = 0; i < res.snapshotLength; i++) {
+            nodes.push(res.snapshotItem(i));
+        }
+        return nodes;
+    }
+    if (!query.multiple) {
+        var el = document.querySelector(query.selector);
+        return el ? [el] : [];
+    }
+    return Array.prototype.slice.call(document.querySelectorAll(query.selector));
+}
+
+function extract(el, query) {
+    var item = {};
+    for (var i = 0; i < query.fields.length; i++) {
+        var field = query.fields[i];
+        if (field === "text") {
+            item.text = el.innerText !== undefined ? el.innerText : el.textContent;
+        } else if (field === "html") {
+            item.html = el.outerHTML;
+        } else if (field === "visible") {
+            item.visible = isVisible(el);
+        } else if (field === "rect") {
+            var rect = el.getBoundingClientRect();
+            item.rect = {x: rect.x, y: rect.y, width: rect.width, height: rect.height};
+        }
+    }
+    if (query.attributes.length) {
+        item.attributes = {};
+        for (var j = 0; j < query.attributes.length; j++) {
+            item.attributes[query.attributes[j]] = el.getAttribute(query.attributes[j]);
+        }
+    }
+    return item;
+}
+
+for (var q = 0; q < queries.length; q++) {
+    var query = queries[q];
+    var items = [];
+    try {
+        var els = findAll(query);
+        for (var e = 0; e < els.length; e++) {
+            items.push(extract(els[e], query));
+        }
+    } catch (err) {
+        items = [];
+    }
+    result[query.name] = query.multiple ? items : (items.length ? items[0] : null);
+}
+
+return result;
+"""
+
+# Counts the occurrences of a {text, regex, ignoreCase} query in the rendered text of the page,
+# so text split across several nodes is found too. Stops counting at limit when it is not 0.
+_COUNT_TEXT: str = """
+function countText(query, limit) {
+    var root = document.body || document.documentElement;
+    if (!root) {
+        return 0;
+    }
+    var haystack = root.innerText;
+    if (haystack === undefined) {
+        haystack = root.textContent;
+    }
+    var count = 0;
+    if (query.regex) {
+        var re = new RegExp(query.text, query.ignoreCase ? "gi" : "g");
+        var match;
+        while ((match = re.exec(haystack)) !== null) {
+            count++;
+            if (limit && count >= limit) {
+                break;
+            }
+            if (match[0].length === 0) {
+                re.lastIndex++;
+            }
+        }
+        return count;
+    }
+    var needle = query.text;
+    if (!needle.length) {
+        return 0;
+    }
+    if (query.ignoreCase) {
+        haystack = haystack.toLowerCase();
+        needle = needle.toLowerCase();
+    }
+    var pos = haystack.indexOf(needle);
+    while (pos !== -1) {
+        count++;
+        if (limit && count >= limit) {
+            break;
+        }
+        pos = haystack.indexOf(needle, pos + needle.length);
+    }
+    return count;
+}
+"""
+
+COUNT_TEXT: str = _COUNT_TEXT + """
+return countText(arguments[0], arguments[1]);
+"""
+
+# Classifies the human verification shown by the page, arguments[0] holds the selectors and text to look for.
+DETECT_CHALLENGE: str = _COUNT_TEXT + """
+var params = arguments[0];
+if (document.querySelector(params.hcaptcha)) {
+    return "hcaptcha";
+}
+if (document.querySelector(params.button)) {
+    return "verify_button";
+}
+if (countText({text: params.text, regex: false, ignoreCase: false}, 1) > 0) {
+    return "interstitial";
+}
+return "none";
+"""
+
+_CONDITIONS: str = _IS_VISIBLE + _COUNT_TEXT + """
+function find(condition) {
+    var root = condition.root || document;
+    if (condition.xpath) {
+        return document.evaluate(condition.selector, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return root.querySelector(condition.selector);
+}
+
+function isInViewport(el) {
+    var rect = el.getBoundingClientRect();
+    if (rect.right < 0 || rect.bottom < 0) {
+        return false;
+    }
+    return !(rect.left > document.documentElement.clientWidth || rect.top > document.documentElement.clientHeight);
+}
+
+function check(condition) {
+    switch (condition.type) {
+        case "exists":
+            var el = find(condition);
+            return {met: !!el, value: el};
+        case "not_exists":
+            return {met: !find(condition), value: null};
+        case "text":
+            return {met: countText(condition.query, 1) > 0, value: null};
+        case "no_text":
+            return {met: countText(condition.query, 1) === 0, value: null};
+        case "visible":
+            return {met: isVisible(condition.element), value: null};
+        case "not_visible":
+            return {met: !isVisible(condition.element), value: null};
+        case "in_viewport":
+            return {met: isInViewport(condition.element), value: null};
+        case "page_ready":
+            return {met: document.readyState === "complete", value: null};
+    }
+    throw new Error("unknown condition type " + condition.type);
+}
+
+function checkAll(conditions) {
+    var results = [];
+    for (var i = 0; i < conditions.length; i++) {
+        results.push(check(conditions[i]));
+    }
+    return results;
+}
+
+function isDone(results, mode) {
+    for (var i = 0; i < results.length; i++) {
+        if (mode === "any" && results[i].met) {
+            return true;
+        }
+        if (mode === "all" && !results[i].met) {
+            return false;
+        }
+    }
+    return mode === "all";
+}
+"""
+
+# Evaluates a list of conditions once and returns a {met, value} result for each of them.
+CHECK_CONDITIONS: str = _CONDITIONS + """
+return checkAll(arguments[0]);
+"""
+
+# Resolves through the async script callback with {met: true, results} as soon as any or all
+# of the conditions hold, driven by MutationObserver/IntersectionObserver and page events,
+# or with {met: false} after timeoutMs.
+WAIT_FOR_CONDITIONS: str = _CONDITIONS + """
+var conditions = arguments[0];
+var mode = arguments[1];
+var timeoutMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var finished = false;
+var observers = [];
+var events = ["scroll", "resize", "load", "readystatechange", "transitionend", "animationend"];
+var timer = null;
+
+function finish(result) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    for (var i = 0; i < observers.length; i++) {
+        observers[i].disconnect();
+    }
+    for (var j = 0; j < events.length; j++) {
+        window.removeEventListener(events[j], evaluate, true);
+        document.removeEventListener(events[j], evaluate, true);
+    }
+    done(result);
+}
+
+function evaluate() {
+    try {
+        var results = checkAll(conditions);
+        if (isDone(results, mode)) {
+            finish({met: true, results: results});
+        }
+    } catch (err) {
+        finish({error: String(err)});
+    }
+}
+
+evaluate();
+if (!finished) {
+    var mutationObserver = new MutationObserver(evaluate);
+    mutationObserver.observe(document.documentElement || document, {
+        childList: true,
+        subtree: true,
+        attributes: true,
+        characterData: true
+    });
+    observers.push(mutationObserver);
+
+    if (window.IntersectionObserver) {
+        for (var c = 0; c < conditions.length; c++) {
+            if (conditions[c].element) {
+                var intersectionObserver = new IntersectionObserver(evaluate);
+                intersectionObserver.observe(conditions[c].element);
+                observers.push(intersectionObserver);
+            }
+        }
+    }
+
+    for (var k = 0; k < events.length; k++) {
+        window.addEventListener(events[k], evaluate, true);
+        document.addEventListener(events[k], evaluate, true);
+    }
+
+    timer = setTimeout(function () {
+        finish({met: false});
+    }, timeoutMs);
+}
+"""
+
+# Reports the requests and bytes transferred by the current page and the resources that
+# were referenced by it but not loaded because of arguments[0], a {types, patterns} blocking spec.
+RESOURCE_REPORT: str = """
+var params = arguments[0];
+var patterns = params.patterns.map(function (pattern) {
+    return new RegExp("^" + pattern.split("*").map(function (part) {
+        return part.replace(/[.+?^${}()|[\\]\\\\\\/]/g, "\\\\$&");
+    }).join(".*") + "$");
+});
+var report = {requests: 0, bytes: 0, blockedRequests: 0, blockedUrls: []};
+var seen = {};
+
+function has(type) {
+    return params.types.indexOf(type) !== -1;
+}
+
+function matches(url) {
+    return patterns.some(function (re) {
+        return re.test(url);
+    });
+}
+
+function addBlocked(url) {
+    if (url && !seen[url]) {
+        seen[url] = true;
+        report.blockedUrls.push(url);
+    }
+}
+
+var entries = performance.getEntriesByType("navigation").concat(performance.getEntriesByType("resource"));
+entries.forEach(function (entry) {
+    report.requests++;
+    report.bytes += entry.transferSize || 0;
+});
+
+if (has("image")) {
+    Array.prototype.forEach.call(document.images, function (img) {
+        if (img.complete && img.naturalWidth === 0) {
+            addBlocked(img.currentSrc || img.src);
+        }
+    });
+}
+
+if (has("media")) {
+    document.querySelectorAll("video, audio").forEach(function (el) {
+        var source = el.querySelector("source[src]");
+        var src = el.currentSrc || el.src || (source ? source.src : "");
+        if (el.readyState === 0) {
+            addBlocked(src);
+        }
+    });
+}
+
+if (has("stylesheet")) {
+    document.querySelectorAll('link[rel~="stylesheet"][href]').forEach(function (link) {
+        if (!link.sheet) {
+            addBlocked(link.href);
+        }
+    });
+}
+
+var blockedFonts = 0;
+if (has("font") && document.fonts) {
+    document.fonts.forEach(function (font) {
+        if (font.status === "error") {
+            blockedFonts++;
+        }
+    });
+}
+
+if (patterns.length) {
+    document.querySelectorAll("script[src], iframe[src], img[src], source[src], video[src], audio[src], link[href]").forEach(function (el) {
+        var url = el.src || el.href;
+        if (matches(url)) {
+            addBlocked(url);
+        }
+    });
+    entries.forEach(function (entry) {
+        if (matches(entry.name)) {
+            addBlocked(entry.name);
+        }
+    });
+}
+
+report.blockedRequests = report.blockedUrls.length + blockedFonts;
+
+return report;
+"""
+
+GET_STORAGE: str = """
+function dump(name) {
+    var items = {};
+    try {
+        var storage = window[name];
+        for (var i = 0; i < storage.length; i++) {
+            var key = storage.key(i);
+            items[key] = storage.getItem(key);
+        }
+    } catch (e) {
+        // storage is not available on this page, e.g. about:blank or a sandboxed document
+    }
+    return items;
+}
+
+return {local: dump("localStorage"), session: dump("sessionStorage")};
+"""
+
+SET_STORAGE: str = """
+function load(name, items) {
+    var count = 0;
+    try {
+        var storage = window[name];
+        Object.keys(items).forEach(function (key) {
+            storage.setItem(key, items[key]);
+            count++;
+        });
+    } catch (e) {
+        // storage is not available or full, keep what was restored so far
+    }
+    return count;
+}
+
+return load("localStorage", arguments[0]) + load("sessionStorage", arguments[1]);
+"""
+
+# The size of the page and the viewport in CSS pixels, the scroll offsets and the device pixel ratio.
+PAGE_METRICS: str = """
+var root = document.documentElement;
+var body = document.body || root;
+return {
+    width: Math.max(root.scrollWidth, body.scrollWidth, root.clientWidth),
+    height: Math.max(root.scrollHeight, body.scrollHeight, root.clientHeight),
+    viewportWidth: window.innerWidth,
+    viewportHeight: window.innerHeight,
+    scrollX: window.scrollX,
+    scrollY: window.scrollY,
+    dpr: window.devicePixelRatio || 1
+};
+"""
+
+# The rect of arguments[0] relative to the page rather than the viewport, in CSS pixels.
+ELEMENT_PAGE_RECT: str = """
+var rect = arguments[0].getBoundingClientRect();
+return {x: rect.left + window.scrollX, y: rect.top + window.scrollY, width: rect.width, height: rect.height};
+"""
+
+SCROLL_TO: str = """
+window.scrollTo(window.scrollX, arguments[0]);
+return window.scrollY;
+"""
+
+# Reports what changed under a root element since the previous call, arguments[0] being
+# {selector, maxMutations, includeMutations}. The first call on a document, or after the root
+# got replaced, installs a MutationObserver and returns a full snapshot. So does a call after
+# more than maxMutations mutations, as the snapshot is then smaller than the mutations.
+TRACK_CHANGES: str = """
+var params = arguments[0];
+var state = window.__phantomimeChanges;
+
+function hash(str) {
+    var h = 0x811c9dc5;
+    for (var i = 0; i < str.length; i++) {
+        h ^= str.charCodeAt(i);
+        h = Math.imul(h, 0x01000193);
+    }
+    return (h >>> 0).toString(16) + ":" + str.length;
+}
+
+function path(node) {
+    if (node.nodeType !== Node.ELEMENT_NODE) {
+        node = node.parentNode;
+    }
+    var parts = [];
+    while (node && node.nodeType === Node.ELEMENT_NODE) {
+        var part = node.tagName.toLowerCase();
+        if (node.id) {
+            parts.unshift(part + "#" + node.id);
+            break;
+        }
+        if (node.parentNode && node.parentNode.children) {
+            part += ":nth-child(" + (Array.prototype.indexOf.call(node.parentNode.children, node) + 1) + ")";
+        }
+        parts.unshift(part);
+        if (node === state.root) {
+            break;
+        }
+        node = node.parentNode;
+    }
+    return parts.join(">");
+}
+
+function serialize(node) {
+    return node.nodeType === Node.ELEMENT_NODE ? node.outerHTML : node.textContent;
+}
+
+function summarize(record) {
+    var summary = {type: record.type, target: path(record.target)};
+    if (record.type === "attributes") {
+        summary.attribute = record.attributeName;
+        summary.value = record.target.getAttribute(record.attributeName);
+    } else if (record.type === "characterData") {
+        summary.value = record.target.data;
+    } else {
+        summary.added = Array.prototype.map.call(record.addedNodes, serialize);
+        summary.removed = record.removedNodes.length;
+    }
+    return summary;
+}
+
+function collect(records) {
+    state.count += records.length;
+    if (state.overflow || !state.includeMutations) {
+        return;
+    }
+    if (state.records.length + records.length > state.maxMutations) {
+        state.overflow = true;
+        state.records = [];
+        return;
+    }
+    records.forEach(function (record) {
+        state.records.push(summarize(record));
+    });
+}
+
+if (!state || state.selector !== params.selector || !state.root.isConnected) {
+    if (state) {
+        state.observer.disconnect();
+    }
+    var root = params.selector ? document.querySelector(params.selector) : document.documentElement;
+    if (!root) {
+        return {error: "root element not found"};
+    }
+    state = {
+        selector: params.selector,
+        root: root,
+        maxMutations: params.maxMutations,
+        includeMutations: params.includeMutations,
+        records: [],
+        count: 0,
+        overflow: false
+    };
+    state.observer = new MutationObserver(collect);
+    state.observer.observe(root, {childList: true, attributes: true, characterData: true, subtree: true});
+    window.__phantomimeChanges = state;
+
+    var html = root.outerHTML;
+    state.hash = hash(html);
+    return {reset: true, changed: true, hash: state.hash, mutations: [], snapshot: html};
+}
+
+state.maxMutations = params.maxMutations;
+state.includeMutations = params.includeMutations;
+collect(state.observer.takeRecords());
+
+var count = state.count;
+var records = state.records;
+var overflow = state.overflow;
+state.records = [];
+state.count = 0;
+state.overflow = false;
+
+if (!count) {
+    return {reset: false, changed: false, hash: state.hash, mutations: [], snapshot: null};
+}
+
+var html = state.root.outerHTML;
+var previous = state.hash;
+state.hash = hash(html);
+if (overflow) {
+    return {reset: false, changed: state.hash !== previous, hash: state.hash, mutations: null, snapshot: html};
+}
+return {reset: false, changed: state.hash !== previous, hash: state.hash, mutations: records, snapshot: null};
+"""
+
+STOP_TRACKING_CHANGES: str = """
+var state = window.__phantomimeChanges;
+if (state) {
+    state.observer.disconnect();
+    delete window.__phantomimeChanges;
+}
+"""
+
+# Scrolls to the bottom of the page and calls back once no nodes were added for arguments[0].idleMs,
+# or after arguments[0].maxWaitMs, with the elements matching arguments[0].selector that were not
+# reported by a previous call. With reset the elements already on the page are reported too.
+SCROLL_AND_COLLECT: str = """
+var params = arguments[0];
+var callback = arguments[arguments.length - 1];
+var root = document.scrollingElement || document.documentElement;
+var state = window.__phantomimeScroll;
+
+if (params.reset || !state || state.selector !== params.selector) {
+    state = {selector: params.selector, seen: new WeakSet()};
+    window.__phantomimeScroll = state;
+}
+
+function fresh() {
+    var items = [];
+    if (!params.selector) {
+        return items;
+    }
+    document.querySelectorAll(params.selector).forEach(function (el) {
+        if (!state.seen.has(el)) {
+            state.seen.add(el);
+            items.push(el);
+        }
+    });
+    return items;
+}
+
+var existing = params.reset ? fresh() : [];
+var startHeight = root.scrollHeight;
+var done = false;
+var idleTimer = null;
+var deadlineTimer = null;
+
+function finish() {
+    if (done) {
+        return;
+    }
+    done = true;
+    observer.disconnect();
+    clearTimeout(idleTimer);
+    clearTimeout(deadlineTimer);
+    var added = fresh();
+    callback({items: existing.concat(added), added: added.length, grew: root.scrollHeight > startHeight});
+}
+
+function idle() {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(finish, params.idleMs);
+}
+
+var observer = new MutationObserver(idle);
+observer.observe(document.body || document.documentElement, {childList: true, subtree: true});
+deadlineTimer = setTimeout(finish, params.maxWaitMs);
+window.scrollTo(window.scrollX, root.scrollHeight);
+idle();
+"""
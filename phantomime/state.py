@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import re
+import tempfile
+
+from time import time
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+_log = logging.getLogger(__package__)
+
+SESSION_STATE_VERSION: int = 1
+
+_COOKIE_SAME_SITE_VALUES: List[str] = ["Strict", "Lax", "None"]
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        return ""
+
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _cookie_from_cdp(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    result = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie["domain"],
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False),
+    }
+
+    if cookie.get("sameSite") in _COOKIE_SAME_SITE_VALUES:
+        result["sameSite"] = cookie["sameSite"]
+
+    if not cookie.get("session", False) and cookie.get("expires", -1) > 0:
+        result["expiry"] = int(cookie["expires"])
+
+    return result
+
+
+def _cookie_to_cdp(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    result = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie["domain"],
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False),
+    }
+
+    if cookie.get("sameSite") in _COOKIE_SAME_SITE_VALUES:
+        result["sameSite"] = cookie["sameSite"]
+
+    if "expiry" in cookie:
+        result["expires"] = cookie["expiry"]
+
+    return result
+
+
+def _cookie_to_webdriver(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    result = {k: cookie[k] for k in ("name", "value", "domain", "path", "secure", "httpOnly", "expiry") if k in cookie}
+    if cookie.get("sameSite") in _COOKIE_SAME_SITE_VALUES:
+        result["sameSite"] = cookie["sameSite"]
+
+    return result
+
+
+def _live_cookies(cookies: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+    return [c for c in cookies if "expiry" not in c or c["expiry"] > now]
+
+
+def _build_state(url: str, cookies: List[Dict[str, Any]], storage: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    return {
+        "version": SESSION_STATE_VERSION,
+        "created_at": time(),
+        "url": url,
+        "origin": _origin(url),
+        "cookies": cookies,
+        "local_storage": storage["local"],
+        "session_storage": storage["session"],
+    }
+
+
+def _validate_state(state: Dict[str, Any]):
+    if not isinstance(state, dict) or state.get("version") != SESSION_STATE_VERSION:
+        raise Exception(f"unsupported session state. expected version {SESSION_STATE_VERSION}")
+
+
+class SessionStateStore:
+    """
+    Session states saved as one JSON file per domain in directory, so that they are reused
+    across processes and restarts. A state saved with a ttl is not loaded anymore once it expired
+    and cookies past their own expiry are dropped when loading.
+    Files are replaced atomically so concurrent writers never leave a partial state behind.
+    """
+
+    def __init__(self, directory: str, default_ttl: int = None):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, domain: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9._-]", "_", domain.lower()) + ".json")
+
+    def save(self, state: Dict[str, Any], domain: str = None, ttl: int = None):
+        """
+        Save the state under domain, the host of the state's URL by default.
+        """
+        _validate_state(state)
+
+        if domain is None:
+            domain = urlsplit(state["url"]).hostname or ""
+
+        if ttl is None:
+            ttl = self.default_ttl
+
+        record = {
+            "expires_at": state["created_at"] + ttl if ttl is not None else None,
+            "state": state,
+        }
+
+        _log.debug("saving session state for %s", domain)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+
+            os.replace(tmp_path, self._path(domain))
+        except:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, domain: str) -> Dict[str, Any]:
+        """
+        Returns the state saved for domain or None if there is none or it expired.
+        """
+        try:
+            with open(self._path(domain)) as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            _log.debug("ignoring unreadable session state for %s: %s", domain, e)
+            return None
+
+        now = time()
+        if record["expires_at"] is not None and record["expires_at"] <= now:
+            _log.debug("session state for %s expired", domain)
+            self.delete(domain)
+            return None
+
+        state = record["state"]
+        state["cookies"] = _live_cookies(state["cookies"], now)
+
+        return state
+
+    def delete(self, domain: str):
+        """
+        Remove the state saved for domain.
+        """
+        try:
+            os.unlink(self._path(domain))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import time
+import uuid
+
+from typing import Any, Dict, List
+from . import docker
+from . import utils
+from .browser import Browser
+from .profile import SessionProfile, _validate_driver_type
+from .constants import (
+    DRIVER_TYPE_FIREFOX,
+    DRIVER_TYPE_CHROME,
+)
+
+_log = logging.getLogger(__package__)
+
+# where templates are mounted inside the containers and where the per session copies go
+TEMPLATE_MOUNT_PATH: str = "/opt/phantomime/profile-template"
+SESSION_PROFILES_PATH: str = "/tmp/phantomime-profiles"
+
+_BUILD_INFO_FILE: str = ".phantomime-template.json"
+
+
+class ProfileTemplate:
+    """
+    A browser user data directory on the docker host, prepared once by build():
+    the preferences are set and the disk cache is primed by loading warm_urls.
+    Containers started by phantomime mount it read-only and every session runs on its own copy of it,
+    so the template never changes and is never rebuilt per job.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        driver_type: str = DRIVER_TYPE_FIREFOX,
+        warm_urls: List[str] = [],
+        preferences: Dict[str, Any] = {},
+        driver_arguments: List[str] = [],
+    ):
+        self.path = os.path.abspath(path)
+        self.driver_type = _validate_driver_type(driver_type)
+        self.warm_urls = list(warm_urls)
+        self.preferences = dict(preferences)
+        self.driver_arguments = list(driver_arguments)
+
+    def __repr__(self) -> str:
+        return f"ProfileTemplate(path={self.path!r}, driver_type={self.driver_type!r})"
+
+    @property
+    def is_built(self) -> bool:
+        return os.path.isfile(os.path.join(self.path, _BUILD_INFO_FILE))
+
+    def build_info(self) -> Dict[str, Any]:
+        """
+        Returns what the template was built with and when.
+        """
+        self._ensure_built()
+        with open(os.path.join(self.path, _BUILD_INFO_FILE)) as f:
+            return json.load(f)
+
+    def build(self, hub_ready_timeout: int = docker.DEFAULT_CONTAINER_HEALTH_TIMEOUT) -> "ProfileTemplate":
+        """
+        Prepare the template in a throwaway container that mounts the directory writable.
+        A template that is already built is left alone, remove its directory to rebuild it.
+        """
+        if self.is_built:
+            _log.debug("profile template %s is already built", self.path)
+            return self
+
+        if os.path.isdir(self.path) and os.listdir(self.path):
+            raise Exception(f"profile template directory {self.path} is not empty")
+
+        os.makedirs(self.path, exist_ok=True)
+        # the browser runs as the container's own user, it can only write to the directory while it is built
+        os.chmod(self.path, 0o777)
+        try:
+            self._build(hub_ready_timeout)
+        finally:
+            os.chmod(self.path, 0o755)
+
+        return self
+
+    def _build(self, hub_ready_timeout: int):
+        t = time.monotonic()
+        container, selenium_hub_port = docker._run_standalone_container(
+            docker._docker_client(), self.driver_type, self._volumes(writable=True))
+
+        try:
+            hub_url = f"http://localhost:{selenium_hub_port}/wd/hub"
+            utils.wait_hub_ready(hub_url, hub_ready_timeout)
+
+            profile = self.session_profile(TEMPLATE_MOUNT_PATH,
+                                           SessionProfile(self.driver_type, self.driver_arguments, self.preferences))
+            browser = Browser.connect(hub_url, profile=profile)
+            try:
+                for url in self.warm_urls:
+                    _log.debug("warming profile template %s with %s", self.path, url)
+                    browser.load_page(url)
+            finally:
+                # the browser flushes its cache and preferences to the directory when it quits
+                browser.quit()
+        finally:
+            # the files belong to the container user, so only it can make them read-only for everyone else
+            self._restrict_permissions(container)
+            docker._remove_container(container)
+
+        with open(os.path.join(self.path, _BUILD_INFO_FILE), "w") as f:
+            json.dump({
+                "driver_type": self.driver_type,
+                "warm_urls": self.warm_urls,
+                "preferences": self.preferences,
+                "driver_arguments": self.driver_arguments,
+                "built_at": time.time(),
+            }, f)
+
+        _log.debug("built profile template %s in %.3fsec", self.path, time.monotonic() - t)
+
+    def _restrict_permissions(self, container):
+        try:
+            exit_code, output = container.exec_run(["chmod", "-R", "u=rwX,go=rX", TEMPLATE_MOUNT_PATH])
+        except Exception as e:
+            _log.debug("could not restrict permissions of profile template %s: %s", self.path, e)
+            return
+
+        if exit_code != 0:
+            _log.debug("could not restrict permissions of profile template %s: %s", self.path, output)
+
+    def session_profile(self, user_data_dir: str, profile: SessionProfile = None) -> SessionProfile:
+        """
+        Returns profile, or a default profile of the template's driver type, set to run the browser
+        on the user data directory at user_data_dir inside the container.
+        """
+        if profile is None:
+            profile = SessionProfile(self.driver_type)
+
+        if profile.driver_type != self.driver_type:
+            raise Exception(f"profile template is for driver type {self.driver_type}, not {profile.driver_type}")
+
+        if self.driver_type == DRIVER_TYPE_CHROME:
+            arguments = [f"--user-data-dir={user_data_dir}"]
+        else:
+            arguments = ["-profile", user_data_dir]
+
+        return profile.replace(driver_arguments=list(profile.driver_arguments) + arguments)
+
+    def copy_into(self, container) -> str:
+        """
+        Copy the template mounted into container to a fresh directory for one session
+        and return its path inside the container.
+        """
+        user_data_dir = f"{SESSION_PROFILES_PATH}/{uuid.uuid4().hex}"
+        exit_code, output = container.exec_run(
+            ["sh", "-c", f"mkdir -p {SESSION_PROFILES_PATH} && cp -R {TEMPLATE_MOUNT_PATH} {user_data_dir}"])
+
+        if exit_code != 0:
+            raise Exception(f"could not copy profile template into docker container {container.short_id}: "
+                            f"{output.decode(errors='replace').strip()}")
+
+        return user_data_dir
+
+    def remove_copy(self, container, user_data_dir: str):
+        """
+        Remove a session copy made by copy_into, for containers that outlive the session.
+        """
+        try:
+            container.exec_run(["rm", "-rf", user_data_dir])
+        except Exception as e:
+            _log.debug("could not remove profile copy %s from docker container %s: %s",
+                       user_data_dir, container.short_id, e)
+
+    def _ensure_built(self):
+        if not self.is_built:
+            raise Exception(f"profile template {self.path} is not built, call build() first")
+
+    def _volumes(self, writable: bool = False) -> Dict[str, Dict[str, str]]:
+        return {self.path: {"bind": TEMPLATE_MOUNT_PATH, "mode": "rw" if writable else "ro"}}
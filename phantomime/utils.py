@@ -1,3 +1,4 @@
+import json
 import socket
 
 
@@ -12,3 +13,41 @@ def get_random_ephemeral_port() -> int:
 
 def backoff_raise_timeout_exception(*args, **kwargs):
     raise Exception("backoff timeout")
+
+
+def get_hub_status(hub_url: str, timeout: float = 2) -> dict:
+    """
+    Get the value of the /status endpoint of the Selenium Hub at the given URL.
+    """
+    import urllib.request
+
+    with urllib.request.urlopen(f"{hub_url.rstrip('/')}/status", timeout=timeout) as response:
+        return json.loads(response.read())["value"]
+
+
+def is_hub_ready(hub_url: str) -> bool:
+    """
+    Check if the Selenium Hub at the given URL reports that it can accept new sessions.
+    """
+    try:
+        return bool(get_hub_status(hub_url).get("ready"))
+    except Exception:
+        return False
+
+
+def wait_hub_ready(hub_url: str, timeout: float, interval: float = 0.25):
+    """
+    Poll the /status endpoint of the Selenium Hub at the given URL until it reports ready.
+    """
+    import backoff
+
+    b = backoff.on_predicate(
+        backoff.constant,
+        lambda ready: not ready,
+        interval=interval,
+        jitter=None,
+        on_giveup=backoff_raise_timeout_exception,
+        max_time=timeout
+    )
+
+    b(is_hub_ready)(hub_url)
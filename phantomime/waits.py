@@ -0,0 +1,235 @@
+from time import monotonic, sleep
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple, Union
+from . import utils
+from .constants import (
+    SELECTOR_TYPE_XPATH,
+    SELECTOR_TYPE_CSS,
+    WAIT_STRATEGY_CONSTANT,
+    WAIT_STRATEGY_EXPONENTIAL,
+    WAIT_STRATEGY_FIBONACCI,
+)
+
+_supported_strategies = [
+    WAIT_STRATEGY_CONSTANT,
+    WAIT_STRATEGY_EXPONENTIAL,
+    WAIT_STRATEGY_FIBONACCI,
+]
+
+
+class WaitPolicy:
+    """
+    How the wait_* functions poll a condition: a jitter-free interval sequence
+    (constant, capped exponential or fibonacci) that never sleeps past the deadline.
+    When the next interval would overshoot the deadline the policy sleeps until
+    the deadline instead and polls one last time, so the reaction latency stays bounded.
+    Policies are immutable and meant to be built once and shared.
+    """
+
+    __slots__ = ("strategy", "initial_interval", "max_interval", "factor")
+
+    def __init__(
+        self,
+        strategy: str = WAIT_STRATEGY_EXPONENTIAL,
+        initial_interval: float = 0.1,
+        max_interval: float = 1.0,
+        factor: float = 2,
+    ):
+        strategy = strategy.upper()
+        if strategy not in _supported_strategies:
+            raise Exception(
+                f"invalid wait strategy {strategy}. supported: {', '.join(_supported_strategies)}"
+            )
+
+        if initial_interval <= 0 or max_interval < initial_interval:
+            raise Exception("wait intervals must satisfy 0 < initial_interval <= max_interval")
+
+        if factor < 1:
+            raise Exception("wait factor must be at least 1")
+
+        object.__setattr__(self, "strategy", strategy)
+        object.__setattr__(self, "initial_interval", initial_interval)
+        object.__setattr__(self, "max_interval", max_interval)
+        object.__setattr__(self, "factor", factor)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WaitPolicy is immutable")
+
+    def __repr__(self) -> str:
+        return (f"WaitPolicy(strategy={self.strategy!r}, initial_interval={self.initial_interval}, "
+                f"max_interval={self.max_interval}, factor={self.factor})")
+
+    def intervals(self) -> Iterator[float]:
+        """
+        Yield the sleep intervals between polls.
+        """
+        if self.strategy == WAIT_STRATEGY_CONSTANT:
+            while True:
+                yield self.initial_interval
+
+        if self.strategy == WAIT_STRATEGY_FIBONACCI:
+            a, b = self.initial_interval, self.initial_interval
+            while True:
+                yield min(a, self.max_interval)
+                if a < self.max_interval:
+                    a, b = b, a + b
+
+        interval = self.initial_interval
+        while True:
+            yield interval
+            interval = min(interval * self.factor, self.max_interval)
+
+    def poll(self, fn: Callable, done: Callable[[Any], bool], timeout: float, *args) -> Any:
+        """
+        Call fn(*args) until done holds for its result and return that result.
+        Raises a timeout exception if it did not hold by the deadline.
+        """
+        deadline = monotonic() + timeout
+        intervals = self.intervals()
+        while True:
+            result = fn(*args)
+            if done(result):
+                return result
+
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                utils.backoff_raise_timeout_exception()
+
+            sleep(min(next(intervals), remaining))
+
+    async def poll_async(self, fn: Callable[[], Awaitable[Any]], done: Callable[[Any], bool], timeout: float) -> Any:
+        """
+        Await fn() until done holds for its result, sleeping without blocking the event loop.
+        """
+        import asyncio
+
+        deadline = monotonic() + timeout
+        intervals = self.intervals()
+        while True:
+            result = await fn()
+            if done(result):
+                return result
+
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                utils.backoff_raise_timeout_exception()
+
+            await asyncio.sleep(min(next(intervals), remaining))
+
+
+DEFAULT_WAIT_POLICY: WaitPolicy = WaitPolicy()
+
+_default_wait_policy: WaitPolicy = DEFAULT_WAIT_POLICY
+
+
+def set_default_wait_policy(wait_policy: WaitPolicy):
+    """
+    Set the policy used by the wait_* functions that are not given one explicitly.
+    """
+    global _default_wait_policy
+    _default_wait_policy = wait_policy
+
+
+def get_default_wait_policy() -> WaitPolicy:
+    """
+    Get the policy used by the wait_* functions that are not given one explicitly.
+    """
+    return _default_wait_policy
+
+
+class Condition:
+    """
+    A condition evaluated in the page by the wait functions.
+    Build conditions with the helpers below and combine them with wait_any/wait_all.
+    """
+
+    __slots__ = ("params",)
+
+    def __init__(self, condition_type: str, **params):
+        self.params = dict(params, type=condition_type)
+
+    def __repr__(self) -> str:
+        return f"Condition({self.params!r})"
+
+
+def _is_xpath(selector_type: str) -> bool:
+    selector_type = selector_type.upper()
+    if selector_type not in (SELECTOR_TYPE_XPATH, SELECTOR_TYPE_CSS):
+        raise Exception(
+            f"invalid selector type {selector_type}. supported: {SELECTOR_TYPE_XPATH}, {SELECTOR_TYPE_CSS}"
+        )
+
+    return selector_type == SELECTOR_TYPE_XPATH
+
+
+def element_exists(selector_type: str, selector: str, parent_el: Any = None) -> Condition:
+    """
+    An element matching the selector exists. Its value is the element.
+    """
+    return Condition("exists", selector=selector, xpath=_is_xpath(selector_type), root=parent_el)
+
+
+def element_not_exists(selector_type: str, selector: str, parent_el: Any = None) -> Condition:
+    """
+    No element matches the selector.
+    """
+    return Condition("not_exists", selector=selector, xpath=_is_xpath(selector_type), root=parent_el)
+
+
+def _text_query(text: str, regex: bool = False, ignore_case: bool = False) -> Dict[str, Any]:
+    return {"text": text, "regex": regex, "ignoreCase": ignore_case}
+
+
+def text_on_page(text: str, regex: bool = False, ignore_case: bool = False) -> Condition:
+    """
+    The text, or a match of the regular expression if regex is set, is present in the rendered text of the page.
+    """
+    return Condition("text", query=_text_query(text, regex, ignore_case))
+
+
+def text_not_on_page(text: str, regex: bool = False, ignore_case: bool = False) -> Condition:
+    """
+    The text, or a match of the regular expression if regex is set, is not present in the rendered text of the page.
+    """
+    return Condition("no_text", query=_text_query(text, regex, ignore_case))
+
+
+def element_visible(element: Any) -> Condition:
+    """
+    The element is visible.
+    """
+    return Condition("visible", element=element)
+
+
+def element_not_visible(element: Any) -> Condition:
+    """
+    The element is not visible.
+    """
+    return Condition("not_visible", element=element)
+
+
+def element_in_viewport(element: Any) -> Condition:
+    """
+    The element is in the current viewport.
+    """
+    return Condition("in_viewport", element=element)
+
+
+def page_ready() -> Condition:
+    """
+    The page is fully loaded.
+    """
+    return Condition("page_ready")
+
+
+def _compile_conditions(conditions: Union[Dict[Any, Condition], List[Condition]]) -> Tuple[List[Any], List[Dict]]:
+    if isinstance(conditions, dict):
+        keys = list(conditions.keys())
+        values = list(conditions.values())
+    else:
+        values = list(conditions)
+        keys = list(range(len(values)))
+
+    if not values:
+        raise Exception("no conditions to wait for")
+
+    return keys, [c.params for c in values]
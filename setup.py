@@ -15,4 +15,8 @@ setup(
         "setuptools==70.0.0",
         "docker==6.0.1",
     ],
+    extras_require={
+        "images": ["Pillow"],
+        "otel": ["opentelemetry-api"],
+    },
 )